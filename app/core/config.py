@@ -8,7 +8,21 @@ class Settings(BaseSettings):
     secret_key: str
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 1
+    order_stream_token_ttl_seconds: int = 300  # EventSource can't send headers, so /orders/stream takes this token in the URL or a cookie
     stripe_secret_key :str = "sk_test_51RTmiOQMjkOvMvVCRMl7Ke2NeIvBRvmDVUBNB3FSiWPCDq1Cv6joY5sYuVzUKIS1ra3KdP6liqIB4KYV8djjmoDp0005dfNf0O"
+    stripe_webhook_secret: str = ""  # whsec_... signing secret of the webhook endpoint
+    stripe_webhook_tolerance_seconds: int = 300
+    stripe_api_base: Optional[str] = None  # e.g. http://localhost:12111 for a local stripe-mock server in tests
+    stripe_connect_timeout_seconds: float = 3
+    stripe_read_timeout_seconds: float = 10
+    stripe_total_timeout_seconds: float = 20  # no retry starts after this much time
+    stripe_max_concurrency: int = 10
+    stripe_reconcile_concurrency: int = 2  # /payments/reconcile's share of stripe_max_concurrency
+    stripe_reconcile_rate_per_second: float = 5
+    stripe_queue_timeout_seconds: float = 2  # wait for a free slot before answering 503
+    stripe_max_retries: int = 2
+    stripe_retry_base_backoff_seconds: float = 0.25
+    stripe_retry_max_backoff_seconds: float = 2
     stripe_publishable_key :str ="pk_test_51RTmiOQMjkOvMvVCnPRTP8tdWayzvRdgWRZCrhToHWzPcSV6BdPEAofCcfN54xqi6UEV9Eb7R71K65kWXV3j95Fs00ia4Xy0en"
     redis_url: str = "redis://localhost:6379"
     email_host: str
@@ -17,12 +31,45 @@ class Settings(BaseSettings):
     email_password: str
     smtp_server: str = "smtp.gmail.com"
     smtp_port: int = 587
+    smtp_pool_size: int = 4  # open connections per SMTP server and account
+    smtp_max_messages_per_connection: int = 100
+    smtp_idle_timeout_seconds: float = 60
+    smtp_health_check_after_seconds: float = 5  # NOOP a pooled connection idle longer than this
+    smtp_timeout_seconds: float = 10
+    smtp_pool_wait_seconds: float = 10
+    notification_worker_concurrency: int = 8
+    notification_email_concurrency: int = 4  # keep at or below smtp_pool_size
+    notification_sms_concurrency: int = 4
+    notification_max_attempts: int = 8  # then the message is dead-lettered
+    notification_retry_base_seconds: float = 30
+    notification_retry_max_seconds: float = 3600
+    notification_lease_seconds: float = 120  # a claimed message is retried if not settled by then
+    notification_poll_interval_seconds: float = 1
+    notification_send_threads: int = 8  # threads for inline sends from the send-*-sync endpoints
+    notification_send_timeout_seconds: float = 15
     base_url: str
     fe_url: str
     allowed_origins: Optional[list[str]] = ["http://localhost:3000", "http://localhost:8000"]
     twilio_account_sid: str
     twilio_auth_token: str
     twilio_phone_number: str
+    twilio_timeout_seconds: float = 10
+    menu_price_cache_ttl_seconds: int = 300
+    payment_analytics_cache_ttl_seconds: int = 300  # bounds staleness across worker processes
+    prep_sheet_cache_ttl_seconds: int = 300  # invalidation is per process, so this bounds staleness across workers
+    idempotency_backend: str = "memory"  # 'memory' or 'redis' (uses redis_url)
+    idempotency_ttl_seconds: int = 86400
+    order_ingest_mode: str = "direct"  # 'direct' commits per request, 'batched' group-commits
+    order_ingest_max_batch: int = 100
+    order_ingest_max_wait_ms: int = 10
+    sales_rollup_slots: int = 8  # rows per caterer/day that concurrent order writes spread over
+    postcode_table_path: Optional[str] = None  # district,latitude,longitude CSV; defaults to app/data/postcode_districts.csv
+    delivery_grid_cell_km: float = 1.0
+    delivery_max_stops_per_batch: int = 40
+    compression_enabled: bool = True
+    compression_minimum_size: int = 1024  # bytes; smaller complete responses are sent uncompressed
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4  # used when the optional brotli package is installed
 
     @field_validator('allowed_origins', mode='before')
     @classmethod
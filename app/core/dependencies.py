@@ -1,11 +1,13 @@
-from fastapi import Depends, HTTPException, status
+from typing import Optional
+from fastapi import Cookie, Depends, Header, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.core.security import verify_token
+from app.core.security import ORDER_STREAM_SCOPE, token_subject, verify_token
 from app.models.user import User
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
@@ -28,6 +30,19 @@ def get_current_user(
         )
     return user
 
+def get_idempotency_owner(
+    idempotency_key: Optional[str] = Header(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+) -> Optional[str]:
+    """Who an Idempotency-Key belongs to on endpoints open to guests.
+
+    Only looked at when a key is sent. A missing, expired or invalid token
+    means anonymous rather than 401: guests must still be able to order.
+    """
+    if not idempotency_key or credentials is None:
+        return None
+    return token_subject(credentials.credentials)
+
 def get_current_caterer(current_user: User = Depends(get_current_user)):
     if current_user.role != "caterer":
         raise HTTPException(
@@ -42,4 +57,33 @@ def get_current_admin(current_user: User = Depends(get_current_user)):
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Admin access required"
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+def get_stream_caterer(
+    token: Optional[str] = Query(None, description="Stream token from POST /orders/stream/token"),
+    order_stream_token: Optional[str] = Cookie(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: Session = Depends(get_db)
+):
+    """Caterer for /orders/stream: a stream token (query or cookie), or the usual bearer token"""
+    stream_token = token or order_stream_token
+    if stream_token:
+        email = verify_token(stream_token, scope=ORDER_STREAM_SCOPE)
+    elif credentials:
+        email = verify_token(credentials.credentials)
+    else:
+        email = None
+    if email is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    user = db.query(User).filter(User.email == email).first()
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
+    return get_current_caterer(user)
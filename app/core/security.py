@@ -30,12 +30,36 @@ def get_password_hash(password_with_salt: str) :
 def generate_salt():
     return 
 
-def verify_token(token: str):
+ORDER_STREAM_SCOPE = "order_stream"
+
+def create_stream_token(email: str) -> str:
+    """Short-lived token that only opens /orders/stream, safe to put in a URL"""
+    return create_access_token(
+        {"sub": email, "scope": ORDER_STREAM_SCOPE},
+        timedelta(seconds=settings.order_stream_token_ttl_seconds)
+    )
+
+def verify_token(token: str, scope: Optional[str] = None):
+    """Email of a valid token. Scoped tokens are only accepted where that scope is asked for."""
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
         email: str = payload.get("sub")
-        if email is None:
+        if email is None or payload.get("scope") != scope:
             return None
         return email
     except JWTError:
-        return None
\ No newline at end of file
+        return None
+
+def token_subject(token: str) -> Optional[str]:
+    """Email a genuine API token was issued to, even if it has expired.
+
+    Never authenticates anyone: only for keying data to whoever the caller
+    says they are, where a stale token must not turn into an error.
+    """
+    try:
+        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm], options={"verify_exp": False})
+    except JWTError:
+        return None
+    if payload.get("scope") is not None:
+        return None
+    return payload.get("sub")
@@ -132,6 +132,27 @@ class ComboCRUD:
                 detail=f"Failed to retrieve combo: {str(e)}"
             )
     
+    @staticmethod
+    def list_query(
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        category: Optional[str] = None,
+        search: Optional[str] = None
+    ):
+        """One page of combos, newest first, as a query (for sparse field selection)"""
+        query = db.query(MenuCombo)
+
+        # Apply filters
+        if category:
+            query = query.filter(MenuCombo.combo_category == category)
+
+        if search:
+            query = query.filter(MenuCombo.combo_name.ilike(f"%{search}%"))
+
+        # Apply pagination and ordering
+        return query.order_by(MenuCombo.created_at.desc()).offset(skip).limit(limit)
+
     @staticmethod
     def get_all_combos(
         db: Session, 
@@ -142,17 +163,7 @@ class ComboCRUD:
     ) -> List[ComboListResponse]:
         """Get all combos with optional filtering"""
         try:
-            query = db.query(MenuCombo)
-            
-            # Apply filters
-            if category:
-                query = query.filter(MenuCombo.combo_category == category)
-            
-            if search:
-                query = query.filter(MenuCombo.combo_name.ilike(f"%{search}%"))
-            
-            # Apply pagination and ordering
-            combos = query.order_by(MenuCombo.created_at.desc()).offset(skip).limit(limit).all()
+            combos = ComboCRUD.list_query(db, skip, limit, category, search).all()
             
             # Convert to response models
             result = []
@@ -0,0 +1,93 @@
+import re
+from datetime import date
+from typing import List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from fastapi import HTTPException, status
+from app.models.order import Order
+
+# Last 10 digits of the phone number, so "+44 7911 123456" and "07911 123456"
+# share a key. Queries must use this exact expression to hit the index.
+ORDER_PHONE_KEY = "right(regexp_replace(COALESCE(customer_phone, ''), '[^0-9]', '', 'g'), 10)"
+
+# Indexes on orders backing customer search; all lead with caterer_id since
+# every search is scoped to one caterer. The name index needs pg_trgm and
+# btree_gin (for the integer column in a GIN index).
+CUSTOMER_SEARCH_INDEXES = [
+    f"""CREATE INDEX IF NOT EXISTS idx_orders_caterer_phone_key
+        ON orders (caterer_id, ({ORDER_PHONE_KEY}), menu_date)""",
+    """CREATE INDEX IF NOT EXISTS idx_orders_caterer_email_lower
+        ON orders (caterer_id, lower(customer_email), menu_date)""",
+    """CREATE INDEX IF NOT EXISTS idx_orders_caterer_name_trgm
+        ON orders USING gin (caterer_id, lower(customer_name) gin_trgm_ops)""",
+]
+
+
+def create_customer_search_indexes(connection) -> None:
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gin"))
+    for statement in CUSTOMER_SEARCH_INDEXES:
+        connection.execute(text(statement))
+
+
+def phone_key(phone: str) -> str:
+    return re.sub(r"[^0-9]", "", phone)[-10:]
+
+
+class CustomerSearchCRUD:
+
+    @staticmethod
+    def search_orders(
+        db: Session,
+        caterer_id: int,
+        phone: Optional[str] = None,
+        email: Optional[str] = None,
+        name: Optional[str] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        limit: int = 50
+    ) -> List[Order]:
+        """Orders of one caterer matching every given customer field, newest menu date first.
+
+        Phone matches on the normalized number, email case-insensitively and
+        exactly, name case-insensitively on any substring (trigram index).
+        """
+        if not (phone or email or name):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Provide at least one of phone, email or name"
+            )
+
+        query = db.query(Order).filter(Order.caterer_id == caterer_id)
+        params = {}
+
+        if phone:
+            key = phone_key(phone)
+            if len(key) < 7:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Phone number is too short")
+            query = query.filter(text(f"{ORDER_PHONE_KEY} = :phone_key"))
+            params["phone_key"] = key
+
+        if email:
+            query = query.filter(text("lower(customer_email) = :email"))
+            params["email"] = email.strip().lower()
+
+        if name:
+            term = name.strip().lower()
+            if len(term) < 3:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Name search needs at least 3 characters"
+                )
+            escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            query = query.filter(text("lower(customer_name) LIKE :name_pattern"))
+            params["name_pattern"] = f"%{escaped}%"
+
+        if start_date:
+            query = query.filter(Order.menu_date >= start_date)
+        if end_date:
+            query = query.filter(Order.menu_date <= end_date)
+
+        return query.params(**params).order_by(
+            Order.menu_date.desc(), Order.order_id.desc()
+        ).limit(limit).all()
@@ -0,0 +1,134 @@
+import json
+import random
+import uuid
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from app.core.config import settings
+
+OUTBOX_COLUMNS = """
+    message_id::text AS message_id, channel, kind, status, attempts, max_attempts,
+    next_attempt_at, last_error, provider_message_id, created_at, sent_at
+"""
+
+
+def retry_delay_seconds(attempts: int) -> float:
+    """Jittered exponential backoff after the `attempts`-th failed delivery"""
+    delay = min(
+        settings.notification_retry_max_seconds,
+        settings.notification_retry_base_seconds * 2 ** (attempts - 1)
+    )
+    return delay * random.uniform(0.5, 1.0)
+
+
+class NotificationOutboxCRUD:
+
+    @staticmethod
+    def enqueue(db: Session, channel: str, kind: str, payload: Dict[str, Any]) -> str:
+        """Queue a notification in the caller's transaction (the caller commits).
+
+        Nothing is sent unless that transaction commits, and once it has the
+        worker keeps retrying until delivery or dead-lettering. Returns the
+        message id for status lookups.
+        """
+        message_id = str(uuid.uuid4())
+        db.execute(text("""
+            INSERT INTO notification_outbox (message_id, channel, kind, payload, max_attempts)
+            VALUES (CAST(:message_id AS uuid), :channel, :kind, CAST(:payload AS jsonb), :max_attempts)
+        """), {
+            "message_id": message_id,
+            "channel": channel,
+            "kind": kind,
+            "payload": json.dumps(payload),
+            "max_attempts": settings.notification_max_attempts
+        })
+        return message_id
+
+    @staticmethod
+    def claim(db: Session, limit: int, lease_seconds: float) -> List[Dict[str, Any]]:
+        """Lease up to `limit` due messages to this worker and commit.
+
+        SKIP LOCKED lets several workers claim concurrently; a message whose
+        lease ran out (its worker died mid-send) becomes claimable again.
+        """
+        rows = db.execute(text("""
+            UPDATE notification_outbox o SET
+                status = 'sending',
+                attempts = o.attempts + 1,
+                locked_until = CURRENT_TIMESTAMP + make_interval(secs => :lease_seconds)
+            WHERE o.message_id IN (
+                SELECT message_id FROM notification_outbox
+                WHERE status IN ('pending', 'sending')
+                  AND next_attempt_at <= CURRENT_TIMESTAMP
+                  AND (status = 'pending' OR locked_until < CURRENT_TIMESTAMP)
+                ORDER BY next_attempt_at
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING o.message_id::text AS message_id, o.channel, o.kind, o.payload, o.attempts, o.max_attempts
+        """), {"limit": limit, "lease_seconds": lease_seconds}).fetchall()
+        db.commit()
+        return [dict(row._mapping) for row in rows]
+
+    @staticmethod
+    def mark_sent(db: Session, message_id: str, provider_message_id: Optional[str] = None) -> None:
+        db.execute(text("""
+            UPDATE notification_outbox
+            SET status = 'sent', sent_at = CURRENT_TIMESTAMP, locked_until = NULL,
+                last_error = NULL, provider_message_id = :provider_message_id
+            WHERE message_id = CAST(:message_id AS uuid)
+        """), {"message_id": message_id, "provider_message_id": provider_message_id})
+        db.commit()
+
+    @staticmethod
+    def mark_failed(db: Session, message: Dict[str, Any], error: str, permanent: bool = False) -> str:
+        """Schedule a retry with backoff, or dead-letter the message; returns the new status"""
+        dead = permanent or message["attempts"] >= message["max_attempts"]
+        status = "dead" if dead else "pending"
+        db.execute(text("""
+            UPDATE notification_outbox
+            SET status = :status, last_error = :error, locked_until = NULL,
+                next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => :delay)
+            WHERE message_id = CAST(:message_id AS uuid)
+        """), {
+            "message_id": message["message_id"],
+            "status": status,
+            "error": error[:2000],
+            "delay": 0 if dead else retry_delay_seconds(message["attempts"])
+        })
+        db.commit()
+        return status
+
+    @staticmethod
+    def get_status(db: Session, message_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            uuid.UUID(message_id)
+        except ValueError:
+            return None
+        row = db.execute(text(f"""
+            SELECT {OUTBOX_COLUMNS} FROM notification_outbox WHERE message_id = CAST(:message_id AS uuid)
+        """), {"message_id": message_id}).first()
+        return dict(row._mapping) if row else None
+
+    @staticmethod
+    def list_by_status(db: Session, status: str, limit: int = 100) -> List[Dict[str, Any]]:
+        rows = db.execute(text(f"""
+            SELECT {OUTBOX_COLUMNS} FROM notification_outbox
+            WHERE status = :status
+            ORDER BY created_at DESC
+            LIMIT :limit
+        """), {"status": status, "limit": limit}).fetchall()
+        return [dict(row._mapping) for row in rows]
+
+    @staticmethod
+    def requeue(db: Session, message_id: str) -> bool:
+        """Give a dead-lettered message a fresh set of attempts (the caller commits)"""
+        if NotificationOutboxCRUD.get_status(db, message_id) is None:
+            return False
+        requeued = db.execute(text("""
+            UPDATE notification_outbox
+            SET status = 'pending', attempts = 0, next_attempt_at = CURRENT_TIMESTAMP
+            WHERE message_id = CAST(:message_id AS uuid) AND status = 'dead'
+            RETURNING message_id
+        """), {"message_id": message_id}).scalar()
+        return requeued is not None
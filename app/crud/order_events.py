@@ -0,0 +1,98 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from fastapi import HTTPException, status
+from app.models.order import Order
+
+
+def order_event_row(event_type: str, order, **changes) -> Dict:
+    """Event row for an order; `changes` override fields not yet flushed to the order"""
+    row = {
+        "order_id": order.order_id,
+        "caterer_id": order.caterer_id,
+        "menu_date": order.menu_date,
+        "event_type": event_type,
+        "status": order.status,
+        "payment_status": order.payment_status,
+    }
+    row.update(changes)
+    return row
+
+
+def _parse_cursor(cursor: str) -> Tuple[int, int]:
+    try:
+        txid, _, event_id = cursor.partition(".")
+        return int(txid), int(event_id or 0)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+class OrderEventCRUD:
+
+    @staticmethod
+    def record(db: Session, events: Iterable[Dict]) -> None:
+        """Append order events in the caller's transaction (the caller commits)"""
+        events = list(events)
+        if not events:
+            return
+        db.execute(text("""
+            INSERT INTO order_events (order_id, caterer_id, menu_date, event_type, status, payment_status)
+            SELECT * FROM unnest(
+                CAST(:order_ids AS bigint[]), CAST(:caterer_ids AS integer[]), CAST(:menu_dates AS date[]),
+                CAST(:event_types AS varchar[]), CAST(:statuses AS varchar[]), CAST(:payment_statuses AS varchar[])
+            )
+        """), {
+            "order_ids": [event["order_id"] for event in events],
+            "caterer_ids": [event["caterer_id"] for event in events],
+            "menu_dates": [event["menu_date"] for event in events],
+            "event_types": [event["event_type"] for event in events],
+            "statuses": [event["status"] for event in events],
+            "payment_statuses": [event["payment_status"] for event in events]
+        })
+
+    @staticmethod
+    def current_cursor(db: Session) -> str:
+        return f"{db.execute(text('SELECT pg_snapshot_xmin(pg_current_snapshot())::text')).scalar()}.0"
+
+    @staticmethod
+    def get_changes(db: Session, caterer_id: int, since: Optional[str], limit: int = 500) -> Dict:
+        """Orders changed after `since`, with the cursor to pass next time.
+
+        The cursor is (transaction id, event id) of the last event returned.
+        Only events from transactions older than every transaction still in
+        progress are returned, so an event committing late behind a higher
+        id can never be skipped. Without `since`, returns the current cursor
+        and no orders (clients do one full fetch first).
+        """
+        if not since:
+            return {"cursor": OrderEventCRUD.current_cursor(db), "orders": [], "has_more": False}
+
+        txid, event_id = _parse_cursor(since)
+        rows = db.execute(text("""
+            SELECT e.event_id, e.txid::text AS txid, e.order_id
+            FROM order_events e
+            WHERE e.caterer_id = :caterer_id
+              AND (e.txid, e.event_id) > (CAST(CAST(:txid AS text) AS xid8), :event_id)
+              AND e.txid < pg_snapshot_xmin(pg_current_snapshot())
+            ORDER BY e.txid, e.event_id
+            LIMIT :limit
+        """), {"caterer_id": caterer_id, "txid": txid, "event_id": event_id, "limit": limit}).fetchall()
+
+        has_more = len(rows) == limit
+        if has_more:
+            cursor = f"{rows[-1].txid}.{rows[-1].event_id}"
+        else:
+            cursor = OrderEventCRUD.current_cursor(db)
+            # Never move the cursor backwards
+            if _parse_cursor(cursor) < (txid, event_id):
+                cursor = since
+
+        order_ids = list(dict.fromkeys(row.order_id for row in rows))
+        orders: List[Order] = []
+        if order_ids:
+            orders = db.query(Order).filter(
+                Order.caterer_id == caterer_id,
+                Order.order_id.in_(order_ids)
+            ).order_by(Order.order_id).all()
+
+        return {"cursor": cursor, "orders": orders, "has_more": has_more}
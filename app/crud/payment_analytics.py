@@ -0,0 +1,117 @@
+from datetime import date
+from typing import Iterable, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from app.core.config import settings
+from app.schemas.payment import PaymentAggregate, PaymentAnalyticsResponse
+from app.utils.cache import TTLCache
+
+GRANULARITIES = ("day", "week", "month")
+
+# (caterer_id, start_date, end_date, granularity) -> PaymentAnalyticsResponse,
+# invalidated per caterer after any payment change commits
+_analytics = TTLCache(ttl_seconds=settings.payment_analytics_cache_ttl_seconds)
+
+# Every grouping set keeps currency so amounts are never summed across currencies.
+# Served by idx_orders_caterer_menu_date_payment.
+PAYMENT_ANALYTICS_QUERY = text("""
+    WITH paid AS (
+        SELECT
+            date_trunc(CAST(:granularity AS text), o.menu_date::timestamp)::date AS period,
+            p.payment_method,
+            p.payment_status,
+            p.currency,
+            p.amount
+        FROM orders o
+        JOIN payments p ON p.payment_id = o.payment_id
+        WHERE o.caterer_id = :caterer_id
+          AND o.menu_date BETWEEN :start_date AND :end_date
+          AND o.payment_id IS NOT NULL
+    )
+    SELECT
+        CASE
+            WHEN GROUPING(period) = 0 THEN 'period'
+            WHEN GROUPING(payment_method) = 0 THEN 'payment_method'
+            WHEN GROUPING(payment_status) = 0 THEN 'status'
+            ELSE 'currency'
+        END AS dimension,
+        COALESCE(period::text, payment_method, payment_status) AS key,
+        currency,
+        COUNT(*) AS payment_count,
+        SUM(amount) AS amount_total,
+        COUNT(*) FILTER (WHERE payment_status = 'completed') AS completed_count,
+        COALESCE(SUM(amount) FILTER (WHERE payment_status = 'completed'), 0) AS completed_total
+    FROM paid
+    GROUP BY GROUPING SETS (
+        (period, currency),
+        (payment_method, currency),
+        (payment_status, currency),
+        (currency)
+    )
+    ORDER BY dimension, key, currency
+""")
+
+
+class PaymentAnalyticsCRUD:
+
+    @staticmethod
+    def get_analytics(db: Session, caterer_id: int, start_date: date, end_date: date,
+                      granularity: str = "day") -> PaymentAnalyticsResponse:
+        """Payment counts and totals for a caterer's menu dates, by period, method, status and currency.
+
+        All four breakdowns come from one grouping-sets scan, and the result
+        is cached until one of the caterer's payments changes.
+        """
+        cache_key = (caterer_id, start_date, end_date, granularity)
+        analytics = _analytics.get(cache_key)
+        if analytics is not None:
+            return analytics
+
+        rows = db.execute(PAYMENT_ANALYTICS_QUERY, {
+            "caterer_id": caterer_id,
+            "start_date": start_date,
+            "end_date": end_date,
+            "granularity": granularity
+        }).fetchall()
+
+        breakdowns = {"period": [], "payment_method": [], "status": [], "currency": []}
+        for row in rows:
+            breakdowns[row.dimension].append(PaymentAggregate(
+                key=row.key,
+                currency=row.currency,
+                payment_count=row.payment_count,
+                amount_total=row.amount_total,
+                completed_count=row.completed_count,
+                completed_total=row.completed_total
+            ))
+
+        analytics = PaymentAnalyticsResponse(
+            start_date=start_date,
+            end_date=end_date,
+            granularity=granularity,
+            by_period=breakdowns["period"],
+            by_payment_method=breakdowns["payment_method"],
+            by_status=breakdowns["status"],
+            by_currency=breakdowns["currency"]
+        )
+        _analytics.set(cache_key, analytics)
+        return analytics
+
+    @staticmethod
+    def caterer_ids(db: Session, payment_ids: Iterable[int]) -> set:
+        """Caterers whose analytics depend on these payments; look them up before committing"""
+        payment_ids = list(payment_ids)
+        if not payment_ids:
+            return set()
+        rows = db.execute(text("""
+            SELECT DISTINCT caterer_id FROM orders
+            WHERE payment_id = ANY(CAST(:payment_ids AS bigint[])) AND caterer_id IS NOT NULL
+        """), {"payment_ids": payment_ids}).fetchall()
+        return {row.caterer_id for row in rows}
+
+    @staticmethod
+    def invalidate(caterer_ids: Iterable[Optional[int]]) -> None:
+        """Drop cached analytics for these caterers; call after the payment change commits"""
+        stale = {caterer_id for caterer_id in caterer_ids if caterer_id is not None}
+        if stale:
+            _analytics.invalidate_where(lambda key: key[0] in stale)
@@ -0,0 +1,378 @@
+import json
+import logging
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import orjson
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from app.crud.order_events import OrderEventCRUD, order_event_row
+from app.crud.payment_analytics import PaymentAnalyticsCRUD
+from app.crud.sales import PAID_STATUSES, OrderSnapshot, SalesRollupCRUD
+from app.database import SessionLocal
+from app.models.order import Order
+from app.models.payment import Payment
+
+logger = logging.getLogger(__name__)
+
+# One row per order on the menu date, with its payment if it has one, already
+# in the PaymentResponseWithOrder shape: created_at is the processing time as
+# it has always been, and a JSON object address is rendered as its text.
+# Served by idx_orders_caterer_menu_date.
+MENU_DATE_PAYMENTS_CTE = """
+    WITH day AS (
+        SELECT
+            o.payment_method,
+            COALESCE(p.amount, o.total) AS amount,
+            COALESCE(p.currency, 'GBP') AS currency,
+            p.payment_id,
+            o.payment_status,
+            p.payment_gateway,
+            p.processed_at AS created_at,
+            p.processed_at,
+            p.gateway_status,
+            p.gateway_charge_id,
+            o.order_id,
+            o.customer_name,
+            o.customer_phone,
+            CASE WHEN jsonb_typeof(o.customer_address) = 'string'
+                 THEN o.customer_address #>> '{}'
+                 ELSE o.customer_address::text
+            END AS customer_address,
+            o.menu_date,
+            o.total,
+            o.status
+        FROM orders o
+        LEFT JOIN payments p ON p.payment_id = o.payment_id
+        WHERE o.menu_date = :menu_date
+          AND (CAST(:caterer_id AS integer) IS NULL OR o.caterer_id = :caterer_id)
+    )
+"""
+
+MENU_DATE_TOTALS_SELECT = """
+    SELECT json_build_object(
+        'order_count', COUNT(*),
+        'cancelled_count', COUNT(*) FILTER (WHERE status = 'cancelled'),
+        'paid_count', COUNT(*) FILTER (WHERE status <> 'cancelled' AND payment_status = ANY(:paid_statuses)),
+        'paid_total', COALESCE(SUM(total) FILTER (WHERE status <> 'cancelled' AND payment_status = ANY(:paid_statuses)), 0)::text,
+        'unpaid_count', COUNT(*) FILTER (WHERE status <> 'cancelled' AND NOT (COALESCE(payment_status, '') = ANY(:paid_statuses))),
+        'unpaid_total', COALESCE(SUM(total) FILTER (WHERE status <> 'cancelled' AND NOT (COALESCE(payment_status, '') = ANY(:paid_statuses))), 0)::text,
+        'by_method', COALESCE((
+            SELECT json_object_agg(method, method_total)
+            FROM (
+                SELECT COALESCE(payment_method, 'unspecified') AS method, SUM(total)::text AS method_total
+                FROM day WHERE status <> 'cancelled'
+                GROUP BY 1
+            ) methods
+        ), '{}'::json)
+    ) AS totals
+    FROM day
+"""
+
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# Every PaymentResponseWithOrder field, in its order
+MENU_DATE_COLUMNS = [
+    "payment_method", "amount", "currency", "payment_id", "payment_status", "payment_gateway",
+    "created_at", "processed_at", "gateway_status", "gateway_charge_id",
+    "order_id", "customer_name", "customer_phone", "customer_address", "menu_date", "total",
+]
+
+# Never persisted: the client secret, and bulky blocks we never read back
+DROPPED_GATEWAY_KEYS = {"client_secret", "payment_method_options", "payment_method_configuration_details"}
+
+
+def compact_gateway_data(value: Any) -> Any:
+    """Gateway payload minus DROPPED_GATEWAY_KEYS and null/empty values, recursively"""
+    if isinstance(value, dict):
+        compacted = {key: compact_gateway_data(item) for key, item in value.items() if key not in DROPPED_GATEWAY_KEYS}
+        return {key: item for key, item in compacted.items() if item not in (None, "", [], {})}
+    if isinstance(value, list):
+        return [compact_gateway_data(item) for item in value]
+    return value
+
+
+def gateway_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+    """The typed payment columns taken from a (compacted) payment intent"""
+    charge = data.get("latest_charge")
+    return {
+        "gateway_status": data.get("status"),
+        "gateway_amount": data.get("amount_received", data.get("amount")),
+        "gateway_charge_id": charge.get("id") if isinstance(charge, dict) else charge,
+    }
+
+
+def store_gateway_response(payment: Payment, gateway_response: Dict[str, Any]) -> None:
+    # Round-trip through JSON so Stripe objects and odd types become plain JSON
+    data = compact_gateway_data(json.loads(json.dumps(gateway_response, default=str)))
+    payment.gateway_data = data
+    payment.gateway_response = None
+    for column, value in gateway_fields(data).items():
+        setattr(payment, column, value)
+
+
+def payment_event_type(order: Order) -> str:
+    """Event type to publish for an order whose payment just settled one way or the other"""
+    return "payment.confirmed" if order.payment_status == "completed" else "payment.failed"
+
+
+def parse_legacy_gateway_response(raw: str) -> Optional[Dict[str, Any]]:
+    """Decode a gateway_response text dump: json.dumps output, str(intent), or repr(intent)"""
+    if not raw.lstrip().startswith("{"):
+        # repr() form: "<PaymentIntent id=pi_... at 0x...> JSON: {...}"
+        _, separator, raw = raw.partition("JSON: ")
+        if not separator:
+            return None
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+class PaymentCRUD:
+
+    @staticmethod
+    def mark_succeeded(db: Session, payment: Payment, gateway_response: Dict[str, Any]) -> Optional[Order]:
+        """Record a successful payment and confirm its order (the caller commits).
+
+        Returns the order that changed, or None if there was nothing to do.
+        """
+        orders = PaymentCRUD.mark_succeeded_many(db, [(payment, gateway_response)])
+        return orders[0] if orders else None
+
+    @staticmethod
+    def mark_succeeded_many(db: Session, settled: List[Tuple[Payment, Dict[str, Any]]]) -> List[Order]:
+        """Bulk form of mark_succeeded: one order lookup and one rollup/event write for all payments"""
+        settled = [(payment, response) for payment, response in settled if payment.payment_status != "completed"]
+        if not settled:
+            return []
+
+        processed_at = datetime.utcnow()
+        for payment, gateway_response in settled:
+            payment.payment_status = "completed"
+            payment.processed_at = processed_at
+            store_gateway_response(payment, gateway_response)
+
+        orders = db.query(Order).filter(
+            Order.payment_id.in_([payment.payment_id for payment, _ in settled])
+        ).all()
+        changes = []
+        for order in orders:
+            before = OrderSnapshot.of(order)
+            order.payment_status = "completed"
+            if order.status == "pending":
+                order.status = "confirmed"
+            changes.append((before, OrderSnapshot.of(order)))
+        SalesRollupCRUD.record_changes(db, changes)
+        OrderEventCRUD.record(db, [order_event_row("payment.confirmed", order) for order in orders])
+        return orders
+
+    @staticmethod
+    def mark_failed(db: Session, payment: Payment, failure_reason: Optional[str], gateway_response: Dict[str, Any],
+                    payment_status: str = "failed") -> Optional[Order]:
+        """Record a failed (or cancelled) payment attempt unless it already succeeded (the caller commits).
+
+        Returns the order that changed, or None if there was nothing to do.
+        """
+        orders = PaymentCRUD.mark_failed_many(db, [(payment, failure_reason, gateway_response, payment_status)])
+        return orders[0] if orders else None
+
+    @staticmethod
+    def mark_failed_many(db: Session, failed: List[Tuple[Payment, Optional[str], Dict[str, Any], str]]) -> List[Order]:
+        """Bulk form of mark_failed over (payment, failure_reason, gateway_response, payment_status)"""
+        failed = [entry for entry in failed if entry[0].payment_status != "completed"]
+        if not failed:
+            return []
+
+        statuses = {}
+        for payment, failure_reason, gateway_response, payment_status in failed:
+            payment.payment_status = payment_status
+            payment.failure_reason = failure_reason or "Payment failed"
+            store_gateway_response(payment, gateway_response)
+            statuses[payment.payment_id] = payment_status
+
+        # The order stays open so the customer can pay again
+        orders = db.query(Order).filter(
+            Order.payment_id.in_(list(statuses)),
+            Order.payment_status != "completed"
+        ).all()
+        changes = []
+        for order in orders:
+            before = OrderSnapshot.of(order)
+            order.payment_status = statuses[order.payment_id]
+            changes.append((before, OrderSnapshot.of(order)))
+        SalesRollupCRUD.record_changes(db, changes)
+        OrderEventCRUD.record(db, [order_event_row("payment.failed", order) for order in orders])
+        return orders
+
+    @staticmethod
+    def claim_webhook_event(db: Session, event_id: str, event_type: str) -> bool:
+        """Record a webhook event id in the caller's transaction.
+
+        False means it was already processed. A concurrent delivery of the same
+        event blocks on the primary key until the first one commits or rolls back.
+        """
+        claimed = db.execute(text("""
+            INSERT INTO stripe_webhook_events (event_id, event_type)
+            VALUES (:event_id, :event_type)
+            ON CONFLICT (event_id) DO NOTHING
+            RETURNING event_id
+        """), {"event_id": event_id, "event_type": event_type}).scalar()
+        return claimed is not None
+
+    @staticmethod
+    def apply_webhook_event(db: Session, event: Dict[str, Any]) -> Tuple[str, Optional[Order]]:
+        """Apply a verified Stripe event to payments and orders in one transaction.
+
+        Returns (outcome, changed order); the caller publishes after commit.
+        """
+        event_type = event["type"]
+        try:
+            if not PaymentCRUD.claim_webhook_event(db, event["id"], event_type):
+                db.rollback()
+                return "duplicate", None
+
+            order = None
+            outcome = "ignored"
+            stale_caterers = set()
+            if event_type in ("payment_intent.succeeded", "payment_intent.payment_failed"):
+                intent = event["data"]["object"]
+                payment = db.query(Payment).filter(
+                    Payment.payment_intent_id == intent["id"]
+                ).with_for_update().first()
+                if not payment:
+                    logger.warning(f"Stripe event {event['id']} for unknown payment intent {intent['id']}")
+                    outcome = "unknown_payment_intent"
+                elif event_type == "payment_intent.succeeded":
+                    order = PaymentCRUD.mark_succeeded(db, payment, intent)
+                    outcome = "applied"
+                else:
+                    error = intent.get("last_payment_error") or {}
+                    order = PaymentCRUD.mark_failed(db, payment, error.get("message"), intent)
+                    outcome = "applied"
+                if payment:
+                    stale_caterers = PaymentAnalyticsCRUD.caterer_ids(db, [payment.payment_id])
+
+            db.commit()
+            PaymentAnalyticsCRUD.invalidate(stale_caterers)
+            return outcome, order
+        except Exception:
+            db.rollback()
+            raise
+
+    @staticmethod
+    def migrate_gateway_responses(db: Session, after_id: int = 0, batch_size: int = 1000) -> Tuple[Optional[int], int, int]:
+        """Convert one batch of legacy text gateway responses to gateway_data (the caller commits).
+
+        Returns (last payment_id scanned or None when done, converted, unparseable).
+        Unparseable rows keep their text and are skipped by the keyset.
+        """
+        rows = db.execute(text("""
+            SELECT payment_id, gateway_response
+            FROM payments
+            WHERE gateway_response IS NOT NULL AND payment_id > :after_id
+            ORDER BY payment_id
+            LIMIT :batch_size
+        """), {"after_id": after_id, "batch_size": batch_size}).fetchall()
+        if not rows:
+            return None, 0, 0
+
+        converted = []
+        for row in rows:
+            data = parse_legacy_gateway_response(row.gateway_response)
+            if data is not None:
+                data = compact_gateway_data(data)
+                converted.append((row.payment_id, data, gateway_fields(data)))
+
+        if converted:
+            db.execute(text("""
+                UPDATE payments p SET
+                    gateway_data = CAST(u.gateway_data AS jsonb),
+                    gateway_status = u.gateway_status,
+                    gateway_amount = u.gateway_amount,
+                    gateway_charge_id = u.gateway_charge_id,
+                    gateway_response = NULL
+                FROM unnest(
+                    CAST(:payment_ids AS bigint[]), CAST(:gateway_data AS text[]),
+                    CAST(:gateway_statuses AS varchar[]), CAST(:gateway_amounts AS integer[]),
+                    CAST(:gateway_charge_ids AS varchar[])
+                ) AS u(payment_id, gateway_data, gateway_status, gateway_amount, gateway_charge_id)
+                WHERE p.payment_id = u.payment_id
+            """), {
+                "payment_ids": [payment_id for payment_id, _, _ in converted],
+                "gateway_data": [json.dumps(data) for _, data, _ in converted],
+                "gateway_statuses": [fields["gateway_status"] for _, _, fields in converted],
+                "gateway_amounts": [fields["gateway_amount"] for _, _, fields in converted],
+                "gateway_charge_ids": [fields["gateway_charge_id"] for _, _, fields in converted],
+            })
+        return rows[-1].payment_id, len(converted), len(rows) - len(converted)
+
+    @staticmethod
+    def get_menu_date_payments(
+        db: Session,
+        menu_date: date,
+        caterer_id: Optional[int],
+        skip: int = 0,
+        limit: int = 100,
+        after_order_id: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """One page of a menu date's orders with their payments, newest first, plus day totals.
+
+        Page and totals come back in a single statement. Pass the last
+        order_id seen as `after_order_id` for keyset paging instead of `skip`.
+        """
+        columns = ", ".join(f"page.{column}" for column in MENU_DATE_COLUMNS)
+        rows = db.execute(text(MENU_DATE_PAYMENTS_CTE + f"""
+            , totals AS ({MENU_DATE_TOTALS_SELECT})
+            SELECT {columns}, totals.totals
+            FROM totals
+            LEFT JOIN LATERAL (
+                SELECT * FROM day
+                WHERE CAST(:after_order_id AS bigint) IS NULL OR order_id < :after_order_id
+                ORDER BY order_id DESC
+                OFFSET :skip LIMIT :limit
+            ) page ON true
+        """), {
+            "menu_date": menu_date,
+            "caterer_id": caterer_id,
+            "after_order_id": after_order_id,
+            "skip": skip,
+            "limit": limit,
+            "paid_statuses": list(PAID_STATUSES)
+        }).fetchall()
+
+        totals = rows[0].totals if rows else {}
+        payments = [
+            {column: row._mapping[column] for column in MENU_DATE_COLUMNS}
+            for row in rows if row.order_id is not None
+        ]
+        return payments, totals
+
+    @staticmethod
+    def stream_menu_date_payments(menu_date: date, caterer_id: Optional[int], include_totals: bool) -> Iterator[bytes]:
+        """NDJSON lines for every order on a menu date, fetched with a server-side cursor.
+
+        Uses its own session since the stream outlives the request's dependencies.
+        """
+        db = SessionLocal()
+        try:
+            params = {"menu_date": menu_date, "caterer_id": caterer_id, "paid_statuses": list(PAID_STATUSES)}
+            result = db.execute(
+                text(MENU_DATE_PAYMENTS_CTE + f"SELECT {', '.join(MENU_DATE_COLUMNS)} FROM day ORDER BY order_id DESC"),
+                params,
+                execution_options={"stream_results": True, "yield_per": 1000}
+            )
+            # Each yield is one body message (and one compressor flush), so send ~64 KB at a time
+            chunk = bytearray()
+            for row in result:
+                chunk += orjson.dumps(dict(row._mapping), default=str, option=orjson.OPT_UTC_Z) + b"\n"
+                if len(chunk) >= STREAM_CHUNK_BYTES:
+                    yield bytes(chunk)
+                    chunk.clear()
+            if include_totals:
+                totals = db.execute(text(MENU_DATE_PAYMENTS_CTE + MENU_DATE_TOTALS_SELECT), params).scalar()
+                chunk += orjson.dumps({"totals": totals}) + b"\n"
+            if chunk:
+                yield bytes(chunk)
+        finally:
+            db.close()
@@ -0,0 +1,113 @@
+from datetime import date
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from fastapi import HTTPException, status
+from app.core.config import settings
+from app.schemas.order import PrepSheetLine, PrepSheetResponse
+from app.utils.cache import TTLCache
+
+# (caterer_id, menu_date) -> PrepSheetResponse, invalidated by order changes
+_prep_sheets = TTLCache(ttl_seconds=settings.prep_sheet_cache_ttl_seconds)
+
+# Order lines are client JSON: values that don't parse are skipped, not cast
+# (a bad cast would fail the whole sheet)
+PREP_SHEET_QUERY = text("""
+    WITH lines AS (
+        SELECT
+            COALESCE(
+                CASE WHEN line.value->>'catalog_item_id' ~ '^[0-9]{1,18}$' THEN (line.value->>'catalog_item_id')::bigint END,
+                CASE WHEN line.key ~ '^[0-9]{1,18}$' THEN line.key::bigint END
+            ) AS catalog_item_id,
+            line.value->>'item_name' AS item_name,
+            COALESCE(lower(line.value->>'is_combo') IN ('true', 't', '1'), false) AS is_combo,
+            CASE
+                WHEN jsonb_typeof(line.value->'quantity') IN ('number', 'string')
+                 AND line.value->>'quantity' ~ '^[0-9]{1,9}$'
+                THEN (line.value->>'quantity')::int
+            END AS quantity
+        FROM orders o
+        CROSS JOIN LATERAL jsonb_each(o.items::jsonb) AS line
+        WHERE o.caterer_id = :caterer_id
+          AND o.menu_date = :menu_date
+          AND o.status <> 'cancelled'
+          AND jsonb_typeof(line.value) = 'object'
+    ),
+    ordered AS (
+        SELECT catalog_item_id, MAX(item_name) AS item_name, bool_or(is_combo) AS is_combo, SUM(quantity) AS quantity
+        FROM lines
+        WHERE catalog_item_id IS NOT NULL AND quantity > 0
+        GROUP BY catalog_item_id
+    ),
+    dishes AS (
+        SELECT catalog_item_id AS menu_item_id, item_name, quantity
+        FROM ordered
+        WHERE NOT is_combo
+
+        UNION ALL
+
+        -- Expand combos into their component dishes
+        SELECT
+            (component->>'menu_item_id')::bigint,
+            NULL,
+            ordered.quantity * COALESCE((component->>'quantity')::int, 1)
+        FROM ordered
+        JOIN menu_combo_catalog c ON c.combo_id = ordered.catalog_item_id
+        CROSS JOIN LATERAL jsonb_array_elements(c.combo_items) AS component
+        WHERE ordered.is_combo
+    )
+    SELECT 'ordered' AS kind, catalog_item_id, item_name, is_combo, quantity
+    FROM ordered
+
+    UNION ALL
+
+    SELECT 'dish', d.menu_item_id, COALESCE(m.item_name, MAX(d.item_name)), false, SUM(d.quantity)
+    FROM dishes d
+    LEFT JOIN menu_catalog m ON m.menu_item_id = d.menu_item_id
+    GROUP BY d.menu_item_id, m.item_name
+
+    ORDER BY 1, 3
+""")
+
+
+class PrepSheetCRUD:
+
+    @staticmethod
+    def get_prep_sheet(db: Session, caterer_id: int, menu_date: date) -> PrepSheetResponse:
+        """How many of each dish to cook for a menu date, across all live orders.
+
+        Aggregation runs entirely in the database (one round trip) and the
+        result is cached until an order for that date changes.
+        """
+        cache_key = (caterer_id, menu_date)
+        sheet = _prep_sheets.get(cache_key)
+        if sheet is not None:
+            return sheet
+
+        try:
+            rows = db.execute(PREP_SHEET_QUERY, {"menu_date": menu_date, "caterer_id": caterer_id}).fetchall()
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to build prep sheet: {str(e)}"
+            )
+
+        sheet = PrepSheetResponse(menu_date=menu_date, ordered_items=[], dishes=[])
+        for row in rows:
+            line = PrepSheetLine(
+                catalog_item_id=row.catalog_item_id,
+                item_name=row.item_name,
+                is_combo=row.is_combo,
+                quantity=row.quantity
+            )
+            if row.kind == "ordered":
+                sheet.ordered_items.append(line)
+            else:
+                sheet.dishes.append(line)
+
+        _prep_sheets.set(cache_key, sheet)
+        return sheet
+
+    @staticmethod
+    def invalidate(menu_date: date) -> None:
+        """Drop cached prep sheets for a menu date after any order change"""
+        _prep_sheets.invalidate_where(lambda key: key[1] == menu_date)
@@ -0,0 +1,89 @@
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Optional
+from sqlalchemy.orm import Session
+from fastapi import HTTPException, status
+from app.core.config import settings
+from app.models.menu import ScheduledMenu
+from app.utils.cache import TTLCache
+
+CENT = Decimal("0.01")
+
+# menu_id -> MenuPriceTable, invalidated whenever a scheduled menu changes
+_price_tables = TTLCache(ttl_seconds=settings.menu_price_cache_ttl_seconds)
+
+
+class MenuPriceTable:
+    """Flattened catalog_item_id -> unit price map for one scheduled menu.
+
+    Regular items and combos both appear under their catalog_item_id, which
+    is the key the order cart uses, so pricing an order is a single pass over
+    its lines with no database access.
+    """
+
+    def __init__(self, menu_id: str, caterer_id: int, menu_date: date, active: bool, prices: Dict[int, Decimal]):
+        self.menu_id = menu_id
+        self.caterer_id = caterer_id
+        self.menu_date = menu_date
+        self.active = active
+        self.prices = prices
+
+    @classmethod
+    def compile(cls, menu: ScheduledMenu) -> "MenuPriceTable":
+        prices = {}
+        for item in menu.items or []:
+            if item.get("catalog_item_id") is None or item.get("price") is None:
+                continue
+            prices[int(item["catalog_item_id"])] = Decimal(str(item["price"])).quantize(CENT)
+        return cls(menu.menu_id, menu.caterer_id, menu.menu_date, bool(menu.active), prices)
+
+    def price(self, quantities: Dict[int, int]) -> Decimal:
+        """Server-side total for an order's line quantities"""
+        if not quantities:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Order has no items with a quantity"
+            )
+        unknown = [item_id for item_id in quantities if item_id not in self.prices]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Items not available on menu {self.menu_id}: {unknown}"
+            )
+        total = sum((self.prices[item_id] * quantity for item_id, quantity in quantities.items()), Decimal("0"))
+        return total.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class PricingCRUD:
+
+    @staticmethod
+    def get_price_table(db: Session, menu_id: str) -> Optional[MenuPriceTable]:
+        """Compiled price table for a menu, loaded once and served from cache"""
+        table = _price_tables.get(menu_id)
+        if table is not None:
+            return table
+
+        menu = db.query(ScheduledMenu).filter(ScheduledMenu.menu_id == menu_id).first()
+        if not menu:
+            return None
+
+        table = MenuPriceTable.compile(menu)
+        _price_tables.set(menu_id, table)
+        return table
+
+    @staticmethod
+    def invalidate(menu_id: str) -> None:
+        _price_tables.invalidate(menu_id)
+
+    @staticmethod
+    def check_total(submitted: Decimal, computed: Decimal) -> None:
+        """Reject orders whose client-computed total disagrees with the menu prices"""
+        if abs(Decimal(submitted) - computed) >= CENT:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail={
+                    "message": "Order total does not match menu prices",
+                    "submitted_total": str(submitted),
+                    "expected_total": str(computed)
+                }
+            )
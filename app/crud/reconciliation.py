@@ -0,0 +1,186 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional
+import stripe
+from sqlalchemy.orm import Session
+from app.crud.payment_analytics import PaymentAnalyticsCRUD
+from app.crud.payments import PaymentCRUD, payment_event_type
+from app.models.payment import Payment
+from app.utils.events import order_event_data, order_events
+
+logger = logging.getLogger(__name__)
+
+MAX_REPORTED_DISCREPANCIES = 1000
+
+# Intent statuses that mean the customer may still complete the payment
+OPEN_INTENT_STATUSES = {"requires_payment_method", "requires_confirmation", "requires_action", "processing", "requires_capture"}
+
+
+class RateLimiter:
+    """Token bucket shared by the fetch threads"""
+
+    def __init__(self, per_second: float):
+        self.interval = 1.0 / per_second
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class PaymentReconciler:
+    """Settle payments left `pending` because the client never confirmed them.
+
+    Pages through pending Stripe payments by payment_id, fetches their
+    intents concurrently under a rate limit, and applies each page's
+    outcomes in one transaction. `fetch_intent` defaults to the Stripe
+    gateway; pass a stand-in (e.g. a dict lookup) to run offline.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        fetch_intent: Callable[[str], Dict[str, Any]],
+        page_size: int = 500,
+        concurrency: int = 8,
+        rate_per_second: float = 20,
+        min_age: timedelta = timedelta(minutes=30),
+        dry_run: bool = False,
+    ):
+        self.db = db
+        self.fetch_intent = fetch_intent
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.rate_limiter = RateLimiter(rate_per_second)
+        self.min_age = min_age
+        self.dry_run = dry_run
+        self.report: Dict[str, Any] = {
+            "scanned": 0, "completed": 0, "failed": 0, "cancelled": 0, "still_pending": 0,
+            "missing_intent": 0, "amount_mismatch": 0, "errors": 0, "discrepancies": [],
+        }
+
+    def _fetch(self, intent_id: str):
+        self.rate_limiter.wait()
+        try:
+            return intent_id, self.fetch_intent(intent_id), None
+        except stripe.error.InvalidRequestError as e:
+            return intent_id, None, "missing_intent" if e.http_status == 404 else str(e)
+        except Exception as e:
+            return intent_id, None, str(e)
+
+    def _discrepancy(self, payment: Payment, kind: str, detail: str) -> None:
+        self.report[kind] += 1
+        if len(self.report["discrepancies"]) < MAX_REPORTED_DISCREPANCIES:
+            self.report["discrepancies"].append({
+                "payment_id": payment.payment_id,
+                "payment_intent_id": payment.payment_intent_id,
+                "type": kind,
+                "detail": detail,
+            })
+
+    def run(self, max_payments: Optional[int] = None) -> Dict[str, Any]:
+        # payments.created_at is timestamptz, so compare against an aware UTC time
+        cutoff = datetime.now(timezone.utc) - self.min_age
+        after_id = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="reconcile") as pool:
+            while max_payments is None or self.report["scanned"] < max_payments:
+                page_size = self.page_size
+                if max_payments is not None:
+                    page_size = min(page_size, max_payments - self.report["scanned"])
+                # Keyset paging; served by idx_payments_pending
+                payments = self.db.query(Payment).filter(
+                    Payment.payment_status == "pending",
+                    Payment.payment_intent_id.isnot(None),
+                    Payment.created_at < cutoff,
+                    Payment.payment_id > after_id
+                ).order_by(Payment.payment_id).limit(page_size).all()
+                if not payments:
+                    break
+                after_id = payments[-1].payment_id
+                self.report["scanned"] += len(payments)
+
+                intents = {
+                    intent_id: (intent, error)
+                    for intent_id, intent, error in pool.map(
+                        self._fetch, [payment.payment_intent_id for payment in payments]
+                    )
+                }
+                self._apply_page(payments, intents)
+        return self.report
+
+    def _apply_page(self, payments: List[Payment], intents: Dict[str, Any]) -> None:
+        succeeded = []
+        failed = []
+        changed_ids = []
+        for payment in payments:
+            intent, error = intents[payment.payment_intent_id]
+            if error == "missing_intent":
+                self._discrepancy(payment, "missing_intent", "Payment intent not found at Stripe")
+                continue
+            if error:
+                self._discrepancy(payment, "errors", error)
+                continue
+
+            intent_status = intent["status"]
+            if intent_status == "succeeded":
+                expected = int((Decimal(payment.amount) * 100).to_integral_value())
+                if intent["amount"] != expected:
+                    self._discrepancy(
+                        payment, "amount_mismatch",
+                        f"Stripe amount {intent['amount']} != local amount {expected} (not applied)"
+                    )
+                    continue
+                succeeded.append((payment, intent))
+                changed_ids.append(payment.payment_id)
+                self.report["completed"] += 1
+            elif intent_status == "canceled":
+                self.report["cancelled"] += 1
+                failed.append((payment, intent.get("cancellation_reason"), intent, "cancelled"))
+                changed_ids.append(payment.payment_id)
+            elif intent_status == "requires_payment_method" and intent.get("last_payment_error"):
+                self.report["failed"] += 1
+                failed.append((payment, intent["last_payment_error"].get("message"), intent, "failed"))
+                changed_ids.append(payment.payment_id)
+            else:
+                self.report["still_pending"] += 1
+                if intent_status not in OPEN_INTENT_STATUSES:
+                    self._discrepancy(payment, "errors", f"Unexpected intent status {intent_status}")
+
+        if self.dry_run:
+            self.db.rollback()
+            return
+
+        try:
+            orders = PaymentCRUD.mark_succeeded_many(self.db, succeeded)
+            orders += PaymentCRUD.mark_failed_many(self.db, failed)
+            # Captured before commit so publishing doesn't reload every order
+            events = [(order.caterer_id, payment_event_type(order), order_event_data(order)) for order in orders]
+            stale_caterers = PaymentAnalyticsCRUD.caterer_ids(self.db, changed_ids)
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Reconciliation page ending at payment {payments[-1].payment_id} failed: {str(e)}")
+            self.report["errors"] += len(payments)
+            return
+
+        PaymentAnalyticsCRUD.invalidate(stale_caterers)
+        for caterer_id, event_type, data in events:
+            order_events.publish(caterer_id, event_type, data)
+        # Loaded objects are not needed again; keep the session small across pages
+        self.db.expunge_all()
+
+
+def stripe_intent_fetcher() -> Callable[[str], Dict[str, Any]]:
+    from app.utils.stripe_gateway import get_stripe_gateway
+
+    gateway = get_stripe_gateway()
+    return gateway.retrieve_payment_intent
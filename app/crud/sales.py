@@ -0,0 +1,218 @@
+import random
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from app.core.config import settings
+from app.schemas.order import DailySalesSummary, SalesSummaryResponse
+
+PAID_STATUSES = {"completed", "paid offline", "paid online"}
+
+
+class OrderSnapshot:
+    """The fields of an order that feed the daily sales rollups"""
+
+    def __init__(self, caterer_id: Optional[int], menu_date: date, status: str,
+                 payment_status: Optional[str], payment_method: Optional[str], total):
+        self.caterer_id = caterer_id
+        self.menu_date = menu_date
+        self.status = status
+        self.payment_status = payment_status
+        self.payment_method = payment_method
+        self.total = Decimal(total or 0)
+
+    @classmethod
+    def of(cls, order) -> "OrderSnapshot":
+        return cls(order.caterer_id, order.menu_date, order.status,
+                   order.payment_status, order.payment_method, order.total)
+
+    def contribution(self) -> Tuple[int, Decimal, Decimal, int, str]:
+        """(order_count, gross_total, paid_total, cancelled_count, payment_method) for this order"""
+        method = self.payment_method or "unspecified"
+        if self.status == "cancelled":
+            return 0, Decimal("0"), Decimal("0"), 1, method
+        paid = self.total if self.payment_status in PAID_STATUSES else Decimal("0")
+        return 1, self.total, paid, 0, method
+
+
+class SalesRollupCRUD:
+
+    @staticmethod
+    def record_changes(db: Session, changes: Iterable[Tuple[Optional[OrderSnapshot], Optional[OrderSnapshot]]]) -> None:
+        """Apply (before, after) order changes to the rollups as additive deltas.
+
+        Call inside the transaction that changes the orders so the rollups
+        commit or roll back with them. `before` is None for new orders.
+
+        Each call lands on one randomly chosen slot row per caterer/day, so
+        concurrent orders for the same busy day rarely wait on each other's
+        row lock. Totals are the sum over slots.
+        """
+        day_deltas: Dict[Tuple[int, date], list] = {}
+        method_deltas: Dict[Tuple[int, date, str], Decimal] = {}
+
+        for before, after in changes:
+            for snapshot, sign in ((before, -1), (after, 1)):
+                if snapshot is None or snapshot.caterer_id is None:
+                    continue
+                order_count, gross, paid, cancelled, method = snapshot.contribution()
+                delta = day_deltas.setdefault((snapshot.caterer_id, snapshot.menu_date), [0, Decimal("0"), Decimal("0"), 0])
+                delta[0] += sign * order_count
+                delta[1] += sign * gross
+                delta[2] += sign * paid
+                delta[3] += sign * cancelled
+                if order_count:
+                    key = (snapshot.caterer_id, snapshot.menu_date, method)
+                    method_deltas[key] = method_deltas.get(key, Decimal("0")) + sign * gross
+
+        day_deltas = {key: delta for key, delta in day_deltas.items() if any(delta)}
+        method_deltas = {key: delta for key, delta in method_deltas.items() if delta}
+        slot = random.randrange(settings.sales_rollup_slots)
+
+        if day_deltas:
+            # Sorted keys keep the row lock order stable across concurrent writers
+            keys = sorted(day_deltas)
+            db.execute(text("""
+                INSERT INTO daily_sales_rollup
+                    (caterer_id, menu_date, order_count, gross_total, paid_total, cancelled_count, slot)
+                SELECT *, CAST(:slot AS smallint) FROM unnest(
+                    CAST(:caterer_ids AS integer[]), CAST(:menu_dates AS date[]),
+                    CAST(:order_counts AS integer[]), CAST(:gross_totals AS numeric[]),
+                    CAST(:paid_totals AS numeric[]), CAST(:cancelled_counts AS integer[])
+                )
+                ON CONFLICT (caterer_id, menu_date, slot) DO UPDATE SET
+                    order_count = daily_sales_rollup.order_count + EXCLUDED.order_count,
+                    gross_total = daily_sales_rollup.gross_total + EXCLUDED.gross_total,
+                    paid_total = daily_sales_rollup.paid_total + EXCLUDED.paid_total,
+                    cancelled_count = daily_sales_rollup.cancelled_count + EXCLUDED.cancelled_count,
+                    updated_at = CURRENT_TIMESTAMP
+            """), {
+                "caterer_ids": [key[0] for key in keys],
+                "menu_dates": [key[1] for key in keys],
+                "order_counts": [day_deltas[key][0] for key in keys],
+                "gross_totals": [day_deltas[key][1] for key in keys],
+                "paid_totals": [day_deltas[key][2] for key in keys],
+                "cancelled_counts": [day_deltas[key][3] for key in keys],
+                "slot": slot
+            })
+
+        if method_deltas:
+            keys = sorted(method_deltas)
+            db.execute(text("""
+                INSERT INTO daily_payment_method_rollup (caterer_id, menu_date, payment_method, total, slot)
+                SELECT *, CAST(:slot AS smallint) FROM unnest(
+                    CAST(:caterer_ids AS integer[]), CAST(:menu_dates AS date[]),
+                    CAST(:payment_methods AS varchar[]), CAST(:totals AS numeric[])
+                )
+                ON CONFLICT (caterer_id, menu_date, payment_method, slot) DO UPDATE SET
+                    total = daily_payment_method_rollup.total + EXCLUDED.total
+            """), {
+                "caterer_ids": [key[0] for key in keys],
+                "menu_dates": [key[1] for key in keys],
+                "payment_methods": [key[2] for key in keys],
+                "totals": [method_deltas[key] for key in keys],
+                "slot": slot
+            })
+
+    @staticmethod
+    def get_summary(db: Session, caterer_id: int, start_date: date, end_date: date) -> SalesSummaryResponse:
+        """Per-day sales for a caterer, read only from the rollup tables"""
+        rows = db.execute(text("""
+            WITH days AS (
+                SELECT
+                    menu_date, SUM(order_count)::int AS order_count, SUM(gross_total) AS gross_total,
+                    SUM(paid_total) AS paid_total, SUM(cancelled_count)::int AS cancelled_count
+                FROM daily_sales_rollup
+                WHERE caterer_id = :caterer_id AND menu_date BETWEEN :start_date AND :end_date
+                GROUP BY menu_date
+            ),
+            methods AS (
+                SELECT menu_date, payment_method, SUM(total) AS total
+                FROM daily_payment_method_rollup
+                WHERE caterer_id = :caterer_id AND menu_date BETWEEN :start_date AND :end_date
+                GROUP BY menu_date, payment_method
+                HAVING SUM(total) <> 0
+            )
+            SELECT
+                d.menu_date, d.order_count, d.gross_total, d.paid_total, d.cancelled_count,
+                COALESCE((
+                    -- totals as text so they arrive as exact decimals
+                    SELECT json_object_agg(m.payment_method, m.total::text)
+                    FROM methods m
+                    WHERE m.menu_date = d.menu_date
+                ), '{}'::json) AS payment_method_totals
+            FROM days d
+            ORDER BY d.menu_date
+        """), {"caterer_id": caterer_id, "start_date": start_date, "end_date": end_date}).fetchall()
+
+        days = [
+            DailySalesSummary(
+                menu_date=row.menu_date,
+                order_count=row.order_count,
+                gross_total=row.gross_total,
+                paid_total=row.paid_total,
+                cancelled_count=row.cancelled_count,
+                payment_method_totals=row.payment_method_totals
+            )
+            for row in rows
+        ]
+
+        method_totals: Dict[str, Decimal] = {}
+        for day in days:
+            for method, total in day.payment_method_totals.items():
+                method_totals[method] = method_totals.get(method, Decimal("0")) + total
+
+        return SalesSummaryResponse(
+            start_date=start_date,
+            end_date=end_date,
+            days=days,
+            totals=DailySalesSummary(
+                menu_date=None,
+                order_count=sum(day.order_count for day in days),
+                gross_total=sum((day.gross_total for day in days), Decimal("0")),
+                paid_total=sum((day.paid_total for day in days), Decimal("0")),
+                cancelled_count=sum(day.cancelled_count for day in days),
+                payment_method_totals=method_totals
+            )
+        )
+
+    @staticmethod
+    def rebuild(db: Session, start_date: Optional[date] = None, end_date: Optional[date] = None) -> int:
+        """Recompute the rollups from raw orders for a date range (all dates by default).
+
+        Used for the initial backfill and to repair drift. The caller commits.
+        """
+        params = {"start_date": start_date or date.min, "end_date": end_date or date.max}
+        db.execute(text("""
+            DELETE FROM daily_sales_rollup WHERE menu_date BETWEEN :start_date AND :end_date
+        """), params)
+        db.execute(text("""
+            DELETE FROM daily_payment_method_rollup WHERE menu_date BETWEEN :start_date AND :end_date
+        """), params)
+
+        days = db.execute(text("""
+            INSERT INTO daily_sales_rollup
+                (caterer_id, menu_date, order_count, gross_total, paid_total, cancelled_count)
+            SELECT
+                caterer_id,
+                menu_date,
+                COUNT(*) FILTER (WHERE status <> 'cancelled'),
+                COALESCE(SUM(total) FILTER (WHERE status <> 'cancelled'), 0),
+                COALESCE(SUM(total) FILTER (WHERE status <> 'cancelled' AND payment_status = ANY(:paid_statuses)), 0),
+                COUNT(*) FILTER (WHERE status = 'cancelled')
+            FROM orders
+            WHERE caterer_id IS NOT NULL AND menu_date BETWEEN :start_date AND :end_date
+            GROUP BY caterer_id, menu_date
+        """), {**params, "paid_statuses": list(PAID_STATUSES)}).rowcount
+
+        db.execute(text("""
+            INSERT INTO daily_payment_method_rollup (caterer_id, menu_date, payment_method, total)
+            SELECT caterer_id, menu_date, COALESCE(payment_method, 'unspecified'), SUM(total)
+            FROM orders
+            WHERE caterer_id IS NOT NULL AND status <> 'cancelled'
+              AND menu_date BETWEEN :start_date AND :end_date
+            GROUP BY caterer_id, menu_date, COALESCE(payment_method, 'unspecified')
+        """), params)
+
+        return days
@@ -0,0 +1,118 @@
+from typing import Dict, List
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from fastapi import HTTPException, status
+from app.models.menu import MenuItemStock
+
+
+class StockCRUD:
+
+    @staticmethod
+    def sync_menu_stock(db: Session, menu_id: str, items: List[Dict]) -> None:
+        """Mirror per-item capacities from a scheduled menu's items into menu_item_stock.
+
+        Items without a capacity are unlimited and have no stock row. Existing
+        reservations are kept when a capacity is changed. The caller commits.
+        """
+        capacities = {
+            int(item["catalog_item_id"]): int(item["capacity"])
+            for item in items
+            if item.get("capacity") is not None and item.get("catalog_item_id") is not None
+        }
+
+        db.query(MenuItemStock).filter(
+            MenuItemStock.menu_id == menu_id,
+            MenuItemStock.catalog_item_id.notin_(list(capacities))
+        ).delete(synchronize_session=False)
+
+        if capacities:
+            db.execute(text("""
+                INSERT INTO menu_item_stock (menu_id, catalog_item_id, capacity, reserved)
+                SELECT :menu_id, c.catalog_item_id, c.capacity, 0
+                FROM unnest(CAST(:item_ids AS bigint[]), CAST(:capacities AS integer[]))
+                    AS c(catalog_item_id, capacity)
+                ON CONFLICT (menu_id, catalog_item_id)
+                DO UPDATE SET capacity = EXCLUDED.capacity
+            """), {
+                "menu_id": menu_id,
+                "item_ids": list(capacities.keys()),
+                "capacities": list(capacities.values())
+            })
+
+    @staticmethod
+    def reserve(db: Session, menu_id: str, quantities: Dict[int, int]) -> None:
+        """Atomically reserve stock for every capped item of an order.
+
+        A single conditional UPDATE increments `reserved` only where it stays
+        within `capacity`, so concurrent orders never oversell and no row is
+        locked beyond this statement's transaction. Any capped item that could
+        not be reserved fails the whole order with 409; the caller must roll back.
+        """
+        if not quantities:
+            return
+
+        # Sorted ids keep the row lock order stable across concurrent orders
+        item_ids = sorted(quantities)
+        rejected = db.execute(text("""
+            WITH requested AS (
+                SELECT *
+                FROM unnest(CAST(:item_ids AS bigint[]), CAST(:quantities AS integer[]))
+                    AS r(catalog_item_id, quantity)
+            ),
+            reserved AS (
+                UPDATE menu_item_stock s
+                SET reserved = s.reserved + r.quantity
+                FROM requested r
+                WHERE s.menu_id = :menu_id
+                  AND s.catalog_item_id = r.catalog_item_id
+                  AND s.reserved + r.quantity <= s.capacity
+                RETURNING s.catalog_item_id
+            )
+            SELECT s.catalog_item_id, GREATEST(s.capacity - s.reserved, 0) AS remaining
+            FROM menu_item_stock s
+            JOIN requested r ON r.catalog_item_id = s.catalog_item_id
+            WHERE s.menu_id = :menu_id
+              AND s.catalog_item_id NOT IN (SELECT catalog_item_id FROM reserved)
+        """), {
+            "menu_id": menu_id,
+            "item_ids": item_ids,
+            "quantities": [quantities[item_id] for item_id in item_ids]
+        }).fetchall()
+
+        if rejected:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail={
+                    "message": "Not enough stock for some items",
+                    "items": [
+                        {"catalog_item_id": row.catalog_item_id, "remaining": row.remaining}
+                        for row in rejected
+                    ]
+                }
+            )
+
+    @staticmethod
+    def release(db: Session, menu_id: str, quantities: Dict[int, int]) -> None:
+        """Give reserved stock back, e.g. when an order is cancelled. The caller commits."""
+        if not quantities:
+            return
+
+        db.execute(text("""
+            UPDATE menu_item_stock s
+            SET reserved = GREATEST(s.reserved - r.quantity, 0)
+            FROM unnest(CAST(:item_ids AS bigint[]), CAST(:quantities AS integer[]))
+                AS r(catalog_item_id, quantity)
+            WHERE s.menu_id = :menu_id
+              AND s.catalog_item_id = r.catalog_item_id
+        """), {
+            "menu_id": menu_id,
+            "item_ids": list(quantities.keys()),
+            "quantities": list(quantities.values())
+        })
+
+    @staticmethod
+    def get_menu_stock(db: Session, menu_id: str) -> List[MenuItemStock]:
+        """Capacity and reservations for every capped item on a menu"""
+        return db.query(MenuItemStock).filter(
+            MenuItemStock.menu_id == menu_id
+        ).order_by(MenuItemStock.catalog_item_id).all()
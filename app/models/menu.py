@@ -1,12 +1,11 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, Boolean, Date, ForeignKey, DECIMAL,Sequence
+from sqlalchemy import Column, BigInteger, Integer, String, DateTime, Text, JSON, Boolean, Date, ForeignKey, DECIMAL,Sequence
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
 from sqlalchemy.dialects.postgresql import JSONB
 
-order_id_seq = Sequence('order_id_seq', start=1001, increment=1)
-menu_item_id_seq = Sequence('menu_item_id_seq', start=1001, increment=1)
-combo_id_seq= Sequence('menu_item_id_seq', start=2001, increment=1)
+# Menu items and combos share one catalog id space: stock, pricing and prep sheets key on it
+menu_item_id_seq = Sequence('menu_item_id_seq', start=1001, increment=1, cache=50)
 
 class ScheduledMenu(Base):
     __tablename__ = "scheduled_menu"
@@ -47,7 +46,7 @@ class ScheduledMenu(Base):
 
 class MenuCatalog(Base):
     __tablename__ = "menu_catalog"
-    menu_item_id = Column(Integer, menu_item_id_seq, primary_key=True, server_default=menu_item_id_seq.next_value())
+    menu_item_id = Column(BigInteger, menu_item_id_seq, primary_key=True, server_default=menu_item_id_seq.next_value())
     item_name = Column(String(100), nullable=False)
     description = Column(Text)
     default_price = Column(DECIMAL(8,2), nullable=False)
@@ -62,11 +61,19 @@ class MenuCatalog(Base):
 class MenuCombo(Base):
     __tablename__ = "menu_combo_catalog"
     
-    combo_id = Column(Integer, combo_id_seq, primary_key=True, server_default=combo_id_seq.next_value())
+    combo_id = Column(BigInteger, menu_item_id_seq, primary_key=True, server_default=menu_item_id_seq.next_value())
     combo_name = Column(String(100), nullable=False)
     combo_items = Column(JSONB, nullable=False)
     combo_description = Column(Text, nullable=True)
     combo_default_price = Column(DECIMAL(8, 2), nullable=False)
     combo_category = Column(String(50), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class MenuItemStock(Base):
+    __tablename__ = "menu_item_stock"
+
+    menu_id = Column(String, ForeignKey("scheduled_menu.menu_id"), primary_key=True)
+    catalog_item_id = Column(BigInteger, primary_key=True)
+    capacity = Column(Integer, nullable=False)
+    reserved = Column(Integer, nullable=False, default=0, server_default='0')
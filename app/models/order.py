@@ -1,14 +1,16 @@
-from sqlalchemy import Column, Integer, String, DateTime, Date, JSON, DECIMAL, ForeignKey, Sequence
+from sqlalchemy import func, Column, BigInteger, Integer, String, DateTime, Date, JSON, DECIMAL, ForeignKey, Sequence, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 
-order_id_seq = Sequence('order_id_seq', start=1001, increment=1)
+order_id_seq = Sequence('order_id_seq', start=1001, increment=1, cache=50)
 
 class Order(Base):
     __tablename__ = "orders"
 
-    order_id = Column(Integer,order_id_seq, primary_key=True, server_default=order_id_seq.next_value())
+    # Unique on its own; the table's physical key is (order_id, menu_date) once partitioned
+    order_id = Column(BigInteger, order_id_seq, primary_key=True, server_default=order_id_seq.next_value())
     menu_id = Column(String, ForeignKey("scheduled_menu.menu_id"), nullable=False)
+    caterer_id = Column(Integer, ForeignKey("users.caterer_id"))  # Denormalized from scheduled_menu for scoped lookups
     customer_name = Column(String, nullable=False)
     customer_phone = Column(String)
     customer_address = Column(JSON, nullable=False)
@@ -22,7 +24,12 @@ class Order(Base):
     payment_status = Column(String)
     status = Column(String, nullable=False)  # 'pending', 'confirmed', 'preparing', 'ready', 'delivered', 'cancelled'
     special_instructions = Column(String)
-    payment_id = Column(Integer, ForeignKey("payments.payment_id"))
+    payment_id = Column(BigInteger, ForeignKey("payments.payment_id"))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationships
-    payment = relationship("Payment", back_populates="order")
\ No newline at end of file
+    payment = relationship("Payment", back_populates="order")
+
+    __table_args__ = (
+        Index("idx_orders_caterer_menu_date", "caterer_id", "menu_date", "order_id"),
+    )
\ No newline at end of file
@@ -1,14 +1,16 @@
-from sqlalchemy import Column, Integer, String, DateTime, DECIMAL, Text, ForeignKey,Sequence
+from sqlalchemy import Column, BigInteger, Integer, String, DateTime, DECIMAL, Text, ForeignKey,Sequence
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import deferred, relationship
 from app.database import Base
 
-payment_id_seq = Sequence('payment_id_seq', start=1001, increment=1)
+payment_id_seq = Sequence('payment_id_seq', start=1001, increment=1, cache=50)
 
 class Payment(Base):
     __tablename__ = "payments"
 
-    payment_id = Column(Integer, payment_id_seq, primary_key=True , server_default=payment_id_seq.next_value())
+    # Unique on its own; the table's physical key is (payment_id, created_at) once partitioned
+    payment_id = Column(BigInteger, payment_id_seq, primary_key=True , server_default=payment_id_seq.next_value())
     payment_method = Column(String(50), nullable=False)
     payment_status = Column(String(20), nullable=False, default='pending')
     amount = Column(DECIMAL(10,2), nullable=False)
@@ -16,7 +18,12 @@ class Payment(Base):
     payment_intent_id = Column(String(60))
     transaction_id = Column(String(255))
     payment_gateway = Column(String(50))
-    gateway_response = Column(Text)
+    # Raw gateway payloads are only loaded when asked for (undefer them explicitly)
+    gateway_response = deferred(Column(Text))  # legacy text dump, converted by migrate_gateway_data.py
+    gateway_data = deferred(Column(JSONB))
+    gateway_status = Column(String(30))
+    gateway_amount = Column(Integer)  # minor units received, as reported by the gateway
+    gateway_charge_id = Column(String(60))
     failure_reason = Column(Text)
     processed_at = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,4 +1,3 @@
-from fastapi import BackgroundTasks
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
@@ -37,10 +36,9 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 @router.post("/register")
 async def register_user_endpoint(
     user: UserCreateEnhanced, 
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
-    return register_user(user, background_tasks, db)
+    return register_user(user, db)
 
 @router.get("/confirm-email")
 async def confirm_email_endpoint(
@@ -52,7 +50,6 @@ async def confirm_email_endpoint(
 @router.post("/resend-confirmation")
 async def resend_confirmation_endpoint(
     email: str,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
-    return resend_confirmation_email(email, background_tasks, db)
\ No newline at end of file
+    return resend_confirmation_email(email, db)
\ No newline at end of file
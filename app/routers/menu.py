@@ -4,7 +4,7 @@ from sqlalchemy import select, distinct, text
 from typing import List, Optional, Union
 from app.database import get_db
 from datetime import date
-from app.models.menu import ScheduledMenu, MenuCatalog
+from app.models.menu import ScheduledMenu, MenuCatalog, MenuCombo
 from app.models.user import User
 from app.schemas.menu import (
     ScheduledMenuCreate, 
@@ -13,11 +13,15 @@ from app.schemas.menu import (
     MenuCatalogCreate,
     MenuCatalogResponse,
     MenuCatalogUpdate,
-    ComboCreate, ComboUpdate,ComboResponse, ComboListResponse, MenuItemResponse, ComboCatalogResponse,ComboItemDetail
+    ComboCreate, ComboUpdate,ComboResponse, ComboListResponse, MenuItemResponse, ComboCatalogResponse,ComboItemDetail,
+    MenuItemStockResponse
 )
 
 from app.core.dependencies import get_current_caterer, get_current_user
 from app.crud.combo import ComboCRUD
+from app.crud.pricing import PricingCRUD
+from app.crud.stock import StockCRUD
+from app.utils.responses import FastJSONResponse, select_fields, sparse_fields, sparse_response
 import uuid
 
 router = APIRouter(prefix="/menu", tags=["menu"])
@@ -28,10 +32,12 @@ def get_scheduled_menus(
     limit: int = 100,
     date_filter: Optional[str] = None,  # YYYY-MM-DD
     caterer_id: Optional[int] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. menu_id,name,menu_date"),
     db: Session = Depends(get_db)
 ):
     from app.models.menu import ScheduledMenu
     
+    selected = sparse_fields(fields, ScheduledMenu, ScheduledMenuResponse)
     query = db.query(ScheduledMenu)
     
     if date_filter:
@@ -45,9 +51,11 @@ def get_scheduled_menus(
         query = query.filter(ScheduledMenu.caterer_id == caterer_id)
     
     query = query.filter(ScheduledMenu.active == True)
-    query = query.order_by(ScheduledMenu.menu_date.desc())
+    query = query.order_by(ScheduledMenu.menu_date.desc()).offset(skip).limit(limit)
+    if selected:
+        return sparse_response(query, ScheduledMenu, selected)
     
-    menus = query.offset(skip).limit(limit).all()
+    menus = query.all()
     return menus
 
 @router.get("/scheduled/inactive", response_model=List[ScheduledMenuResponse])
@@ -56,10 +64,12 @@ def get_scheduled_menus(
     limit: int = 100,
     date_filter: Optional[str] = None,  # YYYY-MM-DD
     caterer_id: Optional[int] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. menu_id,name,menu_date"),
     db: Session = Depends(get_db)
 ):
     from app.models.menu import ScheduledMenu
     
+    selected = sparse_fields(fields, ScheduledMenu, ScheduledMenuResponse)
     query = db.query(ScheduledMenu)
     
     if date_filter:
@@ -73,21 +83,28 @@ def get_scheduled_menus(
         query = query.filter(ScheduledMenu.caterer_id == caterer_id)
     
     query = query.filter(ScheduledMenu.active == False)
-    query = query.order_by(ScheduledMenu.menu_date.desc())
+    query = query.order_by(ScheduledMenu.menu_date.desc()).offset(skip).limit(limit)
+    if selected:
+        return sparse_response(query, ScheduledMenu, selected)
     
-    menus = query.offset(skip).limit(limit).all()
+    menus = query.all()
     return menus
 
 @router.get("/scheduled/my", response_model=List[ScheduledMenuResponse])
 def get_my_scheduled_menus(
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. menu_id,name,menu_date"),
     current_user = Depends(get_current_caterer),
     db: Session = Depends(get_db)
 ):
     from app.models.menu import ScheduledMenu
     
-    menus = db.query(ScheduledMenu).filter(
+    selected = sparse_fields(fields, ScheduledMenu, ScheduledMenuResponse)
+    query = db.query(ScheduledMenu).filter(
         ScheduledMenu.caterer_id == current_user.caterer_id
-    ).order_by(ScheduledMenu.menu_date.desc()).all()
+    ).order_by(ScheduledMenu.menu_date.desc())
+    if selected:
+        return sparse_response(query, ScheduledMenu, selected)
+    menus = query.all()
     
     return menus    
 
@@ -115,7 +132,8 @@ def create_scheduled_menu(
             "price": float(item.price),
             "category": item.category,
             "is_combo": item.is_combo,
-            "combo_items": item.combo_items
+            "combo_items": item.combo_items,
+            "capacity": item.capacity
         }
         items_json.append(item_dict)
     
@@ -130,6 +148,8 @@ def create_scheduled_menu(
     )
     
     db.add(db_menu)
+    db.flush()
+    StockCRUD.sync_menu_stock(db, menu_id, items_json)
     db.commit()
     db.refresh(db_menu)
     
@@ -165,6 +185,7 @@ def update_scheduled_menu_status(menu_id: str,
         db_menu.active = statusData.active
     # Update status
     db.commit()
+    PricingCRUD.invalidate(menu_id)
     db.refresh(db_menu)
     
     return db_menu
@@ -191,7 +212,7 @@ def update_scheduled_menu(
         if key == "items" and value:
             # Convert items to JSON format
             items_json = []
-            for item in value:
+            for item in menu_update.items:
                 item_dict = {
                     "catalog_item_id": item.catalog_item_id,
                     "item_name": item.item_name,
@@ -199,18 +220,26 @@ def update_scheduled_menu(
                     "price": float(item.price),
                     "category": item.category,
                     "is_combo": item.is_combo,
-                    "combo_items": item.combo_items
+                    "combo_items": item.combo_items,
+                    "capacity": item.capacity
                 }
                 items_json.append(item_dict)
             setattr(db_menu, key, items_json)
+            StockCRUD.sync_menu_stock(db, menu_id, items_json)
         else:
             setattr(db_menu, key, value)
     
     db.commit()
+    PricingCRUD.invalidate(menu_id)
     db.refresh(db_menu)
     
     return db_menu
 
+@router.get("/scheduled/{menu_id}/stock", response_model=List[MenuItemStockResponse])
+def get_scheduled_menu_stock(menu_id: str, db: Session = Depends(get_db)):
+    """Capacity and reserved portions for each capped item on a menu"""
+    return StockCRUD.get_menu_stock(db, menu_id)
+
 @router.post("/scheduled/upload-flyer")
 async def upload_menu_flyer(
     file: UploadFile = File(...),
@@ -320,6 +349,7 @@ def delete_scheduled_menu(
     # Soft delete
     db_menu.active = False
     db.commit()
+    PricingCRUD.invalidate(menu_id)
     
     return {"message": "Scheduled menu deleted successfully"}
 
@@ -330,10 +360,12 @@ def get_catalog_items(
     limit: int = 100,
     category: Optional[str] = None,
     search: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. menu_item_id,item_name,default_price"),
     db: Session = Depends(get_db)
 ):
     from app.models.menu import MenuCatalog
     
+    selected = sparse_fields(fields, MenuCatalog, MenuCatalogResponse)
     query = db.query(MenuCatalog)
     
     # Filter by category if provided
@@ -349,9 +381,11 @@ def get_catalog_items(
         )
     
     # Order by category and name
-    query = query.order_by(MenuCatalog.category, MenuCatalog.item_name)
+    query = query.order_by(MenuCatalog.category, MenuCatalog.item_name).offset(skip).limit(limit)
+    if selected:
+        return sparse_response(query, MenuCatalog, selected)
     
-    items = query.offset(skip).limit(limit).all()
+    items = query.all()
     return items
 
 @router.post("/catalog/create_menu_item", response_model=MenuCatalogResponse)
@@ -444,9 +478,14 @@ def get_all_combos(
     limit: int = Query(100, ge=1, le=1000, description="Number of records to return"),
     category: Optional[str] = Query(None, description="Filter by category"),
     search: Optional[str] = Query(None, description="Search by combo name"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. combo_id,combo_name,combo_default_price"),
     db: Session = Depends(get_db)
 ):
     """Get all combo items with optional filtering"""
+    # Stored combo_items are bare ids and quantities, not the detailed items listed here
+    selected = sparse_fields(fields, MenuCombo, ComboListResponse, exclude=["combo_items"])
+    if selected:
+        return sparse_response(ComboCRUD.list_query(db, skip, limit, category, search), MenuCombo, selected)
     return ComboCRUD.get_all_combos(db, skip, limit, category, search)
 
 @router.get("/catalog/combo/{combo_id}", response_model=ComboResponse)
@@ -480,15 +519,50 @@ def get_combo_categories(db: Session = Depends(get_db)):
     """Get all unique combo categories"""
     return ComboCRUD.get_combo_categories(db)
 
+# /catalog/all output columns: (name, regular item expression, combo expression)
+CATALOG_ALL_COLUMNS = [
+    ("menu_item_id", "menu_item_id", "combo_id"),
+    ("item_name", "item_name", "combo_name"),
+    ("description", "description", "combo_description"),
+    ("default_price", "default_price::float8", "combo_default_price::float8"),
+    ("category", "category", "combo_category"),
+    ("created_at", "created_at", "created_at"),
+    ("updated_at", "updated_at", "updated_at"),
+    ("is_combo", "false", "true"),
+    ("combo_id", "null::bigint", "combo_id"),
+    ("combo_name", "null", "combo_name"),
+    ("combo_description", "null", "combo_description"),
+    ("combo_default_price", "null::numeric", "combo_default_price"),
+    ("combo_category", "null", "combo_category"),
+    # Detailed combo items
+    ("combo_items", "null::json", """(
+        SELECT json_agg(
+            json_build_object(
+                'menu_item_id', (item->>'menu_item_id')::int,
+                'item_name', m.item_name,
+                'default_price', m.default_price,
+                'quantity', (item->>'quantity')::int
+            )
+        )
+        FROM jsonb_array_elements(c.combo_items) AS item
+        LEFT JOIN menu_catalog m ON m.menu_item_id = (item->>'menu_item_id')::int
+        WHERE m.menu_item_id IS NOT NULL
+    )"""),
+    ("item_count", "0", "jsonb_array_length(c.combo_items)"),
+]
+
 @router.get("/catalog/all")
 def get_all_catalog_items(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     category: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. menu_item_id,item_name,default_price,is_combo"),
     db: Session = Depends(get_db)
 ):
     """Get all catalog items (both regular items and combos)"""
+    # A projection returns exactly the requested keys, null where a row has no such value
+    selected = select_fields(fields, [name for name, _, _ in CATALOG_ALL_COLUMNS])
     try:
         # Build WHERE conditions
         where_conditions = []
@@ -503,70 +577,35 @@ def get_all_catalog_items(
             params["search"] = f"%{search}%"
         
         where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+
+        # Only build the columns asked for, plus those filtered and ordered on
+        needed = set(selected or [name for name, _, _ in CATALOG_ALL_COLUMNS]) | {"category", "item_name", "created_at"}
+        columns = [column for column in CATALOG_ALL_COLUMNS if column[0] in needed]
+        item_columns = ", ".join(f"{item} AS {name}" for name, item, _ in columns)
+        combo_columns = ", ".join(f"{combo} AS {name}" for name, _, combo in columns)
         
         # Execute the combined query
         combined_query = text(f"""
             WITH all_items AS (
                 -- Regular menu items
-                SELECT 
-                    menu_item_id,
-                    item_name,
-                    description,
-                    default_price,
-                    category,
-                    created_at,
-                    updated_at,
-                    false as is_combo,
-                    null::json as combo_items,
-                    null as combo_name,
-                    null as combo_price,
-                    null::int as combo_id,
-                    null as combo_description,
-                    null as combo_category,
-                    0 as item_count
+                SELECT {item_columns}
                 FROM menu_catalog
                 
                 UNION ALL
                 
-                -- Combo items with detailed information
-                SELECT 
-                    combo_id as menu_item_id,
-                    combo_name as item_name,
-                    combo_description as description,
-                    combo_default_price as default_price,
-                    combo_category as category,
-                    created_at,
-                    updated_at,
-                    true as is_combo,
-                    -- Get detailed combo items
-                    (
-                        SELECT json_agg(
-                            json_build_object(
-                                'menu_item_id', (item->>'menu_item_id')::int,
-                                'item_name', m.item_name,
-                                'default_price', m.default_price,
-                                'quantity', (item->>'quantity')::int
-                            )
-                        )
-                        FROM jsonb_array_elements(c.combo_items) AS item
-                        LEFT JOIN menu_catalog m ON m.menu_item_id = (item->>'menu_item_id')::int
-                        WHERE m.menu_item_id IS NOT NULL
-                    ) as combo_items,
-                    combo_name,
-                    combo_default_price as combo_price,
-                    combo_id,
-                    combo_description,
-                    combo_category,
-                    jsonb_array_length(c.combo_items) as item_count
+                -- Combo items
+                SELECT {combo_columns}
                 FROM menu_combo_catalog c
             )
-            SELECT * FROM all_items
+            SELECT {", ".join(selected) if selected else "*"} FROM all_items
             {where_clause}
             ORDER BY created_at DESC
             OFFSET :skip LIMIT :limit
         """)
         
         results = db.execute(combined_query, params).fetchall()
+        if selected:
+            return FastJSONResponse([dict(row._mapping) for row in results])
         
         # Convert to list of dictionaries
         items = []
@@ -587,7 +626,7 @@ def get_all_catalog_items(
                     "combo_id": row.combo_id,
                     "combo_name": row.combo_name,
                     "combo_description": row.combo_description,
-                    "combo_default_price": str(row.combo_price),
+                    "combo_default_price": str(row.combo_default_price),
                     "combo_category": row.combo_category,
                     "combo_items": row.combo_items if row.combo_items else [],
                     "item_count": row.item_count or 0
@@ -1,11 +1,18 @@
 import logging
-from fastapi import APIRouter, BackgroundTasks,HTTPException
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from app.core.dependencies import get_current_admin
+from app.crud.notifications import NotificationOutboxCRUD
+from app.database import get_db
+from app.models.user import User
 from app.schemas.notifications import (
    EmailAttachment,
    EmailRequest,
    SMSRequest,
    EmailService,
-   SMSService
+   SMSService,
+   NotificationStatusResponse
 )
 import os
 router = APIRouter(prefix="/notifications", tags=["notifications"])
@@ -22,60 +29,101 @@ TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
 logger = logging.getLogger(__name__)
 
 @router.post("/send-email")
-async def send_email_endpoint(
+def send_email_endpoint(
     email_request: EmailRequest,
-    background_tasks: BackgroundTasks
+    db: Session = Depends(get_db)
 ):
     """
-    Send email with optional PDF attachment
+    Queue an email (with optional PDF attachment) for the notification worker.
+    Track it with GET /notifications/outbox/{message_id}.
     """
-    try:
-        # Validate email configuration
-        if not EMAIL_ADDRESS or not EMAIL_PASSWORD:
-            raise HTTPException(
-                status_code=500, 
-                detail="Email service not configured"
-            )
-
-        # Send email in background
-        background_tasks.add_task(EmailService.send_email, email_request)
-        
-        return {
-            "success": True,
-            "message": "Email is being sent"
-        }
+    # Validate email configuration
+    if not EMAIL_ADDRESS or not EMAIL_PASSWORD:
+        raise HTTPException(
+            status_code=500, 
+            detail="Email service not configured"
+        )
 
+    try:
+        message_id = NotificationOutboxCRUD.enqueue(db, "email", "email", email_request.model_dump())
+        db.commit()
     except Exception as e:
+        db.rollback()
         logger.error(f"Email endpoint error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail="Failed to queue email")
+
+    return {
+        "success": True,
+        "message": "Email is being sent",
+        "message_id": message_id
+    }
 
 @router.post("/send-sms")
-async def send_sms_endpoint(
+def send_sms_endpoint(
     sms_request: SMSRequest,
-    background_tasks: BackgroundTasks
+    db: Session = Depends(get_db)
 ):
     """
-    Send SMS notification
+    Queue an SMS notification for the notification worker.
+    Track it with GET /notifications/outbox/{message_id}.
     """
-    try:
-        # Validate SMS configuration
-        if not TWILIO_ACCOUNT_SID or not TWILIO_AUTH_TOKEN:
-            raise HTTPException(
-                status_code=500, 
-                detail="SMS service not configured"
-            )
-
-        # Send SMS in background
-        background_tasks.add_task(SMSService.send_sms, sms_request)
-        
-        return {
-            "success": True,
-            "message": "SMS is being sent"
-        }
+    # Validate SMS configuration
+    if not TWILIO_ACCOUNT_SID or not TWILIO_AUTH_TOKEN:
+        raise HTTPException(
+            status_code=500, 
+            detail="SMS service not configured"
+        )
 
+    try:
+        message_id = NotificationOutboxCRUD.enqueue(db, "sms", "sms", sms_request.model_dump())
+        db.commit()
     except Exception as e:
+        db.rollback()
         logger.error(f"SMS endpoint error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail="Failed to queue SMS")
+
+    return {
+        "success": True,
+        "message": "SMS is being sent",
+        "message_id": message_id
+    }
+
+@router.get("/outbox", response_model=List[NotificationStatusResponse])
+def list_notifications(
+    status: str = Query("dead", description="pending, sending, sent or dead"),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    Most recent outbox messages in a status; by default the dead letters.
+    """
+    return NotificationOutboxCRUD.list_by_status(db, status, limit)
+
+@router.get("/outbox/{message_id}", response_model=NotificationStatusResponse)
+def get_notification_status(message_id: str, db: Session = Depends(get_db)):
+    """
+    Delivery status of a queued email or SMS
+    """
+    message = NotificationOutboxCRUD.get_status(db, message_id)
+    if not message:
+        raise HTTPException(status_code=404, detail="Message not found")
+    return message
+
+@router.post("/outbox/{message_id}/retry", response_model=NotificationStatusResponse)
+def retry_notification(
+    message_id: str,
+    current_user: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    Put a dead-lettered message back in the queue with a fresh set of attempts
+    """
+    if not NotificationOutboxCRUD.requeue(db, message_id):
+        db.rollback()
+        raise HTTPException(status_code=404, detail="No dead-lettered message with this id")
+    db.commit()
+    return NotificationOutboxCRUD.get_status(db, message_id)
 
 # Alternative endpoint for immediate sending (not background)
 @router.post("/send-email-sync")
@@ -1,31 +1,124 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+import logging
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from datetime import datetime
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from app.database import get_db
-from app.models.menu import ScheduledMenu
 from app.models.order import Order
 from app.models.user import User
-from app.schemas.order import OrderCreate, OrderUpdate, OrderUpdateResponse, OrderResponse
-from app.core.dependencies import get_current_user, get_current_caterer
+from app.schemas.order import (
+    OrderCreate, OrderUpdate, OrderUpdateResponse, OrderResponse, OrderBatchUpdateItem, PrepSheetResponse,
+    SalesSummaryResponse, DeliveryPlanResponse, OrderChangesResponse
+)
+from app.core.config import settings
+from app.core.dependencies import get_current_user, get_current_caterer, get_idempotency_owner, get_stream_caterer
+from app.core.security import create_stream_token
+from app.crud.customer_search import CustomerSearchCRUD
+from app.crud.order_events import OrderEventCRUD, order_event_row
+from app.crud.prep import PrepSheetCRUD
+from app.crud.pricing import PricingCRUD
+from app.crud.sales import OrderSnapshot, SalesRollupCRUD
+from app.crud.stock import StockCRUD
+from app.utils.delivery import DeliveryStop, get_postcode_table, plan_delivery_batches
+from app.utils.events import order_event_data, order_events, publish_order_event, sse_stream
+from app.utils.idempotency import idempotent_request
+from app.utils.order_ingest import get_order_ingest_queue
+from app.utils.order_items import order_line_quantities
+from app.utils.responses import sparse_fields, sparse_response
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
 @router.post("/create_orders", response_model=OrderResponse)
 def create_order(
     order: OrderCreate,
+    idempotency_key: Optional[str] = Header(None),
+    idempotency_owner: Optional[str] = Depends(get_idempotency_owner),
     db: Session = Depends(get_db)
 ):
-    db_order = Order(
-        **order.dict(),
+    """
+    Create an order. Retries carrying the same Idempotency-Key header replay
+    the original response instead of inserting another order; a retry while
+    the original is still running gets 409.
+    """
+    with idempotent_request("create_order", idempotency_key, order, idempotency_owner) as request:
+        if request.replay:
+            return request.replay
+        db_order = _create_order(order, db)
+        return request.save(OrderResponse.model_validate(db_order))
+
+def _create_order(order: OrderCreate, db: Session) -> Order:
+    price_table = PricingCRUD.get_price_table(db, order.menu_id)
+    if not price_table:
+        raise HTTPException(status_code=404, detail="Menu not found")
+    if not price_table.active:
+        raise HTTPException(status_code=400, detail="Menu is not accepting orders")
+
+    try:
+        quantities = order_line_quantities(order.items)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Price the order from the menu rather than trusting the client total
+    total = price_table.price(quantities)
+    PricingCRUD.check_total(order.total, total)
+
+    values = dict(
+        **order.dict(exclude={"total"}),
+        caterer_id=price_table.caterer_id,
+        total=total,
         order_date=datetime.utcnow(),
         status="pending",
         payment_status="pending"
     )
+
+    if settings.order_ingest_mode == "batched":
+        # Group commit: the ingest writer reserves stock and inserts this
+        # order together with others arriving in the same few milliseconds
+        try:
+            db_order = get_order_ingest_queue().submit(values, quantities)
+        except FutureTimeoutError:
+            raise HTTPException(status_code=503, detail="Order queue is busy, please retry")
+    else:
+        db_order = _insert_order(db, values, quantities)
+
+    PrepSheetCRUD.invalidate(db_order.menu_date)
+    publish_order_event("order.created", db_order)
+    return db_order
+
+def _insert_order(db: Session, values: dict, quantities: dict) -> Order:
+    # Reserve capped items in their own short transaction so the stock rows
+    # are not locked while the order itself is written
+    try:
+        StockCRUD.reserve(db, values["menu_id"], quantities)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    db_order = Order(**values)
     
-    db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
+    try:
+        db.add(db_order)
+        db.flush()
+        SalesRollupCRUD.record_changes(db, [(None, OrderSnapshot.of(db_order))])
+        OrderEventCRUD.record(db, [order_event_row("order.created", db_order)])
+        # Load server defaults and detach before committing, so the order stays
+        # readable without reopening a transaction: a connection held past the
+        # endpoint waits for a threadpool slot that, at peak, other requests
+        # hold while waiting for a connection
+        db.refresh(db_order)
+        db.expunge(db_order)
+        db.commit()
+    except Exception:
+        db.rollback()
+        StockCRUD.release(db, values["menu_id"], quantities)
+        db.commit()
+        raise HTTPException(status_code=500, detail="Failed to create order")
     
     return db_order
 
@@ -34,12 +127,14 @@ def get_orders(
     skip: int = 0,
     limit: int = 100,
     params: str = None,
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. order_id,customer_name,total,status"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    selected = sparse_fields(fields, Order, OrderResponse)
     if current_user.role == "caterer":
         # Get orders for caterer's menu items
-        query = db.query(Order)
+        query = db.query(Order).filter(Order.caterer_id == current_user.caterer_id)
 
         # Parse params if provided
         if params:
@@ -68,7 +163,10 @@ def get_orders(
                 print(f"Error parsing params: {e}")
         
         # Apply pagination and execute query
-        orders = query.offset(skip).limit(limit).all()
+        query = query.order_by(Order.menu_date, Order.order_id).offset(skip).limit(limit)
+        if selected:
+            return sparse_response(query, Order, selected)
+        orders = query.all()
     else:
         # For admin or customer, get all orders
         orders = []
@@ -80,17 +178,19 @@ def get_orders_by_menudate(
     skip: int = Query(0, ge=0, description="Number of orders to skip for pagination"),
     limit: int = Query(100, ge=1, le=1000, description="Maximum number of orders to return"),
     menu_date: str = Query(..., description="Menu date in YYYY-MM-DD format"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. order_id,customer_name,total,status"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    selected = sparse_fields(fields, Order, OrderResponse)
     if current_user.role == "caterer":
         # Get orders for caterer's menu items
-        query = db.query(Order)
+        query = db.query(Order).filter(Order.caterer_id == current_user.caterer_id)
 
         # Parse params if provided
         if menu_date:
                     parsed_date = datetime.strptime(menu_date, "%Y-%m-%d").date()
-                    query = db.query(Order).filter(
+                    query = query.filter(
                         Order.menu_date == parsed_date  # Ensure caterer only sees their orders
                              )
                 
@@ -98,14 +198,181 @@ def get_orders_by_menudate(
                 # if 'status' in params_dict:
                 #     query = query.filter(Order.status == params_dict['status'])
         
-        # Apply pagination and execute query
-        orders = query.offset(skip).limit(limit).all()
+        # Apply pagination and execute query (served by idx_orders_caterer_menu_date)
+        query = query.order_by(Order.menu_date, Order.order_id).offset(skip).limit(limit)
+        if selected:
+            return sparse_response(query, Order, selected)
+        orders = query.all()
     else:
         # For admin or customer, get all orders
         orders = []
     
     return orders
 
+@router.get("/prepsheet", response_model=PrepSheetResponse)
+def get_prep_sheet(
+    menu_date: str = Query(..., description="Menu date in YYYY-MM-DD format"),
+    current_user: User = Depends(get_current_caterer),
+    db: Session = Depends(get_db)
+):
+    """
+    Quantities to cook for a menu date: totals per ordered item and per dish,
+    with combos expanded into their component dishes. Cancelled orders are excluded.
+    """
+    try:
+        parsed_date = datetime.strptime(menu_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+
+    return PrepSheetCRUD.get_prep_sheet(db, current_user.caterer_id, parsed_date)
+
+@router.get("/sales-summary", response_model=SalesSummaryResponse)
+def get_sales_summary(
+    start_date: str = Query(..., description="First menu date in YYYY-MM-DD format"),
+    end_date: str = Query(..., description="Last menu date in YYYY-MM-DD format"),
+    current_user: User = Depends(get_current_caterer),
+    db: Session = Depends(get_db)
+):
+    """
+    Order count, gross and paid totals, cancellations and per-payment-method
+    totals per menu date, read from the daily sales rollup.
+    """
+    try:
+        parsed_start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        parsed_end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    if parsed_end < parsed_start:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+
+    return SalesRollupCRUD.get_summary(db, current_user.caterer_id, parsed_start, parsed_end)
+
+@router.get("/search", response_model=List[OrderResponse])
+def search_orders(
+    phone: Optional[str] = Query(None, description="Customer phone, any formatting"),
+    email: Optional[str] = Query(None, description="Customer email, case-insensitive"),
+    name: Optional[str] = Query(None, description="Part of the customer name (3+ characters)"),
+    start_date: Optional[str] = Query(None, description="First menu date in YYYY-MM-DD format"),
+    end_date: Optional[str] = Query(None, description="Last menu date in YYYY-MM-DD format"),
+    limit: int = Query(50, ge=1, le=500),
+    current_user: User = Depends(get_current_caterer),
+    db: Session = Depends(get_db)
+):
+    """
+    Find the caterer's orders by customer phone, email or name, optionally
+    within a menu date range. All given criteria must match.
+    """
+    try:
+        parsed_start = datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else None
+        parsed_end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+
+    return CustomerSearchCRUD.search_orders(
+        db, current_user.caterer_id,
+        phone=phone, email=email, name=name,
+        start_date=parsed_start, end_date=parsed_end, limit=limit
+    )
+
+DELIVERABLE_STATUSES = ["confirmed", "preparing", "ready for delivery"]
+
+@router.get("/delivery-batches", response_model=DeliveryPlanResponse)
+def get_delivery_batches(
+    menu_date: str = Query(..., description="Menu date in YYYY-MM-DD format"),
+    drivers: Optional[int] = Query(None, ge=1, le=200, description="Number of driver batches; sized from max_stops when omitted"),
+    max_stops: int = Query(settings.delivery_max_stops_per_batch, ge=1, le=1000, description="Target stops per batch when drivers is omitted"),
+    current_user: User = Depends(get_current_caterer),
+    db: Session = Depends(get_db)
+):
+    """
+    Group a menu date's deliverable orders into balanced driver batches.
+    Addresses are located by postcode district from the bundled postcode
+    table; each batch lists its stops in drop order starting from the
+    caterer's address. Orders whose postcode can't be located are returned
+    separately under `unlocated`.
+    """
+    try:
+        parsed_date = datetime.strptime(menu_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+
+    rows = db.query(
+        Order.order_id, Order.customer_name, Order.customer_phone, Order.customer_address
+    ).filter(
+        Order.caterer_id == current_user.caterer_id,
+        Order.menu_date == parsed_date,
+        Order.status.in_(DELIVERABLE_STATUSES)
+    ).all()
+
+    table = get_postcode_table(settings.postcode_table_path)
+    stops = [
+        DeliveryStop(row.order_id, row.customer_name, row.customer_phone, row.customer_address).locate(table)
+        for row in rows
+    ]
+    depot = DeliveryStop(None, current_user.name, None, current_user.address).locate(table).point
+
+    located = sum(1 for stop in stops if stop.point is not None)
+    driver_count = drivers or max(1, -(-located // max_stops))
+    batches, unlocated = plan_delivery_batches(stops, driver_count, depot, settings.delivery_grid_cell_km)
+
+    return {
+        "menu_date": parsed_date,
+        "order_count": len(stops),
+        "batches": batches,
+        "unlocated": unlocated
+    }
+
+@router.get("/changes", response_model=OrderChangesResponse)
+def get_order_changes(
+    since: Optional[str] = Query(None, description="Cursor from the previous response; omit to get a starting cursor"),
+    limit: int = Query(500, ge=1, le=5000, description="Maximum number of change events to read"),
+    current_user: User = Depends(get_current_caterer),
+    db: Session = Depends(get_db)
+):
+    """
+    Orders created or changed since `since`, in their current state, plus the
+    cursor for the next call. Keep calling while `has_more` is true.
+    """
+    return OrderEventCRUD.get_changes(db, current_user.caterer_id, since, limit)
+
+@router.post("/stream/token")
+def create_order_stream_token(
+    response: Response,
+    current_user: User = Depends(get_current_caterer)
+):
+    """
+    Short-lived token for opening /orders/stream from a browser EventSource,
+    which can't send an Authorization header. Pass it as ?token=..., or rely
+    on the HttpOnly cookie set here. Fetch a new one when the stream errors.
+    """
+    token = create_stream_token(current_user.email)
+    response.set_cookie(
+        "order_stream_token", token,
+        max_age=settings.order_stream_token_ttl_seconds,
+        path="/orders/stream", httponly=True, samesite="lax"
+    )
+    return {"token": token, "expires_in": settings.order_stream_token_ttl_seconds}
+
+@router.get("/stream")
+async def stream_order_events(
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+    current_user: User = Depends(get_stream_caterer)
+):
+    """
+    Server-Sent Events feed of order created/updated/cancelled and payment
+    confirmed/failed events for the caterer's menus. Authenticate with a
+    token from POST /orders/stream/token (query or cookie) or a bearer
+    header. Reconnecting clients send Last-Event-ID to resume; a `reset`
+    event means they must re-fetch.
+    """
+    subscription = order_events.subscribe(current_user.caterer_id, last_event_id)
+    return StreamingResponse(
+        sse_stream(subscription, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/get/{order_id}", response_model=OrderResponse)
 def get_order(
     order_id: int,
@@ -119,8 +386,7 @@ def get_order(
     
     # Check if user has permission to view this order
     if current_user.role == "caterer":
-        scheduled_menu = db.query(ScheduledMenu).filter(ScheduledMenu.menu_date == order.menu_date).first()
-        if not scheduled_menu or scheduled_menu.caterer_id != current_user.caterer_id:
+        if order.caterer_id != current_user.caterer_id:
             raise HTTPException(status_code=403, detail="Not authorized to view this order")
     
     return order
@@ -139,8 +405,7 @@ def update_order(
     
      # Authorization check
     if current_user.role == "caterer":
-        scheduled_menu = db.query(ScheduledMenu).filter(ScheduledMenu.menu_date == order.menu_date).first()
-        if not scheduled_menu or scheduled_menu.caterer_id != current_user.caterer_id:
+        if order.caterer_id != current_user.caterer_id:
             raise HTTPException(status_code=403, detail="Not authorized to update this order")
     elif current_user.role == "customer":
         # Customers can only view their own orders, not update them
@@ -158,85 +423,203 @@ def update_order(
             )
     
     # Update the order
+    before = OrderSnapshot.of(order)
     if order_update.status:
         order.status = order_update.status
+        if order_update.status == "cancelled":
+            StockCRUD.release(db, order.menu_id, order_line_quantities(order.items))
     
     if order_update.payment_status:
         order.payment_status = order_update.payment_status
     
+    event_type = "order.cancelled" if order.status == "cancelled" else "order.updated"
+    response = OrderUpdateResponse(
+        message="Order updated successfully",
+        order_id=order.order_id,
+        status=order.status,
+        payment_status=order.payment_status
+    )
+    menu_date = order.menu_date
+
     # Commit the changes
     try:
+        SalesRollupCRUD.record_changes(db, [(before, OrderSnapshot.of(order))])
+        OrderEventCRUD.record(db, [order_event_row(event_type, order)])
         db.commit()
-        db.refresh(order)
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail="Failed to update order")
+
+    # The update is saved; a failure from here on must not be reported as one
+    try:
+        PrepSheetCRUD.invalidate(menu_date)
+        db.refresh(order)
+        publish_order_event(event_type, order)
+    except Exception as e:
+        logger.error(f"Order {response.order_id} updated but not published: {str(e)}")
     
-    return OrderUpdateResponse(
-        message="Order updated successfully",
-        order_id=order.order_id,
-        status=order.status,
-        payment_status=order.payment_status
-    )
+    return response
+
+VALID_STATUS_TRANSITIONS = {
+    "pending": ["confirmed" ,"cancelled"],
+    "confirmed": ["preparing","cancelled"],
+    "preparing": ["ready for delivery"],
+    "ready for delivery": ["delivered"],
+    "delivered": [], # No further transitions allowed
+    "cancelled": [] # No further transitions allowed
+}
 
 def _is_valid_status_transition(current_status: str, new_status: str) -> bool:
     """
     Validate if the status transition is allowed.
     Order flow: pending -> confirmed -> preparing -> ready for delivery -> delivered
     """
-    valid_transitions = {
-        "pending": ["confirmed" ,"cancelled"],
-        "confirmed": ["preparing","cancelled"],
-        "preparing": ["ready for delivery"],
-        "ready for delivery": ["delivered"],
-        "delivered": [], # No further transitions allowed
-        "cancelled": [] # No further transitions allowed
-    }
-    
-    return new_status in valid_transitions.get(current_status, [])
+    return new_status in VALID_STATUS_TRANSITIONS.get(current_status, [])
 
 # Alternative endpoint for batch updates (if needed)
 @router.put("/update-batch", response_model=list[OrderUpdateResponse])
 def update_multiple_orders(
-    order_updates: list[dict],  # [{"order_id": 1, "order_status": "confirmed"}, ...]
+    order_updates: List[OrderBatchUpdateItem],
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Update multiple orders at once.
-    Useful for caterers managing multiple orders.
+    Transitions are validated in one pass, then applied with one set-based
+    UPDATE per target status and committed as a single transaction.
     """
     if current_user.role != "caterer":
         raise HTTPException(status_code=403, detail="Only caterers can batch update orders")
-    
-    results = []
-    
-    for update_data in order_updates:
-        order_id = update_data.get("order_id")
-        order_status = update_data.get("order_status")
-        payment_status = update_data.get("payment_status")
-        
-        try:
-            # Create update request
-            update_request = OrderUpdateRequest(
-                order_status=OrderStatus(order_status) if order_status else None,
-                payment_status=PaymentStatus(payment_status) if payment_status else None
+
+    # Orders are loaded in one query; ownership is checked against orders.caterer_id
+    order_ids = {update_data.order_id for update_data in order_updates}
+    orders = {
+        order.order_id: order
+        for order in db.query(Order).filter(Order.order_id.in_(order_ids)).all()
+    }
+
+    results = {}
+    status_groups = {}
+    payment_status_groups = {}
+    seen = set()
+
+    for index, update_data in enumerate(order_updates):
+        order = orders.get(update_data.order_id)
+        error = None
+        if update_data.order_id in seen:
+            error = "Duplicate update for this order in the batch"
+        elif not order:
+            error = "Order not found"
+        elif order.caterer_id != current_user.caterer_id:
+            error = "Not authorized to update this order"
+        elif update_data.status and not _is_valid_status_transition(order.status, update_data.status):
+            error = f"Invalid status transition from {order.status} to {update_data.status}"
+        seen.add(update_data.order_id)
+
+        if error:
+            results[index] = OrderUpdateResponse(
+                message=f"Failed to update order {update_data.order_id}: {error}",
+                order_id=update_data.order_id,
+                status=order.status if order else None,
+                payment_status=order.payment_status if order else None,
+                success=False
             )
-            
-            # Use the single update function
-            result = update_order(order_id, update_request, current_user, db)
-            results.append(result)
-            
-        except Exception as e:
-            # Log the error but continue with other orders
-            results.append({
-                "message": f"Failed to update order {order_id}: {str(e)}",
-                "order_id": order_id,
-                "order_status": "error",
-                "payment_status": "error"
-            })
-    
-    return results
+            continue
+
+        if update_data.status:
+            status_groups.setdefault(update_data.status, []).append(order.order_id)
+        if update_data.payment_status:
+            payment_status_groups.setdefault(update_data.payment_status, []).append(order.order_id)
+        results[index] = OrderUpdateResponse(
+            message="Order updated successfully",
+            order_id=order.order_id,
+            status=update_data.status or order.status,
+            payment_status=update_data.payment_status or order.payment_status
+        )
+
+    menu_dates = {order.menu_date for order in orders.values()}
+    # Captured before commit so publishing doesn't reload every order
+    event_data = {
+        order_id: (order.caterer_id, order_event_data(order))
+        for order_id, order in orders.items()
+    }
+    try:
+        stale = set()
+        for new_status, ids in status_groups.items():
+            # Only move orders still in a state that allows this transition,
+            # in case they changed since they were read above
+            allowed_from = [
+                current for current in VALID_STATUS_TRANSITIONS
+                if _is_valid_status_transition(current, new_status)
+            ]
+            updated = db.execute(text("""
+                UPDATE orders SET status = :status
+                WHERE order_id = ANY(:order_ids) AND status = ANY(:allowed_from)
+                RETURNING order_id
+            """), {"status": new_status, "order_ids": ids, "allowed_from": allowed_from}).scalars().all()
+            stale.update(set(ids) - set(updated))
+
+            if new_status == "cancelled":
+                released = {}
+                for order_id in updated:
+                    order = orders[order_id]
+                    quantities = released.setdefault(order.menu_id, {})
+                    for item_id, quantity in order_line_quantities(order.items).items():
+                        quantities[item_id] = quantities.get(item_id, 0) + quantity
+                for menu_id, quantities in released.items():
+                    StockCRUD.release(db, menu_id, quantities)
+
+        for new_payment_status, ids in payment_status_groups.items():
+            ids = [order_id for order_id in ids if order_id not in stale]
+            if ids:
+                db.execute(text("""
+                    UPDATE orders SET payment_status = :payment_status
+                    WHERE order_id = ANY(:order_ids)
+                """), {"payment_status": new_payment_status, "order_ids": ids})
+
+        rollup_changes = []
+        change_events = []
+        for result in results.values():
+            if result.success and result.order_id not in stale:
+                order = orders[result.order_id]
+                before = OrderSnapshot.of(order)
+                after = OrderSnapshot.of(order)
+                after.status, after.payment_status = result.status, result.payment_status
+                rollup_changes.append((before, after))
+                change_events.append(order_event_row(
+                    "order.cancelled" if result.status == "cancelled" else "order.updated", order,
+                    status=result.status, payment_status=result.payment_status
+                ))
+        SalesRollupCRUD.record_changes(db, rollup_changes)
+        OrderEventCRUD.record(db, change_events)
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise HTTPException(status_code=500, detail="Failed to update orders")
+
+    for menu_date in menu_dates:
+        PrepSheetCRUD.invalidate(menu_date)
+
+    for result in results.values():
+        if result.success and result.order_id not in stale:
+            caterer_id, data = event_data[result.order_id]
+            data.update(status=result.status, payment_status=result.payment_status)
+            event_type = "order.cancelled" if result.status == "cancelled" else "order.updated"
+            order_events.publish(caterer_id, event_type, data)
+
+    for index, result in results.items():
+        if result.success and result.order_id in stale:
+            order = orders[result.order_id]
+            results[index] = OrderUpdateResponse(
+                message=f"Failed to update order {order.order_id}: order status changed concurrently",
+                order_id=order.order_id,
+                status=order.status,
+                payment_status=order.payment_status,
+                success=False
+            )
+
+    return [results[index] for index in range(len(order_updates))]
 
 @router.delete("/delete/{order_id}")
 def cancel_order(
@@ -252,7 +635,13 @@ def cancel_order(
     if order.status in ["delivered", "cancelled"]:
         raise HTTPException(status_code=400, detail="Cannot cancel this order")
     
+    before = OrderSnapshot.of(order)
     order.status = "cancelled"
+    StockCRUD.release(db, order.menu_id, order_line_quantities(order.items))
+    SalesRollupCRUD.record_changes(db, [(before, OrderSnapshot.of(order))])
+    OrderEventCRUD.record(db, [order_event_row("order.cancelled", order)])
     db.commit()
+    PrepSheetCRUD.invalidate(order.menu_date)
+    publish_order_event("order.cancelled", order)
     
     return {"message": "Order cancelled successfully"}
\ No newline at end of file
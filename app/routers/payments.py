@@ -1,21 +1,30 @@
 import json
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import text
-from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
+import logging
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, undefer
+from typing import List, Optional, Union
+from datetime import datetime, timedelta
 from app.database import get_db
 from app.models.payment import Payment
 from app.models.order import Order
-from app.schemas.payment import PaymentCreate, PaymentUpdate, PaymentResponse,PaymentResponseWithOrder
-from app.core.dependencies import get_current_user
+from app.schemas.payment import PaymentCreate, PaymentUpdate, PaymentResponse,PaymentResponseWithOrder, PaymentsByMenuDateResponse, PaymentGatewayDataResponse, PaymentAnalyticsResponse
+from app.core.dependencies import get_current_user, get_current_caterer, get_current_admin, get_idempotency_owner
 from app.models.user import User
+from app.crud.payment_analytics import GRANULARITIES, PaymentAnalyticsCRUD
+from app.crud.payments import PaymentCRUD, payment_event_type
+from app.crud.reconciliation import PaymentReconciler, stripe_intent_fetcher
+from app.utils.events import publish_order_event
+from app.utils.idempotency import idempotent_request
+from app.utils.responses import FastJSONResponse, sparse_fields, sparse_response
+from app.utils.stripe_gateway import get_stripe_gateway
 import stripe
 
 from app.core.config import settings
 
-stripe.api_key = "sk_test_51RTmiOQMjkOvMvVCRMl7Ke2NeIvBRvmDVUBNB3FSiWPCDq1Cv6joY5sYuVzUKIS1ra3KdP6liqIB4KYV8djjmoDp0005dfNf0O"
 
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/payments", tags=["payments"])
 
@@ -41,20 +50,34 @@ def create_payment(
 @router.post("/stripe/create-intent")
 def create_payment_intent(
     order_id: int,
+    idempotency_key: Optional[str] = Header(None),
+    idempotency_owner: Optional[str] = Depends(get_idempotency_owner),
     db: Session = Depends(get_db)
 ):
-    stripe.api_key = "sk_test_51RTmiOQMjkOvMvVCRMl7Ke2NeIvBRvmDVUBNB3FSiWPCDq1Cv6joY5sYuVzUKIS1ra3KdP6liqIB4KYV8djjmoDp0005dfNf0O"
+    """
+    Create a Stripe PaymentIntent for an order. Retries carrying the same
+    Idempotency-Key header replay the original response without calling
+    Stripe; a retry while the original is still running gets 409.
+    """
+    with idempotent_request("create_payment_intent", idempotency_key, {"order_id": order_id}, idempotency_owner) as request:
+        if request.replay:
+            return request.replay
+        return request.save(_create_payment_intent(order_id, request.key, db))
+
+def _create_payment_intent(order_id: int, idempotency_key: Optional[str], db: Session) -> dict:
     order = db.query(Order).filter(Order.order_id == order_id).first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    if not stripe.api_key:
+    if not settings.stripe_secret_key:
         raise ValueError("STRIPE_SECRET_KEY environment variable is not set")
     try:
-        intent = stripe.PaymentIntent.create(
+        intent = get_stripe_gateway().create_payment_intent(
             amount=int(order.total * 100),  # Stripe expects amount in cents
             currency=order.currency if hasattr(order, 'currency') else 'gbp',
-            metadata={'order_id': order_id}
+            metadata={'order_id': order_id},
+            # Lets Stripe dedupe too if this process dies before the response is stored
+            idempotency_key=f"create-intent-{idempotency_key}" if idempotency_key else None
         )
         
         # Create payment record
@@ -74,6 +97,7 @@ def create_payment_intent(
         # Update order with payment_id
         order.payment_id = payment.payment_id
         db.commit()
+        PaymentAnalyticsCRUD.invalidate([order.caterer_id])
         
         return {
             "client_secret": intent.client_secret,
@@ -88,131 +112,203 @@ def confirm_payment(
     payment_id: str,
     db: Session = Depends(get_db)
 ):
-    payment = db.query(Payment).filter(Payment.payment_intent_id == payment_id).first()
+    # Locked like the webhook does, so a concurrent webhook delivery for the
+    # same intent waits instead of settling it a second time
+    payment = db.query(Payment).filter(Payment.payment_intent_id == payment_id).with_for_update().first()
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
+
+    # Normally already settled by the Stripe webhook; only ask Stripe if not
+    if payment.payment_status == "completed":
+        db.rollback()
+        return {"status": "succeeded", "payment_status": "completed"}
     
     try:
-        intent = stripe.PaymentIntent.retrieve(payment.payment_intent_id)
+        intent = get_stripe_gateway().retrieve_payment_intent(payment.payment_intent_id)
         
         if intent.status == "succeeded":
-            payment.payment_status = "completed"
-            payment.processed_at = datetime.utcnow()
-            payment.gateway_response = str(intent)
-            
-            # Update order payment status
-            order = db.query(Order).filter(Order.payment_id == payment.payment_id).first()
-            if order:
-                order.payment_status = "completed"
-                order.status = "confirmed"
-            
-            db.commit()
-            
+            order = PaymentCRUD.mark_succeeded(db, payment, intent)
         elif intent.status == "payment_failed":
-            payment.payment_status = "failed"
-            payment.failure_reason = intent.last_payment_error.message if intent.last_payment_error else "Payment failed"
-            db.commit()
+            order = PaymentCRUD.mark_failed(
+                db, payment,
+                intent.last_payment_error.message if intent.last_payment_error else None,
+                intent
+            )
+        else:
+            # Nothing to settle yet; release the row lock
+            response = {"status": intent.status, "payment_status": payment.payment_status}
+            db.rollback()
+            return response
+        stale_caterers = PaymentAnalyticsCRUD.caterer_ids(db, [payment.payment_id])
+        db.commit()
+        PaymentAnalyticsCRUD.invalidate(stale_caterers)
+        if order:
+            publish_order_event(payment_event_type(order), order)
         
         return {"status": intent.status, "payment_status": payment.payment_status}
         
     except stripe.error.StripeError as e:
+        db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/stripe/webhook")
+async def stripe_webhook(
+    request: Request,
+    stripe_signature: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Stripe webhook receiver. Verifies the Stripe-Signature header, ignores
+    event ids it has already processed, and applies payment_intent.succeeded
+    and payment_intent.payment_failed to the payment and its order in one
+    transaction.
+    """
+    if not settings.stripe_webhook_secret:
+        raise HTTPException(status_code=503, detail="Stripe webhook secret is not configured")
+
+    payload = await request.body()
+    try:
+        stripe.WebhookSignature.verify_header(
+            payload.decode("utf-8"), stripe_signature or "", settings.stripe_webhook_secret,
+            tolerance=settings.stripe_webhook_tolerance_seconds
+        )
+        event = json.loads(payload)
+    except (stripe.error.SignatureVerificationError, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid Stripe signature or payload")
+
+    try:
+        outcome, order = await run_in_threadpool(PaymentCRUD.apply_webhook_event, db, event)
+    except Exception as e:
+        # A 5xx makes Stripe redeliver the event later
+        logger.error(f"Failed to apply Stripe event {event.get('id')}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to process event")
+
+    if order:
+        publish_order_event(payment_event_type(order), order)
+    return {"received": True, "outcome": outcome}
+
+@router.post("/reconcile")
+def reconcile_payments(
+    max_payments: int = Query(500, ge=1, le=2000, description="Maximum pending payments to check in this run"),
+    min_age_minutes: int = Query(30, ge=0, description="Skip payments created more recently than this"),
+    dry_run: bool = Query(False, description="Report what would change without writing"),
+    current_user: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    Check pending Stripe payments against their payment intents, settle the
+    ones Stripe has completed, failed or cancelled, and report discrepancies.
+
+    Runs inside the API process on a small share of the Stripe gateway's
+    concurrency so checkout calls keep their slots. For full backlogs use
+    reconcile_payments.py.
+    """
+    reconciler = PaymentReconciler(
+        db, stripe_intent_fetcher(),
+        concurrency=settings.stripe_reconcile_concurrency,
+        rate_per_second=settings.stripe_reconcile_rate_per_second,
+        min_age=timedelta(minutes=min_age_minutes),
+        dry_run=dry_run
+    )
+    return reconciler.run(max_payments)
+
 @router.get("/", response_model=List[PaymentResponse])
 def get_payments(
     skip: int = 0,
     limit: int = 100,
-
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. payment_id,amount,payment_status"),
     db: Session = Depends(get_db)
 ):
-        payments = db.query(Payment).offset(skip).limit(limit).all()
+        selected = sparse_fields(fields, Payment, PaymentResponse)
+        query = db.query(Payment).order_by(Payment.payment_id).offset(skip).limit(limit)
+        if selected:
+            return sparse_response(query, Payment, selected)
+        payments = query.all()
         return payments
 
-@router.get("/bymenudate/",response_model=List[PaymentResponseWithOrder])
-async def get_payments_by_menu_date(
-    skip: int = 0,
-    limit: int = 100,
+@router.get("/analytics", response_model=PaymentAnalyticsResponse)
+def get_payment_analytics(
+    start_date: str = Query(..., description="First menu date in YYYY-MM-DD format"),
+    end_date: str = Query(..., description="Last menu date in YYYY-MM-DD format"),
+    granularity: str = Query("day", description="Period size for by_period: day, week or month"),
+    current_user: User = Depends(get_current_caterer),
+    db: Session = Depends(get_db)
+):
+    """
+    Payment counts, totals and completed totals for the caterer's orders in
+    a menu date range, broken down by period, payment method, status and
+    currency. Cached until one of the caterer's payments changes.
+    """
+    try:
+        parsed_start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        parsed_end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    if parsed_end < parsed_start:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    if (parsed_end - parsed_start).days > 731:
+        raise HTTPException(status_code=400, detail="Date range must not exceed two years")
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of: {', '.join(GRANULARITIES)}")
+
+    return PaymentAnalyticsCRUD.get_analytics(db, current_user.caterer_id, parsed_start, parsed_end, granularity)
+
+@router.get("/{payment_id}/gateway-data", response_model=PaymentGatewayDataResponse)
+def get_payment_gateway_data(
+    payment_id: int,
+    current_user: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    The stored gateway response for one payment. Listings never load it;
+    this is the explicit way to read it.
+    """
+    payment = db.query(Payment).options(
+        undefer(Payment.gateway_data), undefer(Payment.gateway_response)
+    ).filter(Payment.payment_id == payment_id).first()
+    if not payment:
+        raise HTTPException(status_code=404, detail="Payment not found")
+    return payment
+
+@router.get("/bymenudate/",response_model=Union[List[PaymentResponseWithOrder], PaymentsByMenuDateResponse])
+def get_payments_by_menu_date(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
     menu_date: str = Query(..., description="Menu date in YYYY-MM-DD format"),
+    after_order_id: Optional[int] = Query(None, description="Keyset paging: last order_id of the previous page"),
+    include_totals: bool = Query(False, description="Wrap the page as {payments, totals} with paid/unpaid/by-method totals for the day"),
+    stream: bool = Query(False, description="Stream every row of the day as NDJSON instead of one page"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    Get payments by menu date with flexible date string input
+    Orders for a menu date with their payments (or the order total when not
+    yet paid), newest first. Caterers only see their own orders; only admins
+    can list every caterer's.
     """
     try:
-        # Parse date string
         parsed_date = datetime.strptime(menu_date, "%Y-%m-%d").date()
-        
-        # Use the same logic as above
-        query = text(f"""
-            SELECT 
-                p.payment_id,
-                p.amount,
-                p.currency,
-                p.processed_at,
-                o.payment_method,
-                o.payment_status,
-                p.created_at,
-                o.order_id,
-                o.customer_name,
-                o.customer_phone,
-                o.customer_address,
-                o.menu_date,
-                o.total 
-            FROM payments p
-            RIGHT JOIN orders o ON p.payment_id = o.payment_id
-            WHERE o.menu_date = :menu_date
-            ORDER BY o.order_date DESC
-        """)
-        try:
-            rows = db.execute(query, {"menu_date": parsed_date})
-            
-            payments = []
-            for row in rows:
-                if row.payment_id is not None:
-                    payment_dict = {
-                        "payment_id": row.payment_id if row.payment_id is not None else None,
-                        "amount": float(row.amount),
-                        "currency": row.currency,
-                        "processed_at": row.processed_at.isoformat() if row.processed_at else None,
-                        "payment_method": row.payment_method,
-                        "payment_status": row.payment_status,
-                        "created_at": row.processed_at.isoformat() if row.processed_at else None,
-                        "order_id": row.order_id,
-                        "customer_name": row.customer_name,
-                        "customer_phone": row.customer_phone,
-                        "customer_address": row.customer_address,
-                        "menu_date":row.menu_date,
-                        "total": float(row.total)
-
-                    }
-                else:
-                    payment_dict = {
-                        "payment_id": None,
-                        "amount": float(row.total) if row.total is not None else 0.0,
-                        "currency": "GBP",
-                        "processed_at": None,
-                        "payment_method": row.payment_method,
-                        "payment_status": row.payment_status,
-                        "created_at": None,
-                        "order_id": row.order_id,
-                        "customer_name": row.customer_name,
-                        "customer_phone": row.customer_phone,
-                        "customer_address": row.customer_address,
-                        "menu_date": row.menu_date,
-                        "total": float(row.total) if row.total is not None else 0.0
-                    }
-
-                payments.append(payment_dict)
-            
-            return payments
-            
-        finally:
-            db.close()
-            
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
-    except Exception as error:
-        raise HTTPException(status_code=500, detail=str(error))
+
+    if current_user.role == "caterer":
+        caterer_id = current_user.caterer_id
+    elif current_user.role == "admin":
+        caterer_id = None
+    else:
+        raise HTTPException(status_code=403, detail="Not authorized to view payments")
+
+    if stream:
+        return StreamingResponse(
+            PaymentCRUD.stream_menu_date_payments(parsed_date, caterer_id, include_totals),
+            media_type="application/x-ndjson"
+        )
+
+    payments, totals = PaymentCRUD.get_menu_date_payments(
+        db, parsed_date, caterer_id, skip=skip, limit=limit, after_order_id=after_order_id
+    )
+    if include_totals:
+        return FastJSONResponse({"payments": payments, "totals": totals})
+    return FastJSONResponse(payments)
  
  
\ No newline at end of file
@@ -12,6 +12,7 @@ class ScheduledMenuItemBase(BaseModel):
     category: Optional[str] = None
     is_combo: bool = False
     combo_items: Optional[List[Dict[str, Any]]] = None
+    capacity: Optional[int] = Field(None, ge=0, description="Portions available; None means unlimited")
 
 class ScheduledMenuBase(BaseModel):
     name: str
@@ -39,7 +40,7 @@ class ScheduledMenuCreate(ScheduledMenuBase):
 
 class ScheduledMenuUpdate(BaseModel):
     name: Optional[str] = None
-    items: Optional[Dict] = None
+    items: Optional[List[ScheduledMenuItemBase]] = None
     menu_date: Optional[date] = None
     orderlink: Optional[str] = None
     active: Optional[bool] = None
@@ -54,6 +55,15 @@ class ScheduledMenuResponse(ScheduledMenuBase):
         from_attributes = True
 
 
+class MenuItemStockResponse(BaseModel):
+    catalog_item_id: int
+    capacity: int
+    reserved: int
+
+    class Config:
+        from_attributes = True
+
+
 class MenuFlyerUpload(BaseModel):
     menu_name: str
     menu_date: date
@@ -1,15 +1,50 @@
 from fastapi import  HTTPException
 from pydantic import BaseModel, EmailStr 
 from typing import List, Optional
+from datetime import datetime
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
 import base64,os
-import smtplib
-import ssl
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from twilio.http.http_client import TwilioHttpClient
 from twilio.rest import Client
 import logging
+from app.core.config import settings
+from app.utils.smtp_pool import get_smtp_pool
+
+logger = logging.getLogger(__name__)
+
+# smtplib and the Twilio client block, so sends run here: off the event loop,
+# and apart from the threadpool that serves sync endpoints
+_send_executor = ThreadPoolExecutor(max_workers=settings.notification_send_threads, thread_name_prefix="notify-send")
+
+_twilio_clients = {}
+
+
+def _twilio_client(account_sid: str, auth_token: str) -> Client:
+    # One client per account so its HTTP connections are reused
+    client = _twilio_clients.get((account_sid, auth_token))
+    if client is None:
+        client = _twilio_clients[(account_sid, auth_token)] = Client(
+            account_sid, auth_token, http_client=TwilioHttpClient(timeout=settings.twilio_timeout_seconds)
+        )
+    return client
+
+
+async def run_send(fn, *args):
+    """Run a blocking send in the send executor, giving up after notification_send_timeout_seconds.
+
+    On timeout or cancellation the caller stops waiting at once; the thread
+    itself ends at the SMTP/Twilio socket timeout.
+    """
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(
+        loop.run_in_executor(_send_executor, fn, *args),
+        timeout=settings.notification_send_timeout_seconds
+    )
 
 class EmailAttachment(BaseModel):
     filename: str
@@ -26,77 +61,98 @@ class SMSRequest(BaseModel):
     to: str
     message: str
 
+class NotificationStatusResponse(BaseModel):
+    message_id: str
+    channel: str
+    kind: str
+    status: str  # 'pending' (queued or waiting to retry), 'sending', 'sent' or 'dead'
+    attempts: int
+    max_attempts: int
+    next_attempt_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    provider_message_id: Optional[str] = None
+    created_at: datetime
+    sent_at: Optional[datetime] = None
+
 class EmailService:
+    @staticmethod
+    def deliver(email_data: EmailRequest) -> None:
+        """Build and send the email, raising on failure (the notification worker retries it)"""
+        SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+        SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+        EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
+        EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+
+        # Create message container
+        msg = MIMEMultipart()
+        msg['From'] = EMAIL_ADDRESS
+        msg['To'] = email_data.to
+        msg['Subject'] = email_data.subject
+        # Add HTML body
+        msg.attach(MIMEText(email_data.html, 'html','utf-8'))
+
+        # Add attachments
+        for attachment in email_data.attachments:
+            # Decode base64 content
+            file_data = base64.b64decode(attachment.content)
+
+            # Create attachment
+            part = MIMEBase('application', 'octet-stream')
+            part.set_payload(file_data)
+            encoders.encode_base64(part)
+            part.add_header(
+                'Content-Disposition',
+                f'attachment; filename= {attachment.filename}'
+            )
+            msg.attach(part)
+
+        # Send over a pooled, already authenticated TLS connection
+        get_smtp_pool(SMTP_SERVER, SMTP_PORT, EMAIL_ADDRESS, EMAIL_PASSWORD).send_message(msg)
+
     @staticmethod
     async def send_email(email_data: EmailRequest) -> dict:
         try:
-            # Create message container
-            SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-            SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
-            EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
-            EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")    
-
-            msg = MIMEMultipart()
-            msg['From'] = EMAIL_ADDRESS
-            msg['To'] = email_data.to
-            msg['Subject'] = email_data.subject
-            logger = logging.getLogger(__name__)
-            # Add HTML body
-            msg.attach(MIMEText(email_data.html, 'html','utf-8'))
-
-            # Add attachments
-            for attachment in email_data.attachments:
-                # Decode base64 content
-                file_data = base64.b64decode(attachment.content)
-                
-                # Create attachment
-                part = MIMEBase('application', 'octet-stream')
-                part.set_payload(file_data)
-                encoders.encode_base64(part)
-                part.add_header(
-                    'Content-Disposition',
-                    f'attachment; filename= {attachment.filename}'
-                )
-                msg.attach(part)
-
-            # Create secure connection and send email
-            context = ssl.create_default_context()
-            with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-                server.starttls(context=context)
-                server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-                server.send_message(msg)
-
+            await run_send(EmailService.deliver, email_data)
             return {"success": True, "message": "Email sent successfully"}
 
+        except asyncio.TimeoutError:
+            logger.error(f"Timed out sending email to {email_data.to}")
+            raise HTTPException(status_code=504, detail="Timed out sending email")
         except Exception as e:
             logger.error(f"Error sending email: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Failed to send email: {str(e)}")
 
 class SMSService:
+    @staticmethod
+    def deliver(sms_data: SMSRequest) -> str:
+        """Send the SMS and return its Twilio message sid, raising on failure"""
+        # Twilio configuration for SMS
+        TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
+        TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
+        TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
+        client = _twilio_client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+
+        # Send SMS
+        message = client.messages.create(
+            body=sms_data.message,
+            from_=TWILIO_PHONE_NUMBER,
+            to=sms_data.to
+        )
+        return message.sid
+
     @staticmethod
     async def send_sms(sms_data: SMSRequest) -> dict:
         try:
-            # Twilio configuration for SMS
-            TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
-            TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
-            TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
-            logger = logging.getLogger(__name__)
-            # Initialize Twilio client
-            client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-            
-            # Send SMS
-            message = client.messages.create(
-                body=sms_data.message,
-                from_=TWILIO_PHONE_NUMBER,
-                to=sms_data.to
-            )
-
+            message_sid = await run_send(SMSService.deliver, sms_data)
             return {
                 "success": True, 
                 "message": "SMS sent successfully",
-                "message_sid": message.sid
+                "message_sid": message_sid
             }
 
+        except asyncio.TimeoutError:
+            logger.error(f"Timed out sending SMS to {sms_data.to}")
+            raise HTTPException(status_code=504, detail="Timed out sending SMS")
         except Exception as e:
             logger.error(f"Error sending SMS: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Failed to send SMS: {str(e)}")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, Dict
+from typing import Any, Optional, Dict, List
 from datetime import date, datetime
 from decimal import Decimal
 from enum import Enum
@@ -39,6 +39,7 @@ class OrderResponse(OrderBase):
     payment_status: Optional[str] = None
     status: str
     payment_id: Optional[int] = None
+    updated_at: Optional[datetime] = None
     message: Optional[str] = None
 
     class Config:
@@ -51,8 +52,78 @@ class OrderUpdate(BaseModel):
     special_instructions: Optional[str] = None
 
 
+class OrderBatchUpdateItem(BaseModel):
+    order_id: int
+    status: Optional[str] = None
+    payment_status: Optional[str] = None
+
+
 class OrderUpdateResponse(BaseModel):
     message: str
     order_id: int
     status: Optional[str] = None
     payment_status: Optional[str] = None
+    success: bool = True
+
+
+class PrepSheetLine(BaseModel):
+    catalog_item_id: int
+    item_name: Optional[str] = None
+    is_combo: bool = False
+    quantity: int
+
+
+class PrepSheetResponse(BaseModel):
+    menu_date: date
+    ordered_items: List[PrepSheetLine]
+    dishes: List[PrepSheetLine]
+
+
+class DailySalesSummary(BaseModel):
+    menu_date: Optional[date] = None
+    order_count: int
+    gross_total: Decimal
+    paid_total: Decimal
+    cancelled_count: int
+    payment_method_totals: Dict[str, Decimal]
+
+
+class SalesSummaryResponse(BaseModel):
+    start_date: date
+    end_date: date
+    days: List[DailySalesSummary]
+    totals: DailySalesSummary
+
+
+class DeliveryStopResponse(BaseModel):
+    order_id: int
+    sequence: Optional[int] = None
+    customer_name: str
+    customer_phone: Optional[str] = None
+    address: Any
+    postcode: Optional[str] = None
+    district: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class DeliveryBatchResponse(BaseModel):
+    batch_number: int
+    stop_count: int
+    districts: List[str]
+    distance_km: float
+    stops: List[DeliveryStopResponse]
+
+
+class DeliveryPlanResponse(BaseModel):
+    menu_date: date
+    order_count: int
+    batches: List[DeliveryBatchResponse]
+    unlocated: List[DeliveryStopResponse]
+
+
+class OrderChangesResponse(BaseModel):
+    cursor: str
+    has_more: bool
+    orders: List[OrderResponse]
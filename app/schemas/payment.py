@@ -1,6 +1,6 @@
 from pydantic import BaseModel
-from typing import Optional
-from datetime import datetime
+from typing import Any, Dict, List, Optional
+from datetime import date, datetime
 from decimal import Decimal
 
 class PaymentBase(BaseModel):
@@ -24,17 +24,60 @@ class PaymentResponse(PaymentBase):
     payment_gateway: Optional[str] = None
     created_at: Optional[datetime] = None
     processed_at: Optional[datetime] = None
+    gateway_status: Optional[str] = None
+    gateway_charge_id: Optional[str] = None
     
     class Config:
         from_attributes = True
 
+class PaymentGatewayDataResponse(BaseModel):
+    payment_id: int
+    gateway_data: Optional[Dict[str, Any]] = None
+    gateway_response: Optional[str] = None  # legacy text, until migrate_gateway_data.py converts it
+
+    class Config:
+        from_attributes = True
+
 class PaymentResponseWithOrder(PaymentResponse):
     order_id: Optional[int] = None
     customer_name: Optional[str] = None
     customer_phone: Optional[str] = None
     customer_address: Optional[str] = None
+    menu_date: Optional[date] = None
     total: Optional[Decimal] = None
 
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class MenuDatePaymentTotals(BaseModel):
+    order_count: int
+    cancelled_count: int
+    paid_count: int
+    paid_total: Decimal
+    unpaid_count: int
+    unpaid_total: Decimal
+    by_method: Dict[str, Decimal]
+
+class PaymentsByMenuDateResponse(BaseModel):
+    # /payments/bymenudate/?include_totals=true
+    payments: List[PaymentResponseWithOrder]
+    totals: MenuDatePaymentTotals
+
+class PaymentAggregate(BaseModel):
+    key: Optional[str] = None  # period start date, payment method or status; None for per-currency totals
+    currency: str
+    payment_count: int
+    amount_total: Decimal
+    completed_count: int
+    completed_total: Decimal
+
+
+class PaymentAnalyticsResponse(BaseModel):
+    start_date: date
+    end_date: date
+    granularity: str
+    by_period: List[PaymentAggregate]
+    by_payment_method: List[PaymentAggregate]
+    by_status: List[PaymentAggregate]
+    by_currency: List[PaymentAggregate]
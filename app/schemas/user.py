@@ -2,8 +2,7 @@ from fastapi import Depends, HTTPException
 from pydantic import BaseModel, EmailStr, validator
 from typing import Optional, List, Dict
 from datetime import datetime, timedelta
-import re,secrets,smtplib
-from fastapi import BackgroundTasks
+import re,secrets
 from requests import Session
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -16,7 +15,9 @@ from app.core.security import (
     get_password_hash, 
     generate_salt
 )
+from app.crud.notifications import NotificationOutboxCRUD
 from app.database import get_db
+from app.utils.smtp_pool import get_smtp_pool
 from app.models.user import User
 
 class UserBase(BaseModel):
@@ -78,45 +79,44 @@ def generate_confirmation_token() -> str:
     """Generate a secure random token for email confirmation"""
     return secrets.token_urlsafe(32)
 
+def deliver_confirmation_email(email: str, token: str, name: str) -> None:
+    """Send the confirmation email, raising on failure (the notification worker retries it)"""
+    # Create message
+    msg = MIMEMultipart()
+    msg['From'] = settings.email_username
+    msg['To'] = email
+    msg['Subject'] = "Confirm Your Email Address"
+    
+    # Email body
+    confirmation_url = f"{settings.base_url}auth/confirm-email?token={token}"
+    
+    html_body = f"""
+    <html>
+        <body>
+            <h2>Welcome to Our Platform!</h2>
+            <p>Hi {name},</p>
+            <p>Thank you for registering with us. Please click the link below to confirm your email address:</p>
+            <p><a href="{confirmation_url}" style="background-color: #4CAF50; color: white; padding: 12px 24px; text-decoration: none; border-radius: 4px;">Confirm Email</a></p>
+            <p>Or copy and paste this URL into your browser:</p>
+            <p>{confirmation_url}</p>
+            <p>This link will expire in 24 hours.</p>
+            <p>If you didn't create an account with us, please ignore this email.</p>
+            <br>
+            <p>Best regards,<br>Your App Team</p>
+        </body>
+    </html>
+    """
+    
+    msg.attach(MIMEText(html_body, 'html', 'utf-8'))
+    
+    # Send email
+    pool = get_smtp_pool(settings.smtp_server, settings.smtp_port, settings.email_username, settings.email_password)
+    pool.send_message(msg, settings.email_username, email)
+
 def send_confirmation_email(email: str, token: str, name: str):
     """Send confirmation email to user"""
     try:
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = settings.email_username
-        msg['To'] = email
-        msg['Subject'] = "Confirm Your Email Address"
-        
-        # Email body
-        confirmation_url = f"{settings.base_url}auth/confirm-email?token={token}"
-        
-        html_body = f"""
-        <html>
-            <body>
-                <h2>Welcome to Our Platform!</h2>
-                <p>Hi {name},</p>
-                <p>Thank you for registering with us. Please click the link below to confirm your email address:</p>
-                <p><a href="{confirmation_url}" style="background-color: #4CAF50; color: white; padding: 12px 24px; text-decoration: none; border-radius: 4px;">Confirm Email</a></p>
-                <p>Or copy and paste this URL into your browser:</p>
-                <p>{confirmation_url}</p>
-                <p>This link will expire in 24 hours.</p>
-                <p>If you didn't create an account with us, please ignore this email.</p>
-                <br>
-                <p>Best regards,<br>Your App Team</p>
-            </body>
-        </html>
-        """
-        
-        msg.attach(MIMEText(html_body, 'html', 'utf-8'))
-        
-        # Send email
-        server = smtplib.SMTP(settings.smtp_server, settings.smtp_port)
-        server.starttls()
-        server.login(settings.email_username, settings.email_password)
-        text = msg.as_string()
-        server.sendmail(settings.email_username, email, text)
-        server.quit()
-        
+        deliver_confirmation_email(email, token, name)
         return True
     except Exception as e:
         print(f"Error sending email: {e}")
@@ -124,7 +124,6 @@ def send_confirmation_email(email: str, token: str, name: str):
     
 def register_user(
     user: UserCreateEnhanced, 
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """
@@ -168,24 +167,22 @@ def register_user(
     )
     
     try:
-        # Save user to database
+        # Save user and queue the confirmation email in one transaction
         db.add(db_user)
+        message_id = NotificationOutboxCRUD.enqueue(db, "email", "confirmation_email", {
+            "email": user.email.lower(),
+            "token": confirmation_token,
+            "name": user.name
+        })
         db.commit()
         db.refresh(db_user)
         
-        # Send confirmation email in background
-        background_tasks.add_task(
-            send_confirmation_email, 
-            user.email.lower(), 
-            confirmation_token, 
-            user.name
-        )
-        
         return {
             "message": "User registered successfully. Please check your email to confirm your account.",
             "user_id": db_user.name,
             "email": db_user.email,
-            "status": "pending_confirmation"
+            "status": "pending_confirmation",
+            "message_id": message_id
         }
         
     except Exception as e:
@@ -257,7 +254,6 @@ def confirm_email(token: str, db: Session = Depends(get_db)):
 
 def resend_confirmation_email(
     email: str, 
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """
@@ -285,18 +281,17 @@ def resend_confirmation_email(
     db_user.email_confirmation_expires = new_expiry
     
     try:
+        # Queue the new confirmation email with the token update
+        message_id = NotificationOutboxCRUD.enqueue(db, "email", "confirmation_email", {
+            "email": email.lower(),
+            "token": new_token,
+            "name": db_user.name
+        })
         db.commit()
         
-        # Send new confirmation email
-        background_tasks.add_task(
-            send_confirmation_email, 
-            email.lower(), 
-            new_token, 
-            db_user.name
-        )
-        
         return {
-            "message": "Confirmation email resent. Please check your email."
+            "message": "Confirmation email resent. Please check your email.",
+            "message_id": message_id
         }
         
     except Exception as e:
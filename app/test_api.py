@@ -70,7 +70,217 @@ def test_create_order():
     print(f"Create Order: {response.status_code}")
     print(response.json())
 
+def test_stripe_webhook(payment_intent_id="pi_test_123", secret="whsec_test"):
+    # Same event delivered twice: the second delivery must be reported as a duplicate
+    from app.utils.stripe_fixtures import payment_intent_event, signed_event
+
+    event = payment_intent_event(payment_intent_id, "payment_intent.succeeded")
+    for attempt in range(2):
+        payload, headers = signed_event(event, secret)
+        response = requests.post(f"{BASE_URL}/payments/stripe/webhook", data=payload, headers=headers)
+        print(f"Stripe webhook ({attempt + 1}): {response.status_code}")
+        print(response.json())
+
+def test_stripe_gateway_against_stub():
+    # In-process: drive StripeGateway against a local stub that returns
+    # 429/5xx/slow responses and check its retries, timeouts and slot cap
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    import stripe
+    from fastapi import HTTPException
+    from app.core.config import settings
+    from app.utils.stripe_fixtures import StripeStub
+    from app.utils.stripe_gateway import StripeGateway
+
+    overrides = {
+        "stripe_max_concurrency": 2, "stripe_queue_timeout_seconds": 0.2,
+        "stripe_connect_timeout_seconds": 1, "stripe_read_timeout_seconds": 0.3,
+        "stripe_total_timeout_seconds": 3, "stripe_max_retries": 2,
+        "stripe_retry_base_backoff_seconds": 0.01, "stripe_retry_max_backoff_seconds": 0.05,
+    }
+    saved = {name: getattr(settings, name) for name in [*overrides, "stripe_api_base"]}
+    saved_stripe = (stripe.api_base, stripe.default_http_client, stripe.max_network_retries)
+
+    with StripeStub() as stub:
+        for name, value in {**overrides, "stripe_api_base": stub.url}.items():
+            setattr(settings, name, value)
+        try:
+            gateway = StripeGateway()
+
+            # 429 then 500 are retried for an idempotent call
+            stub.script(429, 500)
+            intent = gateway.retrieve_payment_intent("pi_stub_retry")
+            assert intent.id == "pi_stub_retry" and stub.requests == 3
+            assert gateway.metrics.snapshot()["payment_intent.retrieve"]["retries"] == 2
+            print(f"Stripe stub retries: ok after {stub.requests} requests")
+
+            # Creation without an idempotency key is never retried
+            stub.reset()
+            stub.script(500)
+            try:
+                gateway.create_payment_intent(amount=1000, currency="gbp")
+                assert False, "expected the 500 to surface"
+            except stripe.error.APIError:
+                pass
+            assert stub.requests == 1
+            stub.reset()
+            stub.script(503)
+            intent = gateway.create_payment_intent(idempotency_key="order-1", amount=1000, currency="gbp")
+            assert stub.requests == 2
+            print("Stripe stub idempotency: unkeyed create not retried, keyed create retried")
+
+            # A stalled read times out per attempt, bounded by the retry limit
+            stub.reset()
+            stub.script(*[("slow", 1.0)] * 3)
+            started = time.monotonic()
+            try:
+                gateway.retrieve_payment_intent("pi_stub_slow")
+                assert False, "expected a timeout"
+            except stripe.error.APIConnectionError:
+                pass
+            elapsed = time.monotonic() - started
+            assert stub.requests == 3 and elapsed < settings.stripe_total_timeout_seconds
+            print(f"Stripe stub timeouts: gave up after {stub.requests} attempts in {elapsed:.2f}s")
+
+            # At most stripe_max_concurrency calls reach Stripe; the rest get 503
+            settings.stripe_read_timeout_seconds = 2
+            gateway = StripeGateway()
+            while stub.in_flight:  # let the abandoned slow requests finish
+                time.sleep(0.05)
+            stub.reset()
+            stub.script(*[("slow", 0.5)] * 6)
+
+            def call(n):
+                try:
+                    gateway.retrieve_payment_intent(f"pi_stub_{n}")
+                    return 200
+                except HTTPException as e:
+                    return e.status_code
+
+            with ThreadPoolExecutor(max_workers=6) as executor:
+                statuses = list(executor.map(call, range(6)))
+            print(f"Stripe stub concurrency: peak {stub.peak_in_flight} in flight, statuses {sorted(statuses)}")
+            assert stub.peak_in_flight <= 2
+            assert statuses.count(200) == 2 and statuses.count(503) == 4
+        finally:
+            for name, value in saved.items():
+                setattr(settings, name, value)
+            stripe.api_base, stripe.default_http_client, stripe.max_network_retries = saved_stripe
+
+def test_slow_send_does_not_block_requests(send_seconds=2.0):
+    # In-process: a send held open for `send_seconds` must not stall other
+    # requests on the same event loop while /send-email-sync waits for it
+    import asyncio
+    import time
+    import httpx
+    from fastapi import FastAPI
+    from app.routers import notifications
+    from app.schemas.notifications import EmailService
+
+    app = FastAPI()
+    app.include_router(notifications.router)
+    original_deliver = EmailService.deliver
+    EmailService.deliver = staticmethod(lambda email_data: time.sleep(send_seconds))
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            send = asyncio.create_task(client.post("/notifications/send-email-sync", json={
+                "to": "customer@example.com", "subject": "Slow send", "html": "<p>Hello</p>"
+            }))
+            await asyncio.sleep(0.1)
+            latencies = []
+            while not send.done():
+                started = time.monotonic()
+                health = await client.get("/notifications/email/health")
+                assert health.status_code == 200
+                latencies.append(time.monotonic() - started)
+                await asyncio.sleep(0.05)
+            return await send, latencies
+
+    try:
+        response, latencies = asyncio.run(run())
+    finally:
+        EmailService.deliver = original_deliver
+
+    print(f"Slow send: {response.status_code}, {len(latencies)} requests served meanwhile, "
+          f"slowest {max(latencies) * 1000:.1f} ms")
+    assert response.status_code == 200
+    assert len(latencies) >= 10, "other requests were not served while the send was in flight"
+    assert max(latencies) < 0.5
+
+def test_delivery_stop_malformed_coordinates():
+    # In-process: unusable client coordinates fall back to the postcode district
+    from app.utils.delivery import DeliveryStop, PostcodeTable
+
+    table = PostcodeTable({"SW1": (51.4975, -0.1357)})
+    for latitude, longitude in [("", ""), ("abc", -0.1), ([51.5], -0.1), ("nan", "0"), (951.5, -0.1)]:
+        address = {"street": "1 Test St", "postcode": "SW1A 1AA", "latitude": latitude, "longitude": longitude}
+        stop = DeliveryStop(1, "Test", None, address).locate(table)
+        assert stop.point == (51.4975, -0.1357), (latitude, longitude, stop.point)
+    stop = DeliveryStop(2, "Test", None, {"postcode": "SW1A 1AA", "latitude": "51.5", "longitude": "-0.12"}).locate(table)
+    assert stop.point == (51.5, -0.12)
+    print("Delivery stops: malformed coordinates fall back to the postcode district")
+
+def test_concurrent_orders_respect_capacity(menu_id, catalog_item_id, capacity=20, parallel=100):
+    # `parallel` simultaneous one-unit orders for an item with exactly
+    # `capacity` units left: exactly `capacity` are accepted, the rest get 409
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from sqlalchemy import text
+    from app.crud.pricing import PricingCRUD
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        price_table = PricingCRUD.get_price_table(db, menu_id)
+        reserved_before = db.execute(text("""
+            INSERT INTO menu_item_stock (menu_id, catalog_item_id, capacity, reserved)
+            VALUES (:menu_id, :item_id, :capacity, 0)
+            ON CONFLICT (menu_id, catalog_item_id)
+            DO UPDATE SET capacity = menu_item_stock.reserved + :capacity
+            RETURNING reserved
+        """), {"menu_id": menu_id, "item_id": catalog_item_id, "capacity": capacity}).scalar()
+        db.commit()
+    finally:
+        db.close()
+
+    def place(n):
+        response = requests.post(f"{BASE_URL}/orders/create_orders", json={
+            "menu_id": menu_id,
+            "customer_name": f"Load Test {n}",
+            "customer_phone": f"+4470000{n:05d}",
+            "customer_address": "1 Test Street, London",
+            "menu_date": price_table.menu_date.isoformat(),
+            "items": {str(catalog_item_id): {"catalog_item_id": catalog_item_id, "quantity": 1}},
+            "total": str(price_table.prices[catalog_item_id])
+        })
+        return response.status_code
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        statuses = list(executor.map(place, range(parallel)))
+    elapsed = time.monotonic() - started
+
+    db = SessionLocal()
+    try:
+        reserved_after = db.execute(text("""
+            SELECT reserved FROM menu_item_stock WHERE menu_id = :menu_id AND catalog_item_id = :item_id
+        """), {"menu_id": menu_id, "item_id": catalog_item_id}).scalar()
+    finally:
+        db.close()
+
+    accepted, sold_out = statuses.count(200), statuses.count(409)
+    print(f"Concurrent orders: {accepted} accepted, {sold_out} sold out, "
+          f"{parallel - accepted - sold_out} other, in {elapsed:.2f}s ({parallel / elapsed:.0f} req/s)")
+    assert accepted == capacity
+    assert sold_out == parallel - capacity
+    assert reserved_after - reserved_before == capacity
+
 if __name__ == "__main__":
+    test_slow_send_does_not_block_requests()
+    test_delivery_stop_malformed_coordinates()
+    test_stripe_gateway_against_stub()
     test_registration()
     token = test_login()
     if token:
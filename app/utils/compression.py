@@ -0,0 +1,224 @@
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Content types that are already compressed or must reach the client unbuffered
+EXCLUDED_CONTENT_TYPES = (
+    "image/", "video/", "audio/", "text/event-stream",
+    "application/zip", "application/gzip", "application/octet-stream", "application/pdf",
+)
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick 'br' or 'gzip' from an Accept-Encoding header, honoring q-values (brotli wins ties)"""
+    qualities: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                continue
+        qualities[token.strip()] = q
+
+    supported = ["br", "gzip"] if brotli is not None else ["gzip"]
+    wildcard = qualities.get("*", 0.0)
+    ranked = [(qualities.get(encoding, wildcard), -index, encoding) for index, encoding in enumerate(supported)]
+    q, _, encoding = max(ranked)
+    return encoding if q > 0 else None
+
+
+class CompressionMetrics:
+    """Per-route totals of bytes in/out and compression CPU time"""
+
+    def __init__(self):
+        self._routes: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, bytes_in: int, bytes_out: int, cpu_seconds: float, compressed: bool) -> None:
+        with self._lock:
+            stats = self._routes.setdefault(route, {
+                "responses": 0, "compressed_responses": 0,
+                "bytes_in": 0, "bytes_out": 0, "cpu_seconds": 0.0,
+            })
+            stats["responses"] += 1
+            stats["compressed_responses"] += int(compressed)
+            stats["bytes_in"] += bytes_in
+            stats["bytes_out"] += bytes_out
+            stats["cpu_seconds"] += cpu_seconds
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            routes = {route: dict(stats) for route, stats in self._routes.items()}
+        for stats in routes.values():
+            stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+            stats["ratio"] = round(stats["bytes_out"] / stats["bytes_in"], 4) if stats["bytes_in"] else None
+            stats["cpu_ms_per_response"] = (
+                round(stats["cpu_seconds"] * 1000 / stats["compressed_responses"], 3)
+                if stats["compressed_responses"] else None
+            )
+        return routes
+
+
+compression_metrics = CompressionMetrics()
+
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        self.cpu_seconds = 0.0
+
+    def compress(self, data: bytes, flush: bool = False, finish: bool = False) -> bytes:
+        started = time.thread_time()
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            if finish:
+                out += self._brotli.finish()
+            elif flush:
+                out += self._brotli.flush()
+        else:
+            out = self._zlib.compress(data)
+            if finish:
+                out += self._zlib.flush(zlib.Z_FINISH)
+            elif flush:
+                out += self._zlib.flush(zlib.Z_SYNC_FLUSH)
+        self.cpu_seconds += time.thread_time() - started
+        return out
+
+
+class CompressionMiddleware:
+    """Negotiated brotli/gzip compression for HTTP responses.
+
+    Complete responses smaller than `minimum_size` are sent as-is. Streamed
+    responses (more than one body message) are compressed chunk by chunk
+    with a sync flush, never buffered, and event streams are left alone.
+    Bytes and CPU time are recorded per route in `compression_metrics`.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4,
+                 metrics: CompressionMetrics = compression_metrics):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = negotiate_encoding(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, scope, send, encoding)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, scope, send, encoding: str):
+        self.middleware = middleware
+        self.scope = scope
+        self.downstream = send
+        self.encoding = encoding
+        self.start_message = None
+        self.mode = "pending"  # pending -> passthrough | compress
+        self.compressor: Optional[_Compressor] = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _route(self) -> str:
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or self.scope.get("path", "")
+
+    def _should_skip(self, message) -> bool:
+        status = message["status"]
+        if status < 200 or status in (204, 304):
+            return True
+        headers = dict((name.lower(), value) for name, value in message.get("headers", []))
+        if b"content-encoding" in headers:
+            return True
+        content_type = headers.get(b"content-type", b"").decode("latin-1").lower()
+        return content_type.startswith(EXCLUDED_CONTENT_TYPES)
+
+    def _compressed_headers(self) -> List[Tuple[bytes, bytes]]:
+        headers = [
+            (name, value) for name, value in self.start_message.get("headers", [])
+            if name.lower() not in (b"content-length", b"content-encoding")
+        ]
+        vary = [value for name, value in headers if name.lower() == b"vary"]
+        headers = [(name, value) for name, value in headers if name.lower() != b"vary"]
+        vary_value = b", ".join(vary + [b"Accept-Encoding"]) if vary else b"Accept-Encoding"
+        headers.append((b"vary", vary_value))
+        headers.append((b"content-encoding", self.encoding.encode("latin-1")))
+        return headers
+
+    async def send(self, message) -> None:
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            self.start_message = message
+            if self._should_skip(message):
+                self.mode = "passthrough"
+                await self.downstream(message)
+            return
+
+        if message_type != "http.response.body":
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        self.bytes_in += len(body)
+
+        if self.mode == "passthrough":
+            self.bytes_out += len(body)
+            await self.downstream(message)
+            if not more_body:
+                self._record(False)
+            return
+
+        if self.mode == "pending":
+            if not more_body and len(body) < self.middleware.minimum_size:
+                # Small complete response: not worth the CPU
+                self.mode = "passthrough"
+                self.bytes_out += len(body)
+                await self.downstream(self.start_message)
+                await self.downstream(message)
+                self._record(False)
+                return
+            self.mode = "compress"
+            self.compressor = _Compressor(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+            await self.downstream({**self.start_message, "headers": self._compressed_headers()})
+
+        # Flush each chunk of a streamed response so the client sees it promptly
+        data = self.compressor.compress(body, flush=more_body, finish=not more_body)
+        self.bytes_out += len(data)
+        await self.downstream({"type": "http.response.body", "body": data, "more_body": more_body})
+        if not more_body:
+            self._record(True)
+
+    def _record(self, compressed: bool) -> None:
+        self.middleware.metrics.record(
+            self._route(), self.bytes_in, self.bytes_out,
+            self.compressor.cpu_seconds if self.compressor else 0.0, compressed
+        )
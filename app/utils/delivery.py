@@ -0,0 +1,232 @@
+import csv
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# Outward code of a UK postcode, optionally followed by the inward code
+POSTCODE = re.compile(r"\b([A-Z]{1,2}\d[A-Z\d]?)\s*(\d[A-Z]{2})?\b")
+KM_PER_DEGREE_LAT = 111.32
+DEFAULT_POSTCODE_TABLE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "postcode_districts.csv")
+
+Point = Tuple[float, float]
+
+
+class PostcodeTable:
+    """Postcode district -> centroid lookup loaded from a local CSV (district,latitude,longitude).
+
+    Sub-districts such as SW1A or EC2M fall back to their district (SW1,
+    EC2), and unknown districts to the mean of their postcode area.
+    """
+
+    def __init__(self, centroids: Dict[str, Point]):
+        self.centroids = centroids
+        areas: Dict[str, List[Point]] = {}
+        for district, point in centroids.items():
+            areas.setdefault(re.match(r"[A-Z]+", district).group(), []).append(point)
+        self.area_centroids = {
+            area: (sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points))
+            for area, points in areas.items()
+        }
+
+    @classmethod
+    def load(cls, path: str) -> "PostcodeTable":
+        with open(path, newline="") as f:
+            return cls({
+                row["district"].strip().upper(): (float(row["latitude"]), float(row["longitude"]))
+                for row in csv.DictReader(f)
+            })
+
+    def locate(self, district: str) -> Optional[Point]:
+        if district in self.centroids:
+            return self.centroids[district]
+        if district[-1].isalpha() and district[:-1] in self.centroids:
+            return self.centroids[district[:-1]]
+        return self.area_centroids.get(re.match(r"[A-Z]+", district).group())
+
+
+@lru_cache(maxsize=4)
+def get_postcode_table(path: Optional[str] = None) -> PostcodeTable:
+    return PostcodeTable.load(path or DEFAULT_POSTCODE_TABLE)
+
+
+def find_postcode(text: Optional[str]) -> Optional[re.Match]:
+    """Postcode in a free-text address or postcode field; full postcodes win over bare outward codes"""
+    if not text:
+        return None
+    matches = list(POSTCODE.finditer(text.upper()))
+    full = [match for match in matches if match.group(2)]
+    return (full or matches or [None])[-1]
+
+
+def _coordinates(latitude: Any, longitude: Any) -> Optional[Point]:
+    """Client-supplied coordinates, or None when missing or unusable (the postcode is used instead)"""
+    if latitude is None or longitude is None:
+        return None
+    try:
+        point = (float(latitude), float(longitude))
+    except (TypeError, ValueError):
+        return None
+    if not all(math.isfinite(value) for value in point) or abs(point[0]) > 90 or abs(point[1]) > 180:
+        return None
+    return point
+
+
+class DeliveryStop:
+    def __init__(self, order_id: int, customer_name: str, customer_phone: Optional[str], address: Any):
+        self.order_id = order_id
+        self.customer_name = customer_name
+        self.customer_phone = customer_phone
+        self.address = address
+        self.postcode: Optional[str] = None
+        self.district: Optional[str] = None
+        self.point: Optional[Point] = None
+        self.sequence: Optional[int] = None
+
+    def locate(self, table: PostcodeTable) -> "DeliveryStop":
+        address = self.address
+        if isinstance(address, dict):
+            self.postcode = address.get("postcode") or address.get("postCode")
+            self.point = _coordinates(address.get("latitude"), address.get("longitude"))
+            text = self.postcode or " ".join(str(value) for value in address.values() if value)
+        else:
+            text = str(address or "")
+        match = find_postcode(text)
+        if match:
+            self.district = match.group(1)
+            self.postcode = self.postcode or match.group(0)
+        if self.point is None and self.district:
+            self.point = table.locate(self.district)
+        return self
+
+
+def _distance_km(a: Point, b: Point) -> float:
+    """Equirectangular approximation, accurate to well under 1% at city scale"""
+    x = (b[1] - a[1]) * KM_PER_DEGREE_LAT * math.cos(math.radians((a[0] + b[0]) / 2))
+    y = (b[0] - a[0]) * KM_PER_DEGREE_LAT
+    return math.hypot(x, y)
+
+
+class SpatialGrid:
+    """Buckets points into square cells of roughly `cell_km` on a side"""
+
+    def __init__(self, origin: Point, cell_km: float):
+        self.origin = origin
+        self.lat_step = cell_km / KM_PER_DEGREE_LAT
+        self.lon_step = cell_km / (KM_PER_DEGREE_LAT * math.cos(math.radians(origin[0])))
+        self.cells: Dict[Tuple[int, int], List[DeliveryStop]] = {}
+
+    def cell_of(self, point: Point) -> Tuple[int, int]:
+        return (
+            math.floor((point[0] - self.origin[0]) / self.lat_step),
+            math.floor((point[1] - self.origin[1]) / self.lon_step),
+        )
+
+    def add(self, stop: DeliveryStop) -> None:
+        self.cells.setdefault(self.cell_of(stop.point), []).append(stop)
+
+    def center(self, cell: Tuple[int, int]) -> Point:
+        return (
+            self.origin[0] + (cell[0] + 0.5) * self.lat_step,
+            self.origin[1] + (cell[1] + 0.5) * self.lon_step,
+        )
+
+
+def _nearest_neighbour(points: List[Tuple[Point, Any]], start: Point) -> List[Tuple[Point, Any]]:
+    """Greedy tour over (point, payload) pairs; quadratic, so callers keep the lists short"""
+    remaining = list(points)
+    route = []
+    current = start
+    while remaining:
+        index = min(range(len(remaining)), key=lambda i: _distance_km(current, remaining[i][0]))
+        current, _ = remaining[index]
+        route.append(remaining.pop(index))
+    return route
+
+
+def _route(stops: List[DeliveryStop], depot: Point, cell_km: float) -> Tuple[List[DeliveryStop], float]:
+    """Order a batch: nearest neighbour between grid cells, then within each cell.
+
+    Working cell by cell, over distinct points (stops located by district
+    centroid share one), keeps the quadratic step small enough for batches
+    of hundreds of stops.
+    """
+    grid = SpatialGrid(depot, cell_km)
+    for stop in stops:
+        grid.add(stop)
+
+    ordered: List[DeliveryStop] = []
+    current = depot
+    for _, cell in _nearest_neighbour([(grid.center(cell), cell) for cell in grid.cells], depot):
+        by_point: Dict[Point, List[DeliveryStop]] = {}
+        for stop in grid.cells[cell]:
+            by_point.setdefault(stop.point, []).append(stop)
+        for point, same_point in _nearest_neighbour(list(by_point.items()), current):
+            ordered.extend(same_point)
+            current = point
+
+    distance = 0.0
+    current = depot
+    for sequence, stop in enumerate(ordered, start=1):
+        stop.sequence = sequence
+        distance += _distance_km(current, stop.point)
+        current = stop.point
+    return ordered, distance
+
+
+def plan_delivery_batches(
+    stops: List[DeliveryStop],
+    driver_count: int,
+    depot: Optional[Point] = None,
+    cell_km: float = 1.0,
+) -> Tuple[List[Dict[str, Any]], List[DeliveryStop]]:
+    """Split located stops into `driver_count` balanced, compact batches with a drop order.
+
+    Stops are bucketed into grid cells and the cells swept by bearing around
+    the depot (the stops' centroid when no depot is known), so each batch is
+    a contiguous wedge of the map; the sweep is cut into equal-sized runs.
+    Returns (batches, unlocated stops).
+    """
+    located = [stop for stop in stops if stop.point is not None]
+    unlocated = [stop for stop in stops if stop.point is None]
+    if not located:
+        return [], unlocated
+
+    if depot is None:
+        depot = (
+            sum(stop.point[0] for stop in located) / len(located),
+            sum(stop.point[1] for stop in located) / len(located),
+        )
+
+    grid = SpatialGrid(depot, cell_km)
+    for stop in located:
+        grid.add(stop)
+
+    def sweep_key(cell):
+        center = grid.center(cell)
+        x = (center[1] - depot[1]) * math.cos(math.radians(depot[0]))
+        return math.atan2(center[0] - depot[0], x), _distance_km(depot, center)
+
+    swept = [
+        stop
+        for cell in sorted(grid.cells, key=sweep_key)
+        for stop in sorted(grid.cells[cell], key=lambda stop: (stop.district or "", stop.order_id))
+    ]
+
+    driver_count = max(1, min(driver_count, len(swept)))
+    base, extra = divmod(len(swept), driver_count)
+    batches = []
+    start = 0
+    for number in range(driver_count):
+        size = base + (1 if number < extra else 0)
+        ordered, distance = _route(swept[start:start + size], depot, cell_km)
+        start += size
+        batches.append({
+            "batch_number": number + 1,
+            "stop_count": len(ordered),
+            "districts": sorted({stop.district for stop in ordered if stop.district}),
+            "distance_km": round(distance, 2),
+            "stops": ordered,
+        })
+    return batches, unlocated
@@ -1,7 +1,7 @@
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from app.core.config import settings
+from app.utils.smtp_pool import get_smtp_pool
 
 def send_email(to_email: str, subject: str, body: str):
     try:
@@ -12,12 +12,8 @@ def send_email(to_email: str, subject: str, body: str):
         
         msg.attach(MIMEText(body, 'plain'))
         
-        server = smtplib.SMTP(settings.email_host, settings.email_port)
-        server.starttls()
-        server.login(settings.email_username, settings.email_password)
-        text = msg.as_string()
-        server.sendmail(settings.email_username, to_email, text)
-        server.quit()
+        pool = get_smtp_pool(settings.email_host, settings.email_port, settings.email_username, settings.email_password)
+        pool.send_message(msg, settings.email_username, to_email)
         
         return True
     except Exception as e:
@@ -0,0 +1,148 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from fastapi.encoders import jsonable_encoder
+
+
+class Event:
+    def __init__(self, event_id: str, sequence: int, caterer_id: Optional[int], event_type: str, data: Dict[str, Any]):
+        self.event_id = event_id
+        self.sequence = sequence
+        self.caterer_id = caterer_id
+        self.event_type = event_type
+        self.data = data
+
+    def to_sse(self) -> str:
+        return f"id: {self.event_id}\nevent: {self.event_type}\ndata: {json.dumps(jsonable_encoder(self.data))}\n\n"
+
+
+RESET = Event("", 0, None, "reset", {"message": "Event history unavailable, re-fetch current state"})
+
+
+class Subscription:
+    def __init__(self, bus: "EventBus", caterer_id: int, backlog: List[Event], maxsize: int):
+        self.bus = bus
+        self.caterer_id = caterer_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        for event in backlog:
+            self.queue.put_nowait(event)
+
+    def deliver(self, event: Event) -> None:
+        """Called on the subscriber's loop; a full queue means the client fell too far behind"""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.close()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESET)
+
+    async def get(self) -> Event:
+        return await self.queue.get()
+
+    def close(self) -> None:
+        self.bus._unsubscribe(self)
+
+
+class EventBus:
+    """In-process pub/sub for order and payment changes, scoped by caterer.
+
+    Publishers may run on worker threads (sync endpoints); events are handed
+    to each subscriber's event loop thread-safely. A bounded history lets
+    clients resume from their Last-Event-ID. Event ids carry a per-process
+    epoch so a client reconnecting after a restart gets a reset instead of
+    silently missing events.
+    """
+
+    def __init__(self, history_size: int = 5000, queue_size: int = 1000):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.queue_size = queue_size
+        self._sequence = itertools.count(1)
+        self._history: deque = deque(maxlen=history_size)
+        self._subscribers: Dict[int, set] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, caterer_id: Optional[int], event_type: str, data: Dict[str, Any]) -> None:
+        with self._lock:
+            sequence = next(self._sequence)
+            event = Event(f"{self.epoch}-{sequence}", sequence, caterer_id, event_type,
+                          {**data, "published_at": datetime.utcnow().isoformat()})
+            self._history.append(event)
+            subscribers = list(self._subscribers.get(caterer_id, ()))
+        for subscription in subscribers:
+            subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+
+    def subscribe(self, caterer_id: int, last_event_id: Optional[str] = None) -> Subscription:
+        """Must be called from the event loop that will consume the subscription"""
+        with self._lock:
+            backlog = self._backlog(caterer_id, last_event_id)
+            subscription = Subscription(self, caterer_id, backlog, self.queue_size)
+            self._subscribers.setdefault(caterer_id, set()).add(subscription)
+        return subscription
+
+    def _backlog(self, caterer_id: int, last_event_id: Optional[str]) -> List[Event]:
+        if not last_event_id:
+            return []
+        epoch, _, sequence = last_event_id.partition("-")
+        if epoch != self.epoch or not sequence.isdigit():
+            return [RESET]
+        sequence = int(sequence)
+        if self._history and self._history[0].sequence > sequence + 1:
+            return [RESET]
+        return [
+            event for event in self._history
+            if event.sequence > sequence and event.caterer_id == caterer_id
+        ][-self.queue_size:]
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.caterer_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.caterer_id]
+
+
+order_events = EventBus()
+
+
+def order_event_data(order) -> Dict[str, Any]:
+    """Compact order summary carried by feed events"""
+    return {
+        "order_id": order.order_id,
+        "menu_id": order.menu_id,
+        "menu_date": order.menu_date,
+        "status": order.status,
+        "payment_status": order.payment_status,
+        "total": order.total,
+    }
+
+
+def publish_order_event(event_type: str, order) -> None:
+    order_events.publish(order.caterer_id, event_type, order_event_data(order))
+
+
+async def sse_stream(subscription: Subscription, request, keepalive_seconds: float = 15):
+    """Server-Sent Events body for a subscription; ends when the client disconnects"""
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            if await request.is_disconnected():
+                break
+            try:
+                event = await asyncio.wait_for(subscription.get(), timeout=keepalive_seconds)
+            except asyncio.TimeoutError:
+                yield f": keep-alive {int(time.time())}\n\n"
+                continue
+            yield event.to_sse()
+            if event is RESET:
+                break
+    finally:
+        subscription.close()
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.core.config import settings
+from app.utils.cache import TTLCache
+
+IN_FLIGHT = "__in_flight__"
+
+
+class StoredResponse:
+    """Response recorded for an idempotency key, replayed verbatim for duplicates"""
+
+    def __init__(self, fingerprint: str, status_code: int, body: Any):
+        self.fingerprint = fingerprint
+        self.status_code = status_code
+        self.body = body
+
+    def to_json(self) -> str:
+        return json.dumps({"fingerprint": self.fingerprint, "status_code": self.status_code, "body": self.body})
+
+    @classmethod
+    def from_json(cls, raw) -> "StoredResponse":
+        data = json.loads(raw)
+        return cls(data["fingerprint"], data["status_code"], data["body"])
+
+
+IN_PROGRESS_DETAIL = "A request with this Idempotency-Key is still in progress"
+
+
+class MemoryIdempotencyBackend:
+    """Per-process store of completed responses and keys still in flight"""
+
+    def __init__(self, ttl_seconds: int):
+        self._responses = TTLCache(ttl_seconds=ttl_seconds, maxsize=100_000)
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def claim(self, key: str) -> Optional[StoredResponse]:
+        """Return the stored response for a duplicate, or None once this caller owns the key.
+
+        A duplicate of a request still running gets 409 straight away; the
+        client retries later and then receives the stored response.
+        """
+        with self._lock:
+            stored = self._responses.get(key)
+            if stored is not None:
+                return stored
+            if key in self._in_flight:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=IN_PROGRESS_DETAIL)
+            self._in_flight.add(key)
+            return None
+
+    def complete(self, key: str, response: StoredResponse) -> None:
+        with self._lock:
+            self._responses.set(key, response)
+            self._in_flight.discard(key)
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._in_flight.discard(key)
+
+
+class RedisIdempotencyBackend:
+    """Shared store for multi-worker deployments; the in-flight marker expires if its worker dies"""
+
+    def __init__(self, redis_url: str, ttl_seconds: int, in_flight_ttl_seconds: int = 60):
+        import redis
+
+        self._redis = redis.Redis.from_url(redis_url)
+        self.ttl_seconds = ttl_seconds
+        self.in_flight_ttl_seconds = in_flight_ttl_seconds
+
+    def claim(self, key: str) -> Optional[StoredResponse]:
+        if self._redis.set(key, IN_FLIGHT, nx=True, ex=self.in_flight_ttl_seconds):
+            return None
+        raw = self._redis.get(key)
+        if raw is None:
+            # Released or expired between the two calls; try once more
+            if self._redis.set(key, IN_FLIGHT, nx=True, ex=self.in_flight_ttl_seconds):
+                return None
+            raw = self._redis.get(key)
+        if raw is not None and raw.decode() != IN_FLIGHT:
+            return StoredResponse.from_json(raw)
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=IN_PROGRESS_DETAIL)
+
+    def complete(self, key: str, response: StoredResponse) -> None:
+        self._redis.set(key, response.to_json(), ex=self.ttl_seconds)
+
+    def release(self, key: str) -> None:
+        self._redis.delete(key)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_idempotency_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if settings.idempotency_backend == "redis":
+                _backend = RedisIdempotencyBackend(settings.redis_url, settings.idempotency_ttl_seconds)
+            else:
+                _backend = MemoryIdempotencyBackend(settings.idempotency_ttl_seconds)
+        return _backend
+
+
+class IdempotentRequest:
+    def __init__(self, key: Optional[str], fingerprint: str):
+        self.key = key
+        self.fingerprint = fingerprint
+        self.replay: Optional[JSONResponse] = None
+        self.saved = False
+
+    def save(self, result: Any, status_code: int = 200) -> Any:
+        """Record the response for this key and hand the result back to the endpoint"""
+        if self.key:
+            body = jsonable_encoder(result)
+            get_idempotency_backend().complete(self.key, StoredResponse(self.fingerprint, status_code, body))
+        self.saved = True
+        return result
+
+
+def idempotency_key_scope(scope: str, owner_email: Optional[str], key: str) -> str:
+    """Store key for a client's Idempotency-Key: keys only collide for the same endpoint and user"""
+    owner = hashlib.sha256(owner_email.encode("utf-8")).hexdigest()[:16] if owner_email else "anonymous"
+    return f"idempotency:{scope}:{owner}:{key}"
+
+
+@contextmanager
+def idempotent_request(
+    scope: str, key: Optional[str], payload: Any, owner_email: Optional[str] = None
+) -> Iterator[IdempotentRequest]:
+    """Honor an Idempotency-Key header around an endpoint body.
+
+    Without a key the body always runs. With a key (scoped to the endpoint
+    and the token's user, if any), a completed duplicate gets the stored
+    response in `request.replay`, and a duplicate of a request still running
+    gets 409. Failed requests are not recorded, so a retry after an error
+    runs again.
+    """
+    fingerprint = hashlib.sha256(
+        json.dumps(jsonable_encoder(payload), sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    if not key:
+        yield IdempotentRequest(None, fingerprint)
+        return
+
+    backend = get_idempotency_backend()
+    scoped_key = idempotency_key_scope(scope, owner_email, key)
+    stored = backend.claim(scoped_key)
+    request = IdempotentRequest(scoped_key, fingerprint)
+
+    if stored is not None:
+        if stored.fingerprint != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used with a different request"
+            )
+        request.replay = JSONResponse(content=stored.body, status_code=stored.status_code)
+        request.saved = True
+        yield request
+        return
+
+    try:
+        yield request
+    finally:
+        if not request.saved:
+            backend.release(scoped_key)
@@ -0,0 +1,171 @@
+import logging
+import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from pydantic import ValidationError
+from twilio.base.exceptions import TwilioRestException
+from app.core.config import settings
+from app.crud.notifications import NotificationOutboxCRUD
+from app.database import SessionLocal
+from app.schemas.notifications import EmailRequest, EmailService, SMSRequest, SMSService
+from app.schemas.user import deliver_confirmation_email
+
+logger = logging.getLogger(__name__)
+
+
+def _send_email(payload: Dict[str, Any]) -> Optional[str]:
+    EmailService.deliver(EmailRequest(**payload))
+    return None
+
+
+def _send_sms(payload: Dict[str, Any]) -> Optional[str]:
+    return SMSService.deliver(SMSRequest(**payload))
+
+
+def _send_confirmation_email(payload: Dict[str, Any]) -> Optional[str]:
+    deliver_confirmation_email(payload["email"], payload["token"], payload["name"])
+    return None
+
+
+# Outbox kind -> sender; a sender raises on failure and may return the provider's message id
+SENDERS: Dict[str, Callable[[Dict[str, Any]], Optional[str]]] = {
+    "email": _send_email,
+    "sms": _send_sms,
+    "confirmation_email": _send_confirmation_email,
+}
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    """Failures that no retry will fix: bad payloads, refused recipients, 4xx from Twilio"""
+    if isinstance(error, (ValidationError, KeyError)):
+        return True
+    if isinstance(error, (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused)):
+        return True
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        # Our misconfiguration, not the message's; retry once credentials are fixed
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 500 <= error.smtp_code < 600
+    if isinstance(error, TwilioRestException):
+        return 400 <= (error.status or 0) < 500 and error.status != 429
+    return False
+
+
+class NotificationWorker:
+    """Drains notification_outbox outside the API process.
+
+    Claims due messages in batches (leased, so a crashed worker's messages
+    are picked up again), sends them on a thread pool capped at
+    `concurrency` with a further per-channel cap, and records each outcome:
+    sent, retried later with exponential backoff, or dead-lettered after
+    max_attempts or a permanent failure.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = settings.notification_worker_concurrency,
+        channel_limits: Optional[Dict[str, int]] = None,
+        batch_size: int = 50,
+        lease_seconds: float = settings.notification_lease_seconds,
+        poll_interval: float = settings.notification_poll_interval_seconds,
+    ):
+        channel_limits = channel_limits or {
+            "email": settings.notification_email_concurrency,
+            "sms": settings.notification_sms_concurrency,
+        }
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._capacity = threading.Semaphore(concurrency)
+        self._channel_slots = {channel: threading.BoundedSemaphore(limit) for channel, limit in channel_limits.items()}
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.stats = {"sent": 0, "retried": 0, "dead": 0}
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _reserve(self) -> int:
+        # Block for one free sender thread, then take whatever else is free
+        if not self._capacity.acquire(timeout=self.poll_interval):
+            return 0
+        reserved = 1
+        while reserved < self.batch_size and self._capacity.acquire(blocking=False):
+            reserved += 1
+        return reserved
+
+    def run(self, until_idle: bool = False) -> Dict[str, int]:
+        """Process messages until stop() (or, with until_idle, until nothing is due)"""
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="notify") as executor:
+            while not self._stop.is_set():
+                reserved = self._reserve()
+                if not reserved:
+                    continue
+                try:
+                    db = SessionLocal()
+                    try:
+                        messages = NotificationOutboxCRUD.claim(db, reserved, self.lease_seconds)
+                    finally:
+                        db.close()
+                except Exception as e:
+                    messages = []
+                    logger.error(f"Could not claim notifications: {str(e)}")
+
+                for _ in range(reserved - len(messages)):
+                    self._capacity.release()
+                for message in messages:
+                    executor.submit(self._process, message)
+
+                if not messages:
+                    if until_idle:
+                        break
+                    self._stop.wait(self.poll_interval)
+        return self.stats
+
+    def _count(self, outcome: str) -> None:
+        with self._stats_lock:
+            self.stats[outcome] += 1
+
+    def _process(self, message: Dict[str, Any]) -> None:
+        try:
+            provider_message_id, error = None, None
+            slot = self._channel_slots.get(message["channel"])
+            try:
+                if slot:
+                    slot.acquire()
+                try:
+                    sender = SENDERS[message["kind"]]
+                    provider_message_id = sender(message["payload"])
+                finally:
+                    if slot:
+                        slot.release()
+            except Exception as e:
+                error = e
+
+            db = SessionLocal()
+            try:
+                if error is None:
+                    NotificationOutboxCRUD.mark_sent(db, message["message_id"], provider_message_id)
+                    self._count("sent")
+                    return
+                status = NotificationOutboxCRUD.mark_failed(
+                    db, message, f"{type(error).__name__}: {error}", permanent=is_permanent_failure(error)
+                )
+                if status == "dead":
+                    self._count("dead")
+                    logger.error(
+                        f"Notification {message['message_id']} ({message['kind']}) dead-lettered after "
+                        f"{message['attempts']} attempts: {str(error)}"
+                    )
+                else:
+                    self._count("retried")
+                    logger.warning(f"Notification {message['message_id']} attempt {message['attempts']} failed: {str(error)}")
+            finally:
+                db.close()
+        except Exception as e:
+            # The lease expires and another pass retries it
+            logger.error(f"Could not record outcome of notification {message['message_id']}: {str(e)}")
+        finally:
+            self._capacity.release()
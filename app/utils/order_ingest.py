@@ -0,0 +1,160 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import insert
+from app.core.config import settings
+from app.crud.order_events import OrderEventCRUD, order_event_row
+from app.crud.sales import OrderSnapshot, SalesRollupCRUD
+from app.crud.stock import StockCRUD
+from app.database import SessionLocal
+from app.models.order import Order
+
+logger = logging.getLogger(__name__)
+
+
+class PendingOrder:
+    def __init__(self, values: Dict, quantities: Dict[int, int]):
+        self.values = values
+        self.quantities = quantities
+        self.future: Future = Future()
+
+
+class OrderIngestQueue:
+    """Group-commit writer for order creation during flash-sale peaks.
+
+    Requests enqueue validated, priced orders and block on their own future.
+    A single writer thread drains the queue in micro-batches (up to
+    `max_batch` orders or `max_wait_seconds` after the first one arrives),
+    reserves stock per order under a savepoint, inserts the survivors with
+    one multi-row INSERT ... RETURNING and commits once per batch.
+
+    An order is claimed (its future set running) before its stock is
+    reserved. A request that times out first cancels its still-unclaimed
+    order, so the writer skips it and a 503 never hides an order placed later.
+    """
+
+    def __init__(self, session_factory=SessionLocal, max_batch: int = 100, max_wait_seconds: float = 0.01):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_wait_seconds = max_wait_seconds
+        self._queue: "queue.Queue[PendingOrder]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, values: Dict, quantities: Dict[int, int], timeout: float = 10) -> Order:
+        """Enqueue an order and wait for its batch to commit; returns a transient Order.
+
+        Raises FutureTimeoutError only if the order was withdrawn unplaced.
+        """
+        self._ensure_worker()
+        pending = PendingOrder(values, quantities)
+        self._queue.put(pending)
+        try:
+            order_id = pending.future.result(timeout=timeout)
+        except FutureTimeoutError:
+            if pending.future.cancel():
+                raise
+            # Already claimed by a batch, which decides its outcome shortly
+            order_id = pending.future.result()
+        return Order(order_id=order_id, **values)
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="order-ingest", daemon=True)
+                self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait_seconds
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, batch: List[PendingOrder]) -> None:
+        db = self.session_factory()
+        try:
+            accepted: List[PendingOrder] = []
+            for pending in batch:
+                if not pending.future.set_running_or_notify_cancel():
+                    continue  # Its request timed out and withdrew it
+                try:
+                    with db.begin_nested():
+                        StockCRUD.reserve(db, pending.values["menu_id"], pending.quantities)
+                    accepted.append(pending)
+                except HTTPException as e:
+                    pending.future.set_exception(e)
+
+            inserted = self._insert(db, accepted) if accepted else []
+            if inserted:
+                created = [Order(order_id=order_id, **pending.values) for pending, order_id in inserted]
+                SalesRollupCRUD.record_changes(db, [(None, OrderSnapshot.of(order)) for order in created])
+                OrderEventCRUD.record(db, [order_event_row("order.created", order) for order in created])
+            db.commit()
+
+            for pending, order_id in inserted:
+                pending.future.set_result(order_id)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Order batch of {len(batch)} failed: {str(e)}")
+            for pending in batch:
+                if pending.future.done():
+                    continue
+                if pending.future.running() or pending.future.set_running_or_notify_cancel():
+                    pending.future.set_exception(HTTPException(status_code=500, detail="Failed to create order"))
+        finally:
+            db.close()
+
+    def _insert(self, db, accepted: List[PendingOrder]) -> List[Tuple[PendingOrder, int]]:
+        """Insert the batch in one statement, falling back to one savepoint per order.
+
+        A row the database rejects only fails its own order (its stock is
+        released); the rest of the batch still commits.
+        """
+        try:
+            with db.begin_nested():
+                order_ids = db.execute(
+                    insert(Order).returning(Order.order_id, sort_by_parameter_order=True),
+                    [pending.values for pending in accepted]
+                ).scalars().all()
+            return list(zip(accepted, order_ids))
+        except Exception as e:
+            logger.warning(f"Multi-row insert of {len(accepted)} orders failed, retrying row by row: {str(e)}")
+
+        inserted = []
+        for pending in accepted:
+            try:
+                with db.begin_nested():
+                    order_id = db.execute(insert(Order).returning(Order.order_id), pending.values).scalar_one()
+                inserted.append((pending, order_id))
+            except Exception as e:
+                logger.error(f"Order for menu {pending.values['menu_id']} failed to insert: {str(e)}")
+                StockCRUD.release(db, pending.values["menu_id"], pending.quantities)
+                pending.future.set_exception(HTTPException(status_code=500, detail="Failed to create order"))
+        return inserted
+
+
+_ingest_queue: Optional[OrderIngestQueue] = None
+_ingest_queue_lock = threading.Lock()
+
+
+def get_order_ingest_queue() -> OrderIngestQueue:
+    global _ingest_queue
+    with _ingest_queue_lock:
+        if _ingest_queue is None:
+            _ingest_queue = OrderIngestQueue(
+                max_batch=settings.order_ingest_max_batch,
+                max_wait_seconds=settings.order_ingest_max_wait_ms / 1000
+            )
+        return _ingest_queue
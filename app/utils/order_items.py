@@ -0,0 +1,31 @@
+from typing import Dict, Iterator, Tuple
+
+
+def iter_order_lines(items: Dict) -> Iterator[Tuple[int, int]]:
+    """Yield (catalog_item_id, quantity) for each line of an order's items JSON.
+
+    Orders store the cart as {"<catalog_item_id>": {"quantity": n, ...}};
+    entries that are not cart lines (free-form notes) are skipped.
+    """
+    if not items:
+        return
+
+    for key, line in items.items():
+        if not isinstance(line, dict):
+            continue
+        try:
+            item_id = int(line.get("catalog_item_id", key))
+            quantity = int(line.get("quantity", 0))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid order line: {key}")
+        if quantity <= 0:
+            continue
+        yield item_id, quantity
+
+
+def order_line_quantities(items: Dict) -> Dict[int, int]:
+    """Total quantity ordered per catalog_item_id"""
+    quantities: Dict[int, int] = {}
+    for item_id, quantity in iter_order_lines(items):
+        quantities[item_id] = quantities.get(item_id, 0) + quantity
+    return quantities
@@ -0,0 +1,191 @@
+import re
+from datetime import date
+from typing import List, Tuple
+from sqlalchemy import text
+from app.crud.customer_search import create_customer_search_indexes
+
+# table -> (partition key, primary key columns)
+PARTITIONED_TABLES = {
+    "orders": ("menu_date", "order_id, menu_date"),
+    "payments": ("created_at", "payment_id, created_at"),
+}
+
+PARTITION_NAME = re.compile(r"^(?P<table>\w+)_(?P<year>\d{4})_(?P<month>\d{2})$")
+
+
+def _month_start(day: date, offset: int = 0) -> date:
+    month_index = day.year * 12 + day.month - 1 + offset
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _partition_name(table: str, month: date) -> str:
+    return f"{table}_{month.year:04d}_{month.month:02d}"
+
+
+def is_partitioned(connection, table: str) -> bool:
+    return bool(connection.execute(text("""
+        SELECT 1 FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = :table AND c.relnamespace = 'public'::regnamespace
+    """), {"table": table}).scalar())
+
+
+def list_partitions(connection, table: str) -> List[Tuple[str, date]]:
+    """Monthly partitions of a table as (name, first day of month), oldest first"""
+    names = connection.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits i
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE parent.relname = :table AND parent.relnamespace = 'public'::regnamespace
+    """), {"table": table}).scalars().all()
+
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match and match.group("table") == table:
+            partitions.append((name, date(int(match.group("year")), int(match.group("month")), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_month_partition(connection, table: str, month: date) -> bool:
+    """Create one monthly partition, moving any matching rows out of the default partition.
+
+    Writes to the table wait until the caller commits: a row for this month
+    inserted into the default partition between the move and the ATTACH
+    would make the ATTACH fail. Reads carry on.
+    """
+    key, _ = PARTITIONED_TABLES[table]
+    name = _partition_name(table, month)
+    exists = text("SELECT to_regclass(:name)")
+    if connection.execute(exists, {"name": f"public.{name}"}).scalar():
+        return False
+
+    connection.execute(text(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE"))
+    # Another process may have created it while we waited for the lock
+    if connection.execute(exists, {"name": f"public.{name}"}).scalar():
+        return False
+
+    bounds = {"start": month, "end": _month_start(month, 1)}
+    connection.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)"))
+    connection.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM {table}_default
+            WHERE {key} >= :start AND {key} < :end
+            RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """), bounds)
+    connection.execute(text(f"""
+        ALTER TABLE {table} ATTACH PARTITION {name}
+        FOR VALUES FROM ('{bounds["start"].isoformat()}') TO ('{bounds["end"].isoformat()}')
+    """))
+    return True
+
+
+def ensure_future_partitions(connection, months_ahead: int = 3) -> List[str]:
+    """Make sure every partitioned table has partitions through `months_ahead` months from now"""
+    created = []
+    this_month = _month_start(date.today())
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(connection, table):
+            continue
+        for offset in range(months_ahead + 1):
+            month = _month_start(this_month, offset)
+            if create_month_partition(connection, table, month):
+                created.append(_partition_name(table, month))
+    return created
+
+
+def archive_old_partitions(connection, retention_months: int, archive_schema: str = "archive", drop: bool = False) -> List[str]:
+    """Detach monthly partitions that ended before the retention window.
+
+    Detached partitions are moved to `archive_schema` (or dropped) so they
+    no longer take part in queries against the live tables.
+    """
+    cutoff = _month_start(date.today(), -retention_months)
+    archived = []
+    connection.execute(text(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}"))
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(connection, table):
+            continue
+        for name, month in list_partitions(connection, table):
+            if _month_start(month, 1) > cutoff:
+                continue
+            connection.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            if drop:
+                connection.execute(text(f"DROP TABLE {name}"))
+            else:
+                connection.execute(text(f"ALTER TABLE {name} SET SCHEMA {archive_schema}"))
+            archived.append(name)
+    return archived
+
+
+def migrate_to_partitioned(connection, months_ahead: int = 3) -> None:
+    """Rebuild `orders` (by menu_date) and `payments` (by created_at) as range-partitioned tables.
+
+    Existing rows are copied into monthly partitions. Primary keys become
+    (id, partition key) as Postgres requires, so the orders -> payments
+    foreign key and the (order_id, customer_phone) unique constraint can
+    no longer be enforced and are dropped. Run once, during a quiet window.
+    """
+    connection.execute(text("ALTER TABLE orders DROP CONSTRAINT IF EXISTS fk_orders_payment"))
+    connection.execute(text("ALTER TABLE orders DROP CONSTRAINT IF EXISTS orders_payment_id_fkey"))
+
+    for table, (key, primary_key) in PARTITIONED_TABLES.items():
+        if is_partitioned(connection, table):
+            continue
+
+        legacy = f"{table}_unpartitioned"
+        connection.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+        connection.execute(text(f"""
+            CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS)
+            PARTITION BY RANGE ({key})
+        """))
+        connection.execute(text(f"ALTER TABLE {table} ALTER COLUMN {key} SET NOT NULL"))
+        connection.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY ({primary_key})"))
+        connection.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+
+        first = connection.execute(text(f"SELECT MIN({key}) FROM {legacy}")).scalar()
+        month = _month_start(first if first else date.today())
+        last = _month_start(date.today(), months_ahead)
+        while month <= last:
+            create_month_partition(connection, table, month)
+            month = _month_start(month, 1)
+
+        connection.execute(text(f"INSERT INTO {table} SELECT * FROM {legacy}"))
+        connection.execute(text(f"DROP TABLE {legacy}"))
+
+    connection.execute(text("ALTER TABLE orders DROP CONSTRAINT IF EXISTS fk_orders_menu"))
+    connection.execute(text("""
+        ALTER TABLE orders ADD CONSTRAINT fk_orders_menu
+        FOREIGN KEY (menu_id) REFERENCES scheduled_menu(menu_id)
+    """))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS idx_orders_menu_date ON orders (menu_date)"))
+    connection.execute(text("""
+        CREATE INDEX IF NOT EXISTS idx_orders_caterer_menu_date
+        ON orders (caterer_id, menu_date, order_id)
+    """))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS idx_orders_payment_id ON orders (payment_id)"))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS idx_payments_payment_id ON payments (payment_id)"))
+    connection.execute(text("""
+        CREATE INDEX IF NOT EXISTS idx_payments_payment_intent_id ON payments (payment_intent_id)
+    """))
+    connection.execute(text("""
+        CREATE INDEX IF NOT EXISTS idx_payments_pending ON payments (payment_id)
+        WHERE payment_status = 'pending'
+    """))
+    connection.execute(text("""
+        CREATE INDEX IF NOT EXISTS idx_orders_caterer_menu_date_payment
+        ON orders (caterer_id, menu_date) INCLUDE (payment_id)
+        WHERE payment_id IS NOT NULL
+    """))
+    create_customer_search_indexes(connection)
+    # Triggers are not copied by CREATE TABLE ... LIKE
+    connection.execute(text("DROP TRIGGER IF EXISTS update_orders_updated_at ON orders"))
+    connection.execute(text("""
+        CREATE TRIGGER update_orders_updated_at
+        BEFORE UPDATE ON orders
+        FOR EACH ROW
+        EXECUTE FUNCTION update_updated_at_column()
+    """))
@@ -0,0 +1,57 @@
+from decimal import Decimal
+from typing import Any, Iterable, List, Optional
+import orjson
+from fastapi import HTTPException, status
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import inspect
+
+
+def _default(value: Any) -> Any:
+    # Decimals serialize as strings, matching what pydantic emits for response models
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class FastJSONResponse(ORJSONResponse):
+    """orjson-backed JSON response; the app's default response class"""
+
+    def render(self, content: Any) -> bytes:
+        # UTC as "Z", as pydantic writes it
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+
+
+def sparse_fields(fields: Optional[str], model, schema, exclude: Iterable[str] = ()) -> Optional[List[str]]:
+    """Validate a `fields=a,b,c` query parameter against a list endpoint's columns.
+
+    Only fields that are both on the response schema and real columns of
+    the model can be selected; `exclude` drops columns whose stored form
+    differs from the response's. Returns None when no projection was asked for.
+    """
+    allowed = set(schema.model_fields) & {column.key for column in inspect(model).column_attrs}
+    return select_fields(fields, allowed - set(exclude))
+
+
+def select_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[List[str]]:
+    """Validate a `fields=a,b,c` query parameter against an explicit set of field names"""
+    if not fields:
+        return None
+    allowed = set(allowed)
+    requested = list(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in requested if field not in allowed]
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown) or fields}. Allowed: {', '.join(sorted(allowed))}"
+        )
+    return requested
+
+
+def sparse_response(query, model, fields: List[str]) -> FastJSONResponse:
+    """Run `query` selecting only `fields` and return the rows as JSON objects.
+
+    Skips ORM object loading and response-model validation, which is what
+    makes narrow listings cheap.
+    """
+    rows = query.with_entities(*[getattr(model, field).label(field) for field in fields]).all()
+    return FastJSONResponse([dict(row._mapping) for row in rows])
@@ -0,0 +1,214 @@
+import logging
+import smtplib
+import ssl
+import threading
+import time
+from contextlib import contextmanager
+from email.message import Message
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+
+def _connection_lost(error: Exception) -> bool:
+    """True when the connection is unusable, not merely a rejected message (SMTPException is an OSError)"""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == 421
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class _PooledConnection:
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.messages = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPConnectionPool:
+    """Authenticated SMTP connections shared by every email sender.
+
+    Connections are opened on demand (connect, STARTTLS, login) up to
+    `max_size` and reused. Idle connections older than `idle_timeout` are
+    closed, ones idle longer than `health_check_after` are NOOP-checked
+    before reuse, and a connection is retired after
+    `max_messages_per_connection` messages since many servers cap that.
+    A send that fails because the connection dropped is retried once on a
+    fresh connection.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        use_tls: bool = True,
+        max_size: int = 4,
+        max_messages_per_connection: int = 100,
+        idle_timeout: float = 60,
+        health_check_after: float = 5,
+        timeout: float = 10,
+        wait_timeout: float = 10,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.max_messages_per_connection = max_messages_per_connection
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.timeout = timeout
+        self.wait_timeout = wait_timeout
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle: List[_PooledConnection] = []
+        self._lock = threading.Lock()
+        self.stats = {"connections_opened": 0, "connections_closed": 0, "messages_sent": 0, "reconnects": 0}
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _connect(self) -> _PooledConnection:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                server.starttls(context=ssl.create_default_context())
+            if self.username:
+                server.login(self.username, self.password or "")
+        except Exception:
+            self._close(server)
+            raise
+        self._count("connections_opened")
+        return _PooledConnection(server)
+
+    def _close(self, server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _discard(self, connection: _PooledConnection) -> None:
+        self._close(connection.server)
+        self._count("connections_closed")
+
+    def _healthy(self, connection: _PooledConnection) -> bool:
+        idle = time.monotonic() - connection.last_used
+        if idle > self.idle_timeout:
+            return False
+        if idle <= self.health_check_after:
+            return True
+        try:
+            return connection.server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _checkout(self) -> _PooledConnection:
+        while True:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                return self._connect()
+            if self._healthy(connection):
+                return connection
+            self._discard(connection)
+
+    def _checkin(self, connection: _PooledConnection) -> None:
+        connection.messages += 1
+        connection.last_used = time.monotonic()
+        if connection.messages >= self.max_messages_per_connection:
+            self._discard(connection)
+            return
+        with self._lock:
+            self._idle.append(connection)
+
+    @contextmanager
+    def connection(self):
+        """A ready SMTP connection; it goes back to the pool unless the block raised a connection error"""
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            raise TimeoutError("Timed out waiting for a free SMTP connection")
+        try:
+            connection = self._checkout()
+            try:
+                yield connection.server
+            except Exception as e:
+                if _connection_lost(e):
+                    self._discard(connection)
+                    raise
+                # The message was refused but the session is fine; reset it for the next sender
+                try:
+                    connection.server.rset()
+                except Exception:
+                    self._discard(connection)
+                    raise
+                self._checkin(connection)
+                raise
+            else:
+                self._checkin(connection)
+        finally:
+            self._slots.release()
+
+    def send_message(self, msg: Message, from_addr: Optional[str] = None,
+                     to_addrs: Optional[Union[str, Sequence[str]]] = None) -> None:
+        for attempt in (1, 2):
+            try:
+                with self.connection() as server:
+                    server.send_message(msg, from_addr, to_addrs)
+                self._count("messages_sent")
+                return
+            except smtplib.SMTPServerDisconnected:
+                # Usually a pooled connection the server dropped; try once more on a new one
+                if attempt == 2:
+                    raise
+                self._count("reconnects")
+                logger.warning(f"SMTP connection to {self.host} dropped, reconnecting")
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            self._discard(connection)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.stats, "idle_connections": len(self._idle)}
+
+
+_pools: Dict[Tuple[str, int, Optional[str]], SMTPConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_smtp_pool(host: str, port: int, username: Optional[str], password: Optional[str]) -> SMTPConnectionPool:
+    """The process-wide pool for an SMTP server and account, created on first use"""
+    from app.core.config import settings
+
+    key = (host, port, username)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = SMTPConnectionPool(
+                host, port, username, password,
+                max_size=settings.smtp_pool_size,
+                max_messages_per_connection=settings.smtp_max_messages_per_connection,
+                idle_timeout=settings.smtp_idle_timeout_seconds,
+                health_check_after=settings.smtp_health_check_after_seconds,
+                timeout=settings.smtp_timeout_seconds,
+                wait_timeout=settings.smtp_pool_wait_seconds,
+            )
+        return pool
+
+
+def smtp_pool_metrics() -> Dict[str, Dict[str, int]]:
+    with _pools_lock:
+        pools = dict(_pools)
+    return {f"{host}:{port}": pool.snapshot() for (host, port, _), pool in pools.items()}
+
+
+def close_smtp_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,185 @@
+"""Signed Stripe webhook events and a misbehaving Stripe API stub for local testing.
+
+Builds payment_intent events and signs them the way Stripe does, so the
+/payments/stripe/webhook endpoint can be exercised without the Stripe CLI:
+
+    python -m app.utils.stripe_fixtures pi_123 --type payment_intent.succeeded \\
+        --secret whsec_test --post http://localhost:8000/payments/stripe/webhook
+
+StripeStub serves the payment_intent endpoints locally and can be told to
+answer with 429s, 5xxs or slow responses, for exercising StripeGateway's
+retries, timeouts and concurrency cap (set STRIPE_API_BASE to its url).
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple, Union
+
+
+def payment_intent_event(
+    payment_intent_id: str,
+    event_type: str = "payment_intent.succeeded",
+    amount: int = 1000,
+    currency: str = "gbp",
+    order_id: Optional[int] = None,
+    event_id: Optional[str] = None,
+) -> Dict:
+    intent = {
+        "id": payment_intent_id,
+        "object": "payment_intent",
+        "amount": amount,
+        "currency": currency,
+        "metadata": {"order_id": str(order_id)} if order_id is not None else {},
+        "status": "succeeded" if event_type == "payment_intent.succeeded" else "requires_payment_method",
+        "last_payment_error": None,
+    }
+    if event_type == "payment_intent.payment_failed":
+        intent["last_payment_error"] = {"code": "card_declined", "message": "Your card was declined."}
+    return {
+        "id": event_id or f"evt_test_{uuid.uuid4().hex[:24]}",
+        "object": "event",
+        "type": event_type,
+        "created": int(time.time()),
+        "livemode": False,
+        "data": {"object": intent},
+    }
+
+
+def sign_payload(payload: bytes, secret: str, timestamp: Optional[int] = None) -> str:
+    """Stripe-Signature header value for a payload (v1 = HMAC-SHA256 of 'timestamp.payload')"""
+    timestamp = timestamp or int(time.time())
+    signed = f"{timestamp}.".encode("utf-8") + payload
+    signature = hmac.new(secret.encode("utf-8"), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def signed_event(event: Dict, secret: str, timestamp: Optional[int] = None) -> Tuple[bytes, Dict[str, str]]:
+    """(body, headers) ready to POST to the webhook endpoint"""
+    payload = json.dumps(event).encode("utf-8")
+    return payload, {
+        "Content-Type": "application/json",
+        "Stripe-Signature": sign_payload(payload, secret, timestamp),
+    }
+
+
+class StripeStub:
+    """Local stand-in for the payment_intent endpoints of the Stripe API.
+
+    Each request takes the next scripted behaviour: an HTTP status to fail
+    with (429, 500, 503...) or ("slow", seconds) to stall before answering.
+    Unscripted requests succeed. Counts requests and the peak number handled
+    at once.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._script = deque()
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub._handle(self)
+
+            do_POST = do_GET
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def script(self, *behaviours: Union[int, Tuple[str, float]]) -> None:
+        with self._lock:
+            self._script.extend(behaviours)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._script.clear()
+            self.requests = 0
+            self.peak_in_flight = 0
+
+    def __enter__(self) -> "StripeStub":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handle(self, request: BaseHTTPRequestHandler) -> None:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            behaviour = self._script.popleft() if self._script else None
+        try:
+            status = 200
+            if isinstance(behaviour, tuple):
+                time.sleep(behaviour[1])
+            elif behaviour:
+                status = behaviour
+            request.rfile.read(int(request.headers.get("Content-Length") or 0))
+
+            if status == 200:
+                intent_id = request.path.rstrip("/").rsplit("/", 1)[-1]
+                if not intent_id.startswith("pi_"):
+                    intent_id = f"pi_stub_{uuid.uuid4().hex[:16]}"
+                body = {
+                    "id": intent_id, "object": "payment_intent", "amount": 1000,
+                    "currency": "gbp", "status": "succeeded", "client_secret": f"{intent_id}_secret",
+                }
+            else:
+                body = {"error": {"type": "api_error", "message": f"Stub error {status}"}}
+            payload = json.dumps(body).encode("utf-8")
+            request.send_response(status)
+            request.send_header("Content-Type", "application/json")
+            request.send_header("Content-Length", str(len(payload)))
+            request.end_headers()
+            request.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client timed out and hung up
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a signed Stripe payment_intent webhook event")
+    parser.add_argument("payment_intent_id")
+    parser.add_argument("--type", default="payment_intent.succeeded",
+                        choices=["payment_intent.succeeded", "payment_intent.payment_failed"])
+    parser.add_argument("--secret", required=True, help="Webhook signing secret (STRIPE_WEBHOOK_SECRET)")
+    parser.add_argument("--amount", type=int, default=1000, help="Amount in minor units")
+    parser.add_argument("--event-id", help="Reuse an event id to test deduplication")
+    parser.add_argument("--post", metavar="URL", help="POST the event to this webhook URL")
+    args = parser.parse_args()
+
+    event = payment_intent_event(args.payment_intent_id, args.type, args.amount, event_id=args.event_id)
+    payload, headers = signed_event(event, args.secret)
+
+    if args.post:
+        import requests
+
+        response = requests.post(args.post, data=payload, headers=headers)
+        print(f"{response.status_code} {response.text}")
+    else:
+        print(f"Stripe-Signature: {headers['Stripe-Signature']}")
+        print(payload.decode("utf-8"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+import requests
+import stripe
+from fastapi import HTTPException, status
+from requests.adapters import HTTPAdapter
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_ERRORS = (stripe.error.APIConnectionError, stripe.error.RateLimitError)
+
+
+class StripeLatencyMetrics:
+    """Per-operation call counts, errors, retries and latency percentiles"""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._operations: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation: str, seconds: float, attempts: int, ok: bool) -> None:
+        with self._lock:
+            stats = self._operations.setdefault(operation, {
+                "calls": 0, "errors": 0, "retries": 0, "latencies": deque(maxlen=self.window)
+            })
+            stats["calls"] += 1
+            stats["errors"] += int(not ok)
+            stats["retries"] += attempts - 1
+            stats["latencies"].append(seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            operations = {
+                name: {**stats, "latencies": sorted(stats["latencies"])}
+                for name, stats in self._operations.items()
+            }
+        for stats in operations.values():
+            latencies = stats.pop("latencies")
+
+            def percentile(p):
+                return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+
+            stats["p50_ms"] = percentile(0.50) if latencies else None
+            stats["p95_ms"] = percentile(0.95) if latencies else None
+            stats["max_ms"] = round(latencies[-1] * 1000, 1) if latencies else None
+        return operations
+
+
+class StripeGateway:
+    """All outbound Stripe calls go through here.
+
+    Configures the SDK once: API key and optional base URL (point it at a
+    local stripe-mock server in tests), and a shared keep-alive requests
+    session with connect/read timeouts. Calls are bounded by a semaphore so
+    a slow Stripe can't occupy every worker thread, and idempotent calls are
+    retried with jittered exponential backoff within an overall deadline.
+    """
+
+    def __init__(self):
+        stripe.api_key = settings.stripe_secret_key
+        if settings.stripe_api_base:
+            stripe.api_base = settings.stripe_api_base
+        # Retries are ours, so they respect the deadline and idempotency rules
+        stripe.max_network_retries = 0
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.stripe_max_concurrency)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        stripe.default_http_client = stripe.http_client.RequestsClient(
+            timeout=(settings.stripe_connect_timeout_seconds, settings.stripe_read_timeout_seconds),
+            session=session
+        )
+
+        self._slots = threading.BoundedSemaphore(settings.stripe_max_concurrency)
+        self.metrics = StripeLatencyMetrics()
+
+    def _call(self, operation: str, fn: Callable[[], Any], idempotent: bool) -> Any:
+        if not self._slots.acquire(timeout=settings.stripe_queue_timeout_seconds):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Payment provider is busy, please retry"
+            )
+        started = time.monotonic()
+        deadline = started + settings.stripe_total_timeout_seconds
+        attempts = 0
+        ok = False
+        try:
+            while True:
+                attempts += 1
+                try:
+                    result = fn()
+                    ok = True
+                    return result
+                except stripe.error.StripeError as e:
+                    retryable = isinstance(e, RETRYABLE_ERRORS) or (
+                        isinstance(e, stripe.error.APIError) and (e.http_status or 500) >= 500
+                    )
+                    backoff = min(
+                        settings.stripe_retry_max_backoff_seconds,
+                        settings.stripe_retry_base_backoff_seconds * 2 ** (attempts - 1)
+                    ) * random.uniform(0.5, 1.0)
+                    if (not idempotent or not retryable or attempts > settings.stripe_max_retries
+                            or time.monotonic() + backoff >= deadline):
+                        raise
+                    logger.warning(f"Stripe {operation} attempt {attempts} failed, retrying: {str(e)}")
+                    time.sleep(backoff)
+        finally:
+            self._slots.release()
+            self.metrics.record(operation, time.monotonic() - started, attempts, ok)
+
+    def create_payment_intent(self, idempotency_key: Optional[str] = None, **params) -> stripe.PaymentIntent:
+        # Creation is only safe to retry when Stripe can dedupe it by key
+        return self._call(
+            "payment_intent.create",
+            lambda: stripe.PaymentIntent.create(idempotency_key=idempotency_key, **params),
+            idempotent=idempotency_key is not None
+        )
+
+    def retrieve_payment_intent(self, payment_intent_id: str) -> stripe.PaymentIntent:
+        return self._call(
+            "payment_intent.retrieve",
+            lambda: stripe.PaymentIntent.retrieve(payment_intent_id),
+            idempotent=True
+        )
+
+
+_gateway: Optional[StripeGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_stripe_gateway() -> StripeGateway:
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = StripeGateway()
+        return _gateway
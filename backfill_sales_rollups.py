@@ -0,0 +1,30 @@
+import argparse
+from datetime import datetime
+from app.crud.sales import SalesRollupCRUD
+from app.database import SessionLocal
+
+
+def _parse_date(value: str):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the daily sales rollups from the orders table")
+    parser.add_argument("--start-date", type=_parse_date, help="First menu date (YYYY-MM-DD), default: all")
+    parser.add_argument("--end-date", type=_parse_date, help="Last menu date (YYYY-MM-DD), default: all")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        days = SalesRollupCRUD.rebuild(db, args.start_date, args.end_date)
+        db.commit()
+        print(f"Rebuilt sales rollups for {days} caterer days")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Orders/second through the direct (commit per order) and batched (group commit) paths.
+
+Places real orders on an existing scheduled menu, so point DATABASE_URL at
+a scratch database. Every order is one unit of the menu's first priced
+item; give that item a menu_item_stock row to include the hot stock row
+in the measurement.
+
+    python bench_order_ingest.py --menu-id <menu_id> --orders 2000 --threads 32
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from app.crud.pricing import PricingCRUD
+from app.database import SessionLocal
+from app.models import payment  # noqa: F401  registers Payment for Order.payment
+from app.routers.orders import _insert_order
+from app.utils.order_ingest import OrderIngestQueue
+
+
+def _order_values(price_table, n: int):
+    item_id = next(iter(price_table.prices))
+    quantities = {item_id: 1}
+    return dict(
+        menu_id=price_table.menu_id,
+        customer_name=f"Bench customer {n}",
+        customer_phone=f"07{n:09d}",
+        customer_address="1 Bench Street",
+        customer_email=None,
+        menu_date=price_table.menu_date,
+        delivery_date=None,
+        items={str(item_id): {"catalog_item_id": item_id, "quantity": 1}},
+        payment_method="cash",
+        special_instructions=None,
+        caterer_id=price_table.caterer_id,
+        total=price_table.price(quantities),
+        order_date=datetime.utcnow(),
+        status="pending",
+        payment_status="pending"
+    ), quantities
+
+
+def _run(place, orders: int, threads: int):
+    latencies = []
+
+    def timed(n):
+        started = time.perf_counter()
+        place(n)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(timed, range(orders)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return orders / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark direct vs batched order ingest")
+    parser.add_argument("--menu-id", required=True)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--max-batch", type=int, default=100)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        price_table = PricingCRUD.get_price_table(db, args.menu_id)
+    finally:
+        db.close()
+    if not price_table or not price_table.prices:
+        parser.error(f"Menu {args.menu_id} not found or has no priced items")
+
+    def place_direct(n):
+        session = SessionLocal()
+        try:
+            _insert_order(session, *_order_values(price_table, n))
+        finally:
+            session.close()
+
+    ingest = OrderIngestQueue(max_batch=args.max_batch, max_wait_seconds=args.max_wait_ms / 1000)
+
+    def place_batched(n):
+        ingest.submit(*_order_values(price_table, n), timeout=60)
+
+    results = {
+        "direct": _run(place_direct, args.orders, args.threads),
+        "batched": _run(place_batched, args.orders, args.threads),
+    }
+
+    print(f"{args.orders} orders, {args.threads} threads, batches of up to {args.max_batch} / {args.max_wait_ms} ms")
+    for mode, (rate, p50, p99) in results.items():
+        print(f"  {mode:8s} {rate:8.1f} orders/s   p50 {p50 * 1000:6.1f} ms   p99 {p99 * 1000:6.1f} ms")
+    print(f"  batched/direct: {results['batched'][0] / results['direct'][0]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Messages/second through SMTPConnectionPool vs a new connection per message.
+
+Runs against a local SMTP stand-in, so no mail leaves the machine. The
+stand-in adds `--rtt-ms` to every reply to simulate a remote server; it
+doesn't speak TLS or AUTH, so real-world savings are larger (each new
+connection there also pays the STARTTLS handshake and login).
+
+    python bench_smtp_pool.py --messages 500 --threads 4 --rtt-ms 5
+"""
+import argparse
+import smtplib
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.text import MIMEText
+from app.utils.smtp_pool import SMTPConnectionPool
+
+
+class _StandInHandler(socketserver.StreamRequestHandler):
+    rtt = 0.0
+
+    def reply(self, line: str) -> None:
+        if self.rtt:
+            time.sleep(self.rtt)
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        self.reply("220 stand-in ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("ascii", "replace").strip().upper()
+            if command.startswith("EHLO"):
+                self.reply("250-stand-in\r\n250 8BITMIME")
+            elif command.startswith("HELO"):
+                self.reply("250 stand-in")
+            elif command.startswith("DATA"):
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.reply("250 OK queued")
+            elif command.startswith("QUIT"):
+                self.reply("221 Bye")
+                return
+            else:  # MAIL, RCPT, RSET, NOOP
+                self.reply("250 OK")
+
+
+def _message(n: int) -> MIMEText:
+    msg = MIMEText(f"Benchmark message {n}", "plain", "utf-8")
+    msg["From"] = "bench@example.com"
+    msg["To"] = f"customer{n}@example.com"
+    msg["Subject"] = f"Order Confirmation - Order #{n}"
+    return msg
+
+
+def _run(send, messages: int, threads: int) -> float:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(send, range(messages)))
+    return messages / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pooled vs per-message SMTP connections")
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--rtt-ms", type=float, default=2.0, help="Simulated round trip per SMTP reply")
+    args = parser.parse_args()
+
+    _StandInHandler.rtt = args.rtt_ms / 1000
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _StandInHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+
+    def send_unpooled(n):
+        # What every sender did before: connect, send, quit
+        with smtplib.SMTP(host, port, timeout=10) as smtp:
+            smtp.send_message(_message(n))
+
+    pool = SMTPConnectionPool(host, port, use_tls=False, max_size=args.threads)
+
+    def send_pooled(n):
+        pool.send_message(_message(n))
+
+    unpooled = _run(send_unpooled, args.messages, args.threads)
+    pooled = _run(send_pooled, args.messages, args.threads)
+    pool.close()
+    server.shutdown()
+
+    print(f"{args.messages} messages, {args.threads} threads, {args.rtt_ms} ms simulated RTT")
+    print(f"  new connection per message: {unpooled:8.1f} msg/s")
+    print(f"  pooled connections:         {pooled:8.1f} msg/s  ({pooled / unpooled:.1f}x)")
+    print(f"  pool: {pool.snapshot()}")
+
+
+if __name__ == "__main__":
+    main()
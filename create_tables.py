@@ -1,25 +1,75 @@
 from sqlalchemy import text
 from app.database import engine
+from app.crud.customer_search import create_customer_search_indexes
+from app.utils.partitions import ensure_future_partitions
+
+# (sequence, [(table, id column)], first id) for the high-volume tables.
+# Menu items and combos share one catalog id space (menu_item_stock, pricing
+# and prep sheets key on catalog_item_id), so both draw from menu_item_id_seq.
+HIGH_VOLUME_SEQUENCES = [
+    ("order_id_seq", [("orders", "order_id")], 1001),
+    ("payment_id_seq", [("payments", "payment_id")], 1001),
+    ("menu_item_id_seq", [("menu_catalog", "menu_item_id"), ("menu_combo_catalog", "combo_id")], 1001),
+]
+
+def migrate_ids_to_bigint(connection):
+    """Move existing databases off the old INTEGER keys and MAXVALUE 9999 CYCLE sequences.
+
+    Safe to re-run: column type changes are no-ops once BIGINT, and each
+    sequence is moved past the highest id in use across every table it
+    feeds, so wrapped values can't collide with existing rows.
+    """
+    # Combos used to draw from their own combo_id_seq, overlapping menu item ids
+    connection.execute(text("""
+        ALTER TABLE menu_combo_catalog ALTER COLUMN combo_id SET DEFAULT nextval('menu_item_id_seq')
+    """))
+    connection.execute(text("""
+        DROP SEQUENCE IF EXISTS combo_id_seq
+    """))
+
+    for sequence, columns, first_id in HIGH_VOLUME_SEQUENCES:
+        connection.execute(text(f"""
+            ALTER SEQUENCE {sequence} AS BIGINT NO MAXVALUE NO CYCLE CACHE 50
+        """))
+        for table, column in columns:
+            connection.execute(text(f"""
+                ALTER TABLE {table} ALTER COLUMN {column} TYPE BIGINT
+            """))
+        highest = ", ".join(f"(SELECT COALESCE(MAX({column}), 0) FROM {table})" for table, column in columns)
+        connection.execute(text(f"""
+            SELECT setval('{sequence}', GREATEST({highest}, {first_id} - 1) + 1, false)
+        """))
+
+    connection.execute(text("""
+        ALTER TABLE orders ALTER COLUMN payment_id TYPE BIGINT
+    """))
+    connection.execute(text("""
+        ALTER TABLE menu_item_stock ALTER COLUMN catalog_item_id TYPE BIGINT
+    """))
 
 def create_sequences_and_tables():
     with engine.connect() as connection:
         # Create sequences
         connection.execute(text("""
             CREATE SEQUENCE IF NOT EXISTS order_id_seq
+                AS BIGINT
                 START WITH 1001
                 INCREMENT BY 1
                 MINVALUE 1001
-                MAXVALUE 9999
-                CYCLE;
+                NO MAXVALUE
+                NO CYCLE
+                CACHE 50;
         """))
         
         connection.execute(text("""
             CREATE SEQUENCE IF NOT EXISTS payment_id_seq
+                AS BIGINT
                 START WITH 1001
                 INCREMENT BY 1
                 MINVALUE 1001
-                MAXVALUE 9999
-                CYCLE;
+                NO MAXVALUE
+                NO CYCLE
+                CACHE 50;
         """))
 
         connection.execute(text("""
@@ -34,20 +84,13 @@ def create_sequences_and_tables():
         
         connection.execute(text("""
             CREATE SEQUENCE IF NOT EXISTS menu_item_id_seq
+                AS BIGINT
                 START WITH 1001
                 INCREMENT BY 1
                 MINVALUE 1001
-                MAXVALUE 9999
-                CYCLE;
-        """))
-
-        connection.execute(text("""
-            CREATE SEQUENCE IF NOT EXISTS combo_id_seq
-                START WITH 2001
-                INCREMENT BY 1
-                MINVALUE 2001
-                MAXVALUE 9999
-                CYCLE;
+                NO MAXVALUE
+                NO CYCLE
+                CACHE 50;
         """))
 
         connection.execute(text("""
@@ -86,8 +129,9 @@ def create_sequences_and_tables():
         # Orders table
         connection.execute(text("""
             CREATE TABLE IF NOT EXISTS orders (
-                order_id INTEGER PRIMARY KEY DEFAULT nextval('order_id_seq'),
+                order_id BIGINT PRIMARY KEY DEFAULT nextval('order_id_seq'),
                 menu_id VARCHAR NOT NULL,
+                caterer_id INTEGER,
                 customer_name VARCHAR NOT NULL,
                 customer_phone VARCHAR,
                 customer_address JSONB NOT NULL,
@@ -101,13 +145,16 @@ def create_sequences_and_tables():
                 payment_status VARCHAR,
                 status VARCHAR NOT NULL,
                 special_instructions VARCHAR,
-                payment_id integer,
+                payment_id BIGINT,
                 FOREIGN KEY (menu_id) REFERENCES scheduled_menu(menu_id),
                 CONSTRAINT fk_orders_payment FOREIGN KEY (payment_id) REFERENCES payments(payment_id),
                 CONSTRAINT unique_order_id UNIQUE (order_id,customer_phone)
                 
             )
         """))
+        connection.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_orders_menu_date ON orders (menu_date)
+        """))
 
         # Menu Items table
         connection.execute(text("""
@@ -123,11 +170,150 @@ def create_sequences_and_tables():
                 FOREIGN KEY (caterer_id) REFERENCES users(caterer_id)
             )
         """))
+
+        # Orders carry their menu's caterer so per-caterer listing is one index range
+        connection.execute(text("""
+            ALTER TABLE orders ADD COLUMN IF NOT EXISTS caterer_id INTEGER
+        """))
+        connection.execute(text("""
+            UPDATE orders o
+            SET caterer_id = sm.caterer_id
+            FROM scheduled_menu sm
+            WHERE sm.menu_id = o.menu_id AND o.caterer_id IS NULL
+        """))
+        connection.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_orders_caterer_menu_date
+            ON orders (caterer_id, menu_date, order_id)
+        """))
+        # Customer search by normalized phone, lowercased email and name trigrams
+        create_customer_search_indexes(connection)
+
+        connection.execute(text("""
+            ALTER TABLE orders ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        """))
+
+        # Append-only log of order transitions; txid orders events by commit
+        # visibility for the /orders/changes cursor
+        connection.execute(text("""
+            CREATE SEQUENCE IF NOT EXISTS order_event_id_seq AS BIGINT START 1 INCREMENT 1 NO CYCLE CACHE 50
+        """))
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS order_events (
+                event_id BIGINT PRIMARY KEY DEFAULT nextval('order_event_id_seq'),
+                txid XID8 NOT NULL DEFAULT pg_current_xact_id(),
+                order_id BIGINT NOT NULL,
+                caterer_id INTEGER,
+                menu_date DATE NOT NULL,
+                event_type VARCHAR(30) NOT NULL, -- 'order.created', 'order.updated', 'order.cancelled', 'payment.confirmed', 'payment.failed'
+                status VARCHAR(20),
+                payment_status VARCHAR(20),
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+        connection.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_order_events_caterer_txid
+            ON order_events (caterer_id, txid, event_id)
+        """))
+        connection.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_order_events_order_id ON order_events (order_id, event_id)
+        """))
+
+        # Per-item capacity for scheduled menus (items without a row are unlimited)
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS menu_item_stock (
+                menu_id VARCHAR NOT NULL,
+                catalog_item_id BIGINT NOT NULL,
+                capacity INTEGER NOT NULL,
+                reserved INTEGER NOT NULL DEFAULT 0,
+                CONSTRAINT pk_menu_item_stock PRIMARY KEY (menu_id, catalog_item_id),
+                CONSTRAINT fk_menu_item_stock_menu FOREIGN KEY (menu_id) REFERENCES scheduled_menu(menu_id),
+                CONSTRAINT chk_menu_item_stock_capacity CHECK (capacity >= 0),
+                CONSTRAINT chk_menu_item_stock_reserved CHECK (reserved >= 0)
+            )
+        """))
+
+        # Stripe webhook event ids already applied, for deduplicating redeliveries
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS stripe_webhook_events (
+                event_id VARCHAR(255) PRIMARY KEY,
+                event_type VARCHAR(100) NOT NULL,
+                received_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+
+        # Outbound emails/SMS, written in the caller's transaction and drained by
+        # notification_worker.py; 'dead' rows are the dead letters
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS notification_outbox (
+                message_id UUID PRIMARY KEY,
+                channel VARCHAR(10) NOT NULL, -- 'email', 'sms'
+                kind VARCHAR(40) NOT NULL, -- 'email', 'sms', 'confirmation_email'
+                payload JSONB NOT NULL,
+                status VARCHAR(10) NOT NULL DEFAULT 'pending', -- 'pending', 'sending', 'sent', 'dead'
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                locked_until TIMESTAMP WITH TIME ZONE,
+                last_error TEXT,
+                provider_message_id VARCHAR(100),
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                sent_at TIMESTAMP WITH TIME ZONE
+            )
+        """))
+        connection.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_notification_outbox_due
+            ON notification_outbox (next_attempt_at)
+            WHERE status IN ('pending', 'sending')
+        """))
+
+        # Daily sales rollups, maintained incrementally by SalesRollupCRUD
+        # (run backfill_sales_rollups.py once to seed them from existing orders)
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS daily_sales_rollup (
+                caterer_id INTEGER NOT NULL,
+                menu_date DATE NOT NULL,
+                order_count INTEGER NOT NULL DEFAULT 0, -- non-cancelled orders
+                gross_total DECIMAL(12,2) NOT NULL DEFAULT 0,
+                paid_total DECIMAL(12,2) NOT NULL DEFAULT 0,
+                cancelled_count INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                slot SMALLINT NOT NULL DEFAULT 0,
+                CONSTRAINT pk_daily_sales_rollup PRIMARY KEY (caterer_id, menu_date, slot)
+            )
+        """))
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS daily_payment_method_rollup (
+                caterer_id INTEGER NOT NULL,
+                menu_date DATE NOT NULL,
+                payment_method VARCHAR(50) NOT NULL,
+                total DECIMAL(12,2) NOT NULL DEFAULT 0,
+                slot SMALLINT NOT NULL DEFAULT 0,
+                CONSTRAINT pk_daily_payment_method_rollup PRIMARY KEY (caterer_id, menu_date, payment_method, slot)
+            )
+        """))
+        # Each caterer/day is spread over several slot rows so concurrent
+        # orders don't queue on one row lock; readers sum the slots
+        connection.execute(text("""
+            ALTER TABLE daily_sales_rollup ADD COLUMN IF NOT EXISTS slot SMALLINT NOT NULL DEFAULT 0
+        """))
+        connection.execute(text("""
+            ALTER TABLE daily_sales_rollup
+                DROP CONSTRAINT IF EXISTS pk_daily_sales_rollup,
+                ADD CONSTRAINT pk_daily_sales_rollup PRIMARY KEY (caterer_id, menu_date, slot)
+        """))
+        connection.execute(text("""
+            ALTER TABLE daily_payment_method_rollup ADD COLUMN IF NOT EXISTS slot SMALLINT NOT NULL DEFAULT 0
+        """))
+        connection.execute(text("""
+            ALTER TABLE daily_payment_method_rollup
+                DROP CONSTRAINT IF EXISTS pk_daily_payment_method_rollup,
+                ADD CONSTRAINT pk_daily_payment_method_rollup PRIMARY KEY (caterer_id, menu_date, payment_method, slot)
+        """))
         
         # Payments table
         connection.execute(text("""
             CREATE TABLE IF NOT EXISTS payments (
-                        payment_id INTEGER PRIMARY KEY DEFAULT nextval('payment_id_seq'), -- Sequence for all Payments
+                        payment_id BIGINT PRIMARY KEY DEFAULT nextval('payment_id_seq'), -- Sequence for all Payments
                         payment_method VARCHAR(50) NOT NULL, -- 'credit_card', 'debit_card', 'paypal', 'stripe','banktransfer' etc.
                         payment_status VARCHAR(20) NOT NULL DEFAULT 'pending', -- 'pending', 'completed', 'failed', 'refunded', 'cancelled'
                         amount DECIMAL(10,2) NOT NULL,
@@ -135,7 +321,11 @@ def create_sequences_and_tables():
                         payment_intent_id varchar(60), -- Stripe Payment Intent Id
                         transaction_id VARCHAR(255), -- Bank tranfer transaction ID
                         payment_gateway VARCHAR(50), -- 'stripe', 'paypal', 'square', etc.
-                        gateway_response TEXT, -- JSON response from payment gateway
+                        gateway_response TEXT, -- Legacy text dump of the gateway response, see gateway_data
+                        gateway_data JSONB, -- Compacted gateway response (nulls, secrets and unused blocks dropped)
+                        gateway_status VARCHAR(30), -- Typed copies of the gateway fields we read
+                        gateway_amount INTEGER,
+                        gateway_charge_id VARCHAR(60),
                         failure_reason TEXT,
                         processed_at TIMESTAMP WITH TIME ZONE,
                         created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
@@ -144,10 +334,30 @@ def create_sequences_and_tables():
                         CONSTRAINT fk_payments_order FOREIGN KEY (order_id) REFERENCES orders(order_id)
                     )
         """))
+        # Gateway responses move from a text dump to JSONB plus typed columns;
+        # existing rows are converted by migrate_gateway_data.py
+        connection.execute(text("""
+            ALTER TABLE payments
+                ADD COLUMN IF NOT EXISTS gateway_data JSONB,
+                ADD COLUMN IF NOT EXISTS gateway_status VARCHAR(30),
+                ADD COLUMN IF NOT EXISTS gateway_amount INTEGER,
+                ADD COLUMN IF NOT EXISTS gateway_charge_id VARCHAR(60)
+        """))
+        # Small partial index for the reconciliation job's scan of unsettled payments
+        connection.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_payments_pending ON payments (payment_id)
+            WHERE payment_status = 'pending'
+        """))
+        # Index-only path from a caterer's menu dates to their payments, for /payments/analytics
+        connection.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_orders_caterer_menu_date_payment
+            ON orders (caterer_id, menu_date) INCLUDE (payment_id)
+            WHERE payment_id IS NOT NULL
+        """))
         # Menu Catalog Table
         connection.execute(text("""
             CREATE TABLE IF NOT EXISTS menu_catalog (
-                menu_item_id INTEGER PRIMARY KEY DEFAULT nextval('menu_item_id_seq'),
+                menu_item_id BIGINT PRIMARY KEY DEFAULT nextval('menu_item_id_seq'),
                 item_name VARCHAR(100) NOT NULL,
                 description TEXT,
                 default_price DECIMAL(8,2) NOT NULL,
@@ -160,7 +370,7 @@ def create_sequences_and_tables():
         # Combo Catalog 
         connection.execute(text("""
             CREATE TABLE IF NOT EXISTS menu_combo_catalog (
-                combo_id INTEGER PRIMARY KEY DEFAULT nextval('combo_id_seq'),
+                combo_id BIGINT PRIMARY KEY DEFAULT nextval('menu_item_id_seq'), -- Shares the catalog id space with menu items
                 combo_name VARCHAR(100) NOT NULL,
                 combo_items JSONB NOT NULL,
                 combo_description TEXT,
@@ -222,6 +432,9 @@ def create_sequences_and_tables():
         """))  
 
 
+        migrate_ids_to_bigint(connection)
+        ensure_future_partitions(connection)
+
         connection.execute(text("""
             CREATE OR REPLACE FUNCTION update_updated_at_column()
             RETURNS TRIGGER AS $$
@@ -232,7 +445,11 @@ def create_sequences_and_tables():
             $$ language 'plpgsql';
         """))
         
-        # Create triggers
+        # Create triggers (dropped first so re-runs on an existing database
+        # don't abort before the commit below)
+        connection.execute(text("""
+            DROP TRIGGER IF EXISTS update_customer_reviews_updated_at ON customer_reviews
+        """))
         connection.execute(text("""
             CREATE TRIGGER update_customer_reviews_updated_at 
             BEFORE UPDATE ON customer_reviews 
@@ -240,11 +457,24 @@ def create_sequences_and_tables():
             EXECUTE FUNCTION update_updated_at_column();
         """))
         
+        connection.execute(text("""
+            DROP TRIGGER IF EXISTS update_catering_inquiries_updated_at ON catering_inquiries
+        """))
         connection.execute(text("""
             CREATE TRIGGER update_catering_inquiries_updated_at 
             BEFORE UPDATE ON catering_inquiries 
             FOR EACH ROW 
             EXECUTE FUNCTION update_updated_at_column();
+        """))
+
+        connection.execute(text("""
+            DROP TRIGGER IF EXISTS update_orders_updated_at ON orders
+        """))
+        connection.execute(text("""
+            CREATE TRIGGER update_orders_updated_at
+            BEFORE UPDATE ON orders
+            FOR EACH ROW
+            EXECUTE FUNCTION update_updated_at_column();
         """))                            
                                     
 
@@ -1,17 +1,27 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.config import settings
 from app.database import engine, Base
 from app.routers import auth, notifications, users, menu, orders, payments,inquiry,review
+from app.utils.compression import CompressionMiddleware, compression_metrics
+from app.utils.partitions import ensure_future_partitions
+from app.utils.smtp_pool import close_smtp_pools, smtp_pool_metrics
+from app.utils.stripe_gateway import get_stripe_gateway
+from app.utils.responses import FastJSONResponse
 from dotenv import load_dotenv
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="MyCloudKitchen API",
     description="A comprehensive catering management system",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000,http://localhost:3001").split(",")
@@ -25,6 +35,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Negotiated brotli/gzip for large JSON lists; streamed responses are flushed per chunk
+if settings.compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_minimum_size,
+        gzip_level=settings.compression_gzip_level,
+        brotli_quality=settings.compression_brotli_quality,
+    )
+
 load_dotenv()
 # Include routers
 app.include_router(auth.router)
@@ -36,6 +55,19 @@ app.include_router(notifications.router)
 app.include_router(inquiry.router)
 app.include_router(review.router)
 
+@app.on_event("startup")
+def create_upcoming_partitions():
+    # Keep monthly order/payment partitions ahead of incoming menu dates
+    try:
+        with engine.begin() as connection:
+            ensure_future_partitions(connection)
+    except Exception as e:
+        logger.error(f"Could not create upcoming partitions: {str(e)}")
+
+@app.on_event("shutdown")
+def close_smtp_connections():
+    close_smtp_pools()
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to MyCloudKitchen API"}
@@ -44,6 +76,21 @@ def read_root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics/compression")
+def get_compression_metrics():
+    # Bytes in/out and compression CPU time per route since startup
+    return compression_metrics.snapshot()
+
+@app.get("/metrics/stripe")
+def get_stripe_metrics():
+    # Stripe call counts, errors, retries and latency percentiles per operation
+    return get_stripe_gateway().metrics.snapshot()
+
+@app.get("/metrics/smtp")
+def get_smtp_metrics():
+    # Connections opened/closed, messages sent and reconnects per SMTP server
+    return smtp_pool_metrics()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8050)
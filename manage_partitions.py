@@ -0,0 +1,36 @@
+import argparse
+from app.database import engine
+from app.utils.partitions import archive_old_partitions, ensure_future_partitions, migrate_to_partitioned
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage monthly partitions of the orders and payments tables")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = subcommands.add_parser("migrate", help="Convert orders/payments to partitioned tables (run once)")
+    migrate.add_argument("--months-ahead", type=int, default=3)
+
+    ensure = subcommands.add_parser("ensure", help="Create partitions for upcoming months")
+    ensure.add_argument("--months-ahead", type=int, default=3)
+
+    archive = subcommands.add_parser("archive", help="Detach partitions older than the retention window")
+    archive.add_argument("--retention-months", type=int, default=24)
+    archive.add_argument("--archive-schema", default="archive")
+    archive.add_argument("--drop", action="store_true", help="Drop detached partitions instead of archiving them")
+
+    args = parser.parse_args()
+
+    with engine.begin() as connection:
+        if args.command == "migrate":
+            migrate_to_partitioned(connection, args.months_ahead)
+            print("orders and payments are now partitioned by month")
+        elif args.command == "ensure":
+            created = ensure_future_partitions(connection, args.months_ahead)
+            print(f"Created partitions: {', '.join(created) or 'none'}")
+        else:
+            archived = archive_old_partitions(connection, args.retention_months, args.archive_schema, args.drop)
+            print(f"{'Dropped' if args.drop else 'Archived'} partitions: {', '.join(archived) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
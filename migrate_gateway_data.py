@@ -0,0 +1,45 @@
+import argparse
+import time
+from sqlalchemy import text
+from app.crud.payments import PaymentCRUD
+from app.database import SessionLocal, engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert legacy text gateway responses on payments to JSONB")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM ANALYZE payments afterwards to reuse the freed space")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    after_id, converted, unparseable = 0, 0, 0
+    try:
+        while True:
+            # One short transaction per batch so live payment updates aren't blocked
+            last_id, batch_converted, batch_unparseable = PaymentCRUD.migrate_gateway_responses(
+                db, after_id, args.batch_size
+            )
+            db.commit()
+            if last_id is None:
+                break
+            after_id = last_id
+            converted += batch_converted
+            unparseable += batch_unparseable
+            print(f"Up to payment {after_id}: {converted} converted, {unparseable} left as text")
+            if args.pause:
+                time.sleep(args.pause)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    if args.vacuum:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text("VACUUM ANALYZE payments"))
+    print(f"Done: {converted} converted, {unparseable} left as text")
+
+
+if __name__ == "__main__":
+    main()
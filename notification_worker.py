@@ -0,0 +1,33 @@
+import argparse
+import json
+import logging
+import signal
+from app.core.config import settings
+from app.utils.notification_worker import NotificationWorker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send queued emails and SMS from the notification outbox")
+    parser.add_argument("--concurrency", type=int, default=settings.notification_worker_concurrency)
+    parser.add_argument("--email-concurrency", type=int, default=settings.notification_email_concurrency)
+    parser.add_argument("--sms-concurrency", type=int, default=settings.notification_sms_concurrency)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--once", action="store_true", help="Exit once nothing is due instead of polling")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    worker = NotificationWorker(
+        concurrency=args.concurrency,
+        channel_limits={"email": args.email_concurrency, "sms": args.sms_concurrency},
+        batch_size=args.batch_size,
+    )
+    # Finish in-flight sends, then exit
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    signal.signal(signal.SIGINT, lambda *_: worker.stop())
+
+    stats = worker.run(until_idle=args.once)
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import argparse
+import json
+from datetime import timedelta
+from app.crud.reconciliation import PaymentReconciler, stripe_intent_fetcher
+from app.database import SessionLocal
+
+
+def _file_fetcher(path):
+    # Offline stand-in: {"pi_...": {"status": "succeeded", "amount": 1250, ...}, ...}
+    with open(path) as f:
+        intents = json.load(f)
+
+    def fetch(intent_id):
+        if intent_id not in intents:
+            import stripe
+            raise stripe.error.InvalidRequestError("No such payment_intent", "id", http_status=404)
+        return {"id": intent_id, **intents[intent_id]}
+    return fetch
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Settle pending payments from their Stripe payment intents")
+    parser.add_argument("--max-payments", type=int, help="Stop after this many payments (default: all)")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=20, help="Stripe requests per second")
+    parser.add_argument("--min-age-minutes", type=int, default=30)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--intents-file", help="JSON file of intents to use instead of calling Stripe")
+    args = parser.parse_args()
+
+    fetch_intent = _file_fetcher(args.intents_file) if args.intents_file else stripe_intent_fetcher()
+    db = SessionLocal()
+    try:
+        report = PaymentReconciler(
+            db, fetch_intent,
+            page_size=args.page_size,
+            concurrency=args.concurrency,
+            rate_per_second=args.rate,
+            min_age=timedelta(minutes=args.min_age_minutes),
+            dry_run=args.dry_run
+        ).run(args.max_payments)
+    finally:
+        db.close()
+
+    print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()